@@ -1,3 +1,30 @@
-from .camera import RealSenseCamera
-from .detector import MediaPipeDetector
-from .tracker import PoseTracker
\ No newline at end of file
+from typing import TYPE_CHECKING
+
+from ..utils import lazy_attributes
+
+# mediapipe, cv2 and pyrealsense2 are imported by the submodules that use them
+__getattr__ = lazy_attributes(__name__, {
+    "ArrayFrame": ".camera",
+    "FrameSource": ".camera",
+    "RealSenseCamera": ".camera",
+    "MediaPipeDetector": ".detector",
+    "CameraGroup": ".fusion",
+    "CameraWorker": ".fusion",
+    "Extrinsics": ".fusion",
+    "PreviewPublisher": ".preview",
+    "FrameRecorder": ".recording",
+    "ReplayCamera": ".recording",
+    "ReplayClock": ".recording",
+    "ScriptedDetector": ".synthetic",
+    "SyntheticCamera": ".synthetic",
+    "PoseTracker": ".tracker",
+})
+
+if TYPE_CHECKING:
+    from .camera import ArrayFrame, FrameSource, RealSenseCamera
+    from .detector import MediaPipeDetector
+    from .fusion import CameraGroup, CameraWorker, Extrinsics
+    from .preview import PreviewPublisher
+    from .recording import FrameRecorder, ReplayCamera, ReplayClock
+    from .synthetic import ScriptedDetector, SyntheticCamera
+    from .tracker import PoseTracker
@@ -0,0 +1,35 @@
+import numpy as np
+
+
+class FrameBuffers:
+    """
+    Named image buffers that are reused from frame to frame. A buffer is
+    only allocated when it is first requested or its shape changes, and
+    `allocations` counts how often that happened, so a steady stream of
+    same-sized frames should leave it unchanged.
+    """
+
+    def __init__(self):
+        self.buffers = {}
+        self.allocations = 0
+
+    def get(self, name, shape, dtype=np.uint8) -> np.ndarray:
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.shape != tuple(shape) or buffer.dtype != dtype:
+            buffer = np.empty(shape, dtype=dtype)
+            self.buffers[name] = buffer
+            self.allocations += 1
+        return buffer
+
+    def get_view(self, name, shape, dtype=np.uint8) -> np.ndarray:
+        """
+        Contiguous array of the given shape backed by a buffer that only
+        grows, for images whose size changes from frame to frame.
+        """
+        size = int(np.prod(shape))
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.size < size or buffer.dtype != dtype:
+            buffer = np.empty(size, dtype=dtype)
+            self.buffers[name] = buffer
+            self.allocations += 1
+        return buffer[:size].reshape(shape)
@@ -1,26 +1,98 @@
-import pyrealsense2 as rs
+import abc
+import time
 
+import numpy as np
 
-class RealSenseCamera:
+from .deprojection import Intrinsics
+from ..utils import new_trace
+
+
+class ArrayFrame:
+    """
+    Wraps an image array in the get_data() interface of pyrealsense2 frames.
+    """
+
+    def __init__(self, data):
+        self.data = data
+
+    def get_data(self):
+        return self.data
+
+
+class FrameSource(abc.ABC):
+    """
+    Anything PoseTracker can pull frames from. Frames only need to expose
+    get_data() like pyrealsense2 frames do.
+    """
+
+    trace = None
+    # intrinsics of the stream the depth frames are aligned to, if known
+    intrinsics = None
+    depth_scale = 1e-3
+
+    @abc.abstractmethod
+    def get_frames(self):
+        """
+        Returns the next depth and color frame, or None once the source has
+        no frames left. A live camera never runs out.
+        """
+        pass
+
+    def close(self):
+        pass
+
+
+class RealSenseCamera(FrameSource):
+
+    def __init__(self, width=1280, height=720, record_dir=None, serial=None):
+        import pyrealsense2 as rs
 
-    def __init__(self, width=1280, height=720):
         self.pipeline = rs.pipeline()
         config = rs.config()
+        # with several cameras connected, each is opened by its serial number
+        if serial is not None:
+            config.enable_device(str(serial))
 
         pipeline_wrapper = rs.pipeline_wrapper(self.pipeline)
         pipeline_profile = config.resolve(pipeline_wrapper)
         device = pipeline_profile.get_device()
         advanced_mode = rs.rs400_advanced_mode(device)
         advanced_mode.toggle_advanced_mode(True)
+        # frame timestamps from the device clock, mapped onto the host's, so
+        # frames of several cameras can be matched by when they were exposed
+        for sensor in device.query_sensors():
+            if sensor.supports(rs.option.global_time_enabled):
+                sensor.set_option(rs.option.global_time_enabled, 1)
+        self.global_time = rs.timestamp_domain.global_time
 
         config.enable_stream(rs.stream.depth, width, height, rs.format.z16, 30)
         config.enable_stream(rs.stream.color, width, height, rs.format.bgr8, 30)
-        self.pipeline.start(config)
+        profile = self.pipeline.start(config)
+
+        # depth is aligned to the color stream, so its intrinsics apply to both
+        color_intrinsics = profile.get_stream(rs.stream.color).as_video_stream_profile().get_intrinsics()
+        self.intrinsics = Intrinsics(
+            width=color_intrinsics.width,
+            height=color_intrinsics.height,
+            fx=color_intrinsics.fx,
+            fy=color_intrinsics.fy,
+            ppx=color_intrinsics.ppx,
+            ppy=color_intrinsics.ppy)
+        self.depth_scale = profile.get_device().first_depth_sensor().get_depth_scale()
 
         self.frame_history = []
+        self.trace = None
         self._setup_postprocessing()
 
+        # record the frames handed to the tracker, for replay with ReplayCamera
+        self.recorder = None
+        if record_dir is not None:
+            from .recording import FrameRecorder
+            self.recorder = FrameRecorder(record_dir, intrinsics=self.intrinsics, depth_scale=self.depth_scale)
+
     def _setup_postprocessing(self):
+        import pyrealsense2 as rs
+
         self.align = rs.align(rs.stream.color)
 
         self.decimation_filter = rs.decimation_filter()
@@ -32,15 +104,25 @@ class RealSenseCamera:
 
     def get_frames(self):
         """
-        Returns depth and color frame.
+        Returns depth and color frame. The capture time and trace id of the
+        frames are kept in self.trace. A frameset missing either frame is
+        dropped and the next one waited for.
         """
-        frames = self.pipeline.wait_for_frames()
-        frames = self.align.process(frames)
+        while True:
+            frames = self.pipeline.wait_for_frames()
+            received = time.time()
+            frames = self.align.process(frames)
+
+            depth_frame = frames.get_depth_frame()
+            color_frame = frames.get_color_frame()
+            if depth_frame and color_frame:
+                break
 
-        depth_frame = frames.get_depth_frame()
-        color_frame = frames.get_color_frame()
-        if not depth_frame or not color_frame:
-            return
+        # the device's capture time where it is on the host clock, else the arrival time
+        if color_frame.get_frame_timestamp_domain() == self.global_time:
+            self.trace = new_trace(color_frame.get_timestamp() / 1e3)
+        else:
+            self.trace = new_trace(received)
         
         self.frame_history.append(depth_frame)
         if len(self.frame_history) > 15:
@@ -58,7 +140,21 @@ class RealSenseCamera:
             frame = self.hole_filling_filter.process(frame)
         depth_frame = frame
 
+        if self.recorder is not None:
+            self.recorder.write(
+                self.trace.capture_time,
+                np.asanyarray(depth_frame.get_data()),
+                np.asanyarray(color_frame.get_data()))
+
         return depth_frame, color_frame
         
+    def close(self):
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+        if self.pipeline is not None:
+            self.pipeline.stop()
+            self.pipeline = None
+
     def __del__(self):
-        self.pipeline.stop()
+        self.close()
@@ -0,0 +1,98 @@
+import math
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+
+# horizontal and vertical field of view of the D435 color sensor, used when
+# a frame source cannot report intrinsics
+DEFAULT_FOV = (69.0, 42.0)
+
+
+class Intrinsics(NamedTuple):
+    width: int
+    height: int
+    fx: float
+    fy: float
+    ppx: float
+    ppy: float
+
+    def scaled(self, width: int, height: int) -> "Intrinsics":
+        """
+        Intrinsics of the same stream resampled to width x height, e.g. after
+        the decimation filter.
+        """
+        sx, sy = width / self.width, height / self.height
+        return Intrinsics(
+            width=width,
+            height=height,
+            fx=self.fx * sx,
+            fy=self.fy * sy,
+            # pixel centers, not corners, are scaled
+            ppx=(self.ppx + 0.5) * sx - 0.5,
+            ppy=(self.ppy + 0.5) * sy - 0.5,
+        )
+
+
+def default_intrinsics(width: int, height: int) -> Intrinsics:
+    fx = width / (2 * math.tan(math.radians(DEFAULT_FOV[0]) / 2))
+    fy = height / (2 * math.tan(math.radians(DEFAULT_FOV[1]) / 2))
+    return Intrinsics(width, height, fx, fy, (width - 1) / 2, (height - 1) / 2)
+
+
+class Deprojector:
+    """
+    Converts normalized image coordinates plus depth to 3D points.
+
+    A table of per-pixel rays is built for the resolution of the depth image
+    the first time it is seen, so each conversion is a gather and a multiply
+    for all keypoints at once. Points are returned as (x right, y up, depth)
+    in meters. With `mirrored`, the depth image is expected to be flipped
+    left to right, as PoseTracker shows it.
+    """
+
+    def __init__(self, intrinsics: Optional[Intrinsics] = None, depth_scale: float = 1e-3, mirrored: bool = True):
+        self.intrinsics = intrinsics
+        self.depth_scale = depth_scale
+        self.mirrored = mirrored
+        self.shape = None
+        self.rays = None
+
+    def _build_rays(self, height: int, width: int):
+        intrinsics = self.intrinsics or default_intrinsics(width, height)
+        intrinsics = intrinsics.scaled(width, height)
+
+        u = np.arange(width)
+        v = np.arange(height)
+        rays = np.empty((height, width, 2), dtype=np.float64)
+        # camera x points right and y down; flip both into the tracker's frame
+        rays[..., 0] = -(u[None, :] - intrinsics.ppx) / intrinsics.fx
+        rays[..., 1] = -(v[:, None] - intrinsics.ppy) / intrinsics.fy
+        if self.mirrored:
+            rays = rays[:, ::-1]
+
+        self.rays = np.ascontiguousarray(rays)
+        self.shape = (height, width)
+
+    def deproject(self, points: np.ndarray, depth_image: np.ndarray) -> np.ndarray:
+        """
+        points: (N, 2) normalized image coordinates. Returns (N, 3) points,
+        with NaN rows for coordinates outside the image or without depth.
+        """
+        height, width = depth_image.shape[:2]
+        if self.shape != (height, width):
+            self._build_rays(height, width)
+
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        u = np.floor(points[:, 0] * width).astype(np.intp)
+        v = np.floor(points[:, 1] * height).astype(np.intp)
+        valid = (u >= 0) & (u < width) & (v >= 0) & (v < height)
+        u, v = np.where(valid, u, 0), np.where(valid, v, 0)
+
+        depth = self.depth_scale * depth_image[v, u]
+        depth = np.where(valid & (depth > 0), depth, np.nan)
+
+        result = np.empty((len(points), 3))
+        result[:, :2] = self.rays[v, u] * depth[:, None]
+        result[:, 2] = depth
+        return result
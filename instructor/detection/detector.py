@@ -1,4 +1,6 @@
 import argparse
+import threading
+import time
 
 import cv2
 import numpy as np
@@ -9,29 +11,208 @@ from mediapipe.framework.formats import landmark_pb2
 from mediapipe.tasks import python
 from mediapipe.tasks.python import vision
 
+from .buffers import FrameBuffers
 
-class MediaPipeDetector:
+
+RUNNING_MODES = {
+    "image": vision.RunningMode.IMAGE,
+    "video": vision.RunningMode.VIDEO,
+    "live_stream": vision.RunningMode.LIVE_STREAM,
+}
+
+
+# margin added around the previous pose when cropping, relative to its size
+ROI_MARGIN = 0.25
+ROI_MIN_SIZE = 64
+
+# pose landmarks each keypoint of parse_landmarks is computed from
+KEYPOINT_LANDMARKS = {
+    "nose": (0,),
+    "left_hand": (18, 20, 22),
+    "left_elbow": (14,),
+    "left_shoulder": (12,),
+    "right_hand": (17, 19, 21),
+    "right_elbow": (13,),
+    "right_shoulder": (11,),
+    "center_shoulders": (11, 12),
+    "center_hips": (23, 24),
+}
+
+
+class LatestResult:
+    """
+    Single slot holding the most recent result of an asynchronous
+    detection. Older results are overwritten, never queued.
+    """
 
     def __init__(self):
+        self.condition = threading.Condition()
+        self.result = vision.PoseLandmarkerResult(pose_landmarks=[], pose_world_landmarks=[])
+        self.timestamp_ms = None
+
+    def put(self, result, timestamp_ms):
+        with self.condition:
+            if self.timestamp_ms is None or timestamp_ms > self.timestamp_ms:
+                self.result, self.timestamp_ms = result, timestamp_ms
+                self.condition.notify_all()
+
+    def get(self):
+        with self.condition:
+            return self.result, self.timestamp_ms
+
+    def wait(self, timestamp_ms, timeout=None) -> bool:
+        """
+        Waits until the result for the frame at `timestamp_ms`, or a later
+        one, has arrived. Returns False on timeout.
+        """
+        with self.condition:
+            return self.condition.wait_for(
+                lambda: self.timestamp_ms is not None and self.timestamp_ms >= timestamp_ms, timeout)
+
+
+class MediaPipeDetector:
+
+    def __init__(
+        self,
+        running_mode: str = "image",
+        roi_tracking: bool = False,
+        input_size: int = 256,
+        output_segmentation_masks: bool = False,
+    ):
+        # in video and live stream mode, frames must come with increasing
+        # timestamps and the landmarker tracks the pose between them. In live
+        # stream mode detection runs asynchronously and run_detection returns
+        # the latest finished result, which may belong to an earlier frame.
+        self.running_mode = running_mode
+        self.buffers = FrameBuffers()
+        self.latest = LatestResult()
+        # timestamps of the last frame submitted and of the frame the last
+        # returned result belongs to, equal outside of live stream mode
+        self.last_timestamp_ms = -1
+        self.result_timestamp_ms = None
+
         base_options = python.BaseOptions(model_asset_path="assets/pose_landmarker.task")
         options = vision.PoseLandmarkerOptions(
             base_options=base_options,
-            output_segmentation_masks=True)
+            running_mode=RUNNING_MODES[running_mode],
+            output_segmentation_masks=output_segmentation_masks)
+        if running_mode == "live_stream":
+            options.result_callback = self._on_result
         self.detector = vision.PoseLandmarker.create_from_options(options)
 
-    def run_detection(self, image):
-        image = mp.Image(
-            image_format=mp.ImageFormat.SRGB,
-            data=cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
-        detection_result = self.detector.detect(image)
+        # the landmarker tracks on its own outside of image mode, and would
+        # be confused by a moving crop
+        self.roi_tracking = roi_tracking and running_mode == "image"
+        self.input_size = input_size
+        self.roi = None
+
+    def warmup(self, width: int = 640, height: int = 480, timeout: float = 10.0):
+        """
+        Runs one detection on a blank frame, so the landmarker's first real
+        frame isn't slowed down by its initialization.
+        """
+        self.run_detection(np.zeros((height, width, 3), dtype=np.uint8), timestamp_ms=0)
+        if self.running_mode == "live_stream":
+            # the blank frame's result must not be returned for a real frame
+            if not self.latest.wait(self.last_timestamp_ms, timeout):
+                print(f"detector warmup: no result after {timeout} s")
+            self.latest = LatestResult()
+            self.result_timestamp_ms = None
+        self.roi = None
+
+    def _on_result(self, result, output_image, timestamp_ms):
+        self.latest.put(result, timestamp_ms)
+
+    def _next_timestamp(self, timestamp_ms=None):
+        if timestamp_ms is None:
+            timestamp_ms = int(time.monotonic() * 1e3)
+        # the landmarker rejects timestamps that do not increase
+        timestamp_ms = max(timestamp_ms, self.last_timestamp_ms + 1)
+        self.last_timestamp_ms = timestamp_ms
+        return timestamp_ms
+
+    def _detect(self, image, timestamp_ms=None):
+        rgb_image = self.buffers.get_view("rgb", image.shape, np.uint8)
+        cv2.cvtColor(image, cv2.COLOR_RGB2BGR, dst=rgb_image)
+        image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb_image)
+        timestamp_ms = self._next_timestamp(timestamp_ms)
+        if self.running_mode == "live_stream":
+            self.detector.detect_async(image, timestamp_ms)
+            detection_result, self.result_timestamp_ms = self.latest.get()
+            return detection_result
+        if self.running_mode == "video":
+            detection_result = self.detector.detect_for_video(image, timestamp_ms)
+        else:
+            detection_result = self.detector.detect(image)
+        self.result_timestamp_ms = timestamp_ms
+        return detection_result
+
+    def _detect_in_region(self, image, roi, timestamp_ms=None):
+        """
+        Detects inside roi = (x0, y0, x1, y1) pixels, downscaled so its long
+        side is at most input_size, and maps landmarks back to normalized
+        full-frame coordinates.
+        """
+        height, width = image.shape[:2]
+        x0, y0, x1, y1 = roi
+        crop = image[y0:y1, x0:x1]
+        crop_width, crop_height = x1 - x0, y1 - y0
+
+        scale = self.input_size / max(crop_width, crop_height)
+        if scale < 1:
+            dsize = (max(1, round(crop_width * scale)), max(1, round(crop_height * scale)))
+            crop = cv2.resize(
+                crop,
+                dsize=dsize,
+                dst=self.buffers.get_view("crop", (dsize[1], dsize[0], 3), np.uint8),
+                interpolation=cv2.INTER_AREA)
+
+        detection_result = self._detect(crop, timestamp_ms)
+        for pose_landmarks in detection_result.pose_landmarks:
+            for landmark in pose_landmarks:
+                landmark.x = (x0 + landmark.x * crop_width) / width
+                landmark.y = (y0 + landmark.y * crop_height) / height
+                landmark.z = landmark.z * crop_width / width
+        return detection_result
+
+    def _update_roi(self, detection_result, width, height):
+        if not detection_result.pose_landmarks:
+            self.roi = None
+            return
+
+        pose_landmarks = detection_result.pose_landmarks[0]
+        xs = np.clip([landmark.x for landmark in pose_landmarks], 0, 1) * width
+        ys = np.clip([landmark.y for landmark in pose_landmarks], 0, 1) * height
+        margin_x = max(ROI_MARGIN * (xs.max() - xs.min()), ROI_MIN_SIZE / 2)
+        margin_y = max(ROI_MARGIN * (ys.max() - ys.min()), ROI_MIN_SIZE / 2)
+        self.roi = (
+            int(max(0, xs.min() - margin_x)),
+            int(max(0, ys.min() - margin_y)),
+            int(min(width, xs.max() + margin_x)),
+            int(min(height, ys.max() + margin_y)),
+        )
+
+    def run_detection(self, image, timestamp_ms=None):
+        if not self.roi_tracking:
+            return self._detect(image, timestamp_ms)
+
+        height, width = image.shape[:2]
+        detection_result = None
+        if self.roi is not None:
+            detection_result = self._detect_in_region(image, self.roi, timestamp_ms)
+        # tracking lost, search the whole frame
+        if detection_result is None or not detection_result.pose_landmarks:
+            detection_result = self._detect_in_region(image, (0, 0, width, height), timestamp_ms)
+
+        self._update_roi(detection_result, width, height)
         return detection_result
     
-    def draw_landmarks_on_image(self, image, detection_result):
+    def draw_landmarks_on_image(self, image, detection_result, in_place=False):
         if not detection_result.pose_landmarks:
             return image
 
         pose_landmarks = detection_result.pose_landmarks[0]
-        annotated_image = np.copy(image)
+        annotated_image = image if in_place else np.copy(image)
 
         pose_landmarks_proto = landmark_pb2.NormalizedLandmarkList()
         pose_landmarks_proto.landmark.extend([
@@ -90,3 +271,19 @@ class MediaPipeDetector:
             "center_shoulders": center_shoulders,
             "center_hips": center_hips,
         }
+
+    def parse_visibility(self, detection_result):
+        """
+        Visibility of each keypoint of parse_landmarks, the lowest of the
+        landmarks it is computed from.
+        """
+        if not detection_result.pose_landmarks:
+            return {}
+
+        pose_landmarks = detection_result.pose_landmarks[0]
+        visibility = {}
+        for key, indices in KEYPOINT_LANDMARKS.items():
+            # the landmarker may leave visibility unset
+            values = [pose_landmarks[i].visibility for i in indices]
+            visibility[key] = min(1.0 if value is None else value for value in values)
+        return visibility
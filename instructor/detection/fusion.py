@@ -0,0 +1,265 @@
+import threading
+import time
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from .buffers import FrameBuffers
+from .camera import FrameSource
+from .deprojection import Deprojector
+from .tracker import CameraStages, PendingFrames
+
+
+class Extrinsics(NamedTuple):
+    """
+    Pose of a camera in the tracker frame: points p in the camera's frame
+    are rotation @ p + translation in the tracker frame.
+    """
+
+    rotation: np.ndarray
+    translation: np.ndarray
+
+    @classmethod
+    def identity(cls) -> "Extrinsics":
+        return cls(np.eye(3), np.zeros(3))
+
+    @classmethod
+    def from_config(cls, cfg: dict) -> "Extrinsics":
+        return cls(
+            np.asarray(cfg.get("rotation", np.eye(3)), dtype=np.float64).reshape(3, 3),
+            np.asarray(cfg.get("translation", np.zeros(3)), dtype=np.float64).reshape(3))
+
+    def apply(self, point: np.ndarray) -> np.ndarray:
+        return self.rotation @ point + self.translation
+
+
+class Observation(NamedTuple):
+    camera: str
+    # capture time of the frame the keypoints come from, from the device
+    # clock for RealSense cameras
+    timestamp: float
+    trace: object
+    # keypoints in the tracker frame, None where there is no depth
+    keypoints: Dict[str, Optional[np.ndarray]]
+    visibility: Dict[str, float]
+
+
+class CameraWorker(CameraStages):
+    """
+    Captures, detects and deprojects frames from one camera on its own
+    thread. OpenCV and MediaPipe release the GIL, so workers run in parallel
+    across cores. Each camera needs its own detector, since the landmarker
+    keeps per-stream state.
+    """
+
+    def __init__(
+        self,
+        camera: FrameSource,
+        detector,
+        extrinsics: Optional[Extrinsics] = None,
+        name: Optional[str] = None,
+        streaming_points: Sequence[str] = (),
+    ):
+        self.camera = camera
+        self.detector = detector
+        self.extrinsics = extrinsics or Extrinsics.identity()
+        self.name = name
+        self.streaming_points = list(streaming_points)
+        self.buffers = FrameBuffers()
+        self.pending = PendingFrames(self.buffers)
+        self.deprojector = Deprojector(
+            intrinsics=camera.intrinsics,
+            depth_scale=camera.depth_scale,
+            mirrored=True)
+
+        self.group = None
+        self.thread = None
+        self.frames = 0
+        self.busy = 0.0
+
+    def process_frame(self) -> Optional[Observation]:
+        """
+        Keypoints of the camera's next frame with a detection result, or
+        None once the camera has no frames left, which ends the worker.
+        """
+        # in live stream mode, frames are captured until one brings a new result
+        matched = None
+        while matched is None:
+            frames = self.camera.get_frames()
+            if frames is None:
+                return None
+            depth_frame, color_frame = frames
+            start = time.perf_counter()
+
+            depth_image = np.asanyarray(depth_frame.get_data())
+            color_image = np.asanyarray(color_frame.get_data())
+            depth_image, color_image = self.filter_images(depth_image, color_image)
+            detection_result, landmark_dict = self.detect(color_image)
+            matched = self.match_frame(depth_image, self.camera.trace)
+            self.frames += 1
+            self.busy += time.perf_counter() - start
+
+        start = time.perf_counter()
+        depth_image, trace = matched
+        keypoints = self.sample_depth(landmark_dict, depth_image)
+        visibility = self.detector.parse_visibility(detection_result)
+
+        keypoints = {
+            key: None if point is None else self.extrinsics.apply(point)
+            for key, point in keypoints.items()
+        }
+        timestamp = trace.capture_time if trace is not None else time.time()
+        self.busy += time.perf_counter() - start
+        return Observation(self.name, timestamp, trace, keypoints, visibility)
+
+    def run(self):
+        while not self.group.stopped:
+            try:
+                observation = self.process_frame()
+            except Exception as e:
+                print(f"camera {self.name} failed: {e!r}")
+                observation = None
+            if observation is None:
+                break
+            self.group.put(self, observation)
+        self.group.finished(self)
+
+
+class CameraGroup:
+    """
+    Runs a CameraWorker per camera and fuses their keypoints. Frames are
+    matched by capture time: the newest observation sets the reference time,
+    and each camera contributes its observation closest to it, if one is
+    within `tolerance` seconds. A camera that is late is waited for up to
+    `tolerance`, and left out after that. Each keypoint is averaged over
+    the cameras that see it, weighted by visibility.
+    """
+
+    def __init__(
+        self,
+        workers: Sequence[CameraWorker],
+        tolerance: float = 0.02,
+        min_visibility: float = 0.3,
+        queue_size: int = 4,
+    ):
+        self.workers = list(workers)
+        for i, worker in enumerate(self.workers):
+            worker.group = self
+            if worker.name is None:
+                worker.name = f"camera{i}"
+        self.tolerance = tolerance
+        self.min_visibility = min_visibility
+
+        self.condition = threading.Condition()
+        self.queues = {worker.name: deque(maxlen=queue_size) for worker in self.workers}
+        self.running = set()
+        self.started = False
+        self.stopped = False
+        # capture time of the last frame fused from each camera
+        self.used = {worker.name: -np.inf for worker in self.workers}
+
+    def start(self):
+        self.started = True
+        with self.condition:
+            self.running = {worker.name for worker in self.workers}
+        for worker in self.workers:
+            worker.thread = threading.Thread(target=worker.run, name=f"worker {worker.name}", daemon=True)
+            worker.thread.start()
+
+    def put(self, worker: CameraWorker, observation: Observation):
+        with self.condition:
+            self.queues[worker.name].append(observation)
+            self.condition.notify_all()
+
+    def finished(self, worker: CameraWorker):
+        with self.condition:
+            self.running.discard(worker.name)
+            self.condition.notify_all()
+
+    def _unused(self, name: str) -> List[Observation]:
+        return [o for o in self.queues[name] if o.timestamp > self.used[name]]
+
+    def _newest(self) -> Optional[float]:
+        times = [o.timestamp for name in self.queues for o in self._unused(name)]
+        return max(times, default=None)
+
+    def _complete(self, reference: float) -> bool:
+        for name in self.running:
+            if not any(o.timestamp >= reference - self.tolerance for o in self._unused(name)):
+                return False
+        return True
+
+    def next_observations(self, timeout: Optional[float] = None) -> Optional[List[Observation]]:
+        """
+        Waits for frames that haven't been fused yet and returns the matched
+        observations, one per camera at most. Returns None once every camera
+        has run out of frames, or on timeout.
+        """
+        if not self.started:
+            self.start()
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while (reference := self._newest()) is None:
+                if not self.running:
+                    return None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+
+            # give cameras behind the reference one tolerance to catch up
+            straggler_deadline = time.monotonic() + self.tolerance
+            while not self._complete(reference):
+                remaining = straggler_deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            # frames that arrived meanwhile are matched against the same
+            # reference, a newer one could be ahead of the cameras waited for
+
+            # each frame is fused once, frames older than the one used are dropped
+            observations = []
+            for name in self.queues:
+                candidates = [o for o in self._unused(name) if abs(o.timestamp - reference) <= self.tolerance]
+                if candidates:
+                    observation = min(candidates, key=lambda o: abs(o.timestamp - reference))
+                    self.used[name] = observation.timestamp
+                    observations.append(observation)
+        return observations
+
+    def fuse(self, observations: Sequence[Observation]) -> Dict[str, Optional[np.ndarray]]:
+        """
+        Visibility-weighted average of each keypoint over the observations
+        that have it. Keypoints no camera sees well enough map to None.
+        """
+        keys = {key for observation in observations for key in observation.keypoints}
+        fused = {}
+        for key in keys:
+            total = np.zeros(3)
+            weight = 0.0
+            for observation in observations:
+                point = observation.keypoints.get(key)
+                visibility = observation.visibility.get(key, 1.0)
+                if point is None or visibility < self.min_visibility:
+                    continue
+                total += visibility * point
+                weight += visibility
+            fused[key] = total / weight if weight > 0 else None
+        return fused
+
+    def oldest_trace(self, observations: Sequence[Observation]):
+        # latency is measured from the earliest frame that went into a result
+        traces = [o for o in observations if o.trace is not None]
+        return min(traces, key=lambda o: o.timestamp).trace if traces else None
+
+    @property
+    def allocations(self) -> int:
+        return sum(worker.buffers.allocations + worker.detector.buffers.allocations for worker in self.workers)
+
+    def close(self):
+        self.stopped = True
+        for worker in self.workers:
+            if worker.thread is not None:
+                worker.thread.join()
@@ -0,0 +1,68 @@
+import time
+
+import cv2
+import numpy as np
+
+from ..utils.shared_ring import SharedRing
+
+
+class PreviewPublisher:
+    """
+    Publishes downscaled annotated frames into a shared-memory ring at no
+    more than `rate` frames per second, for view_preview() to pick up.
+    """
+
+    def __init__(self, name: str, width: int = 640, rate: float = 10.0, capacity: int = 4):
+        self.name = name
+        self.width = width
+        self.period = 1.0 / rate
+        self.capacity = capacity
+        self.ring = None
+        self.frame = None
+        self.last_publish = 0.0
+
+    def due(self) -> bool:
+        return time.monotonic() - self.last_publish >= self.period
+
+    def publish(self, images: np.ndarray):
+        self.last_publish = time.monotonic()
+        height, width = images.shape[:2]
+        size = (self.width, max(1, round(height * self.width / width)))
+
+        # the ring is sized by the first frame
+        if self.ring is None:
+            self.ring = SharedRing.create(self.name, (size[1], size[0], 3), np.uint8, self.capacity)
+            self.frame = np.empty((size[1], size[0], 3), dtype=np.uint8)
+
+        cv2.resize(images, dsize=size, dst=self.frame, interpolation=cv2.INTER_AREA)
+        self.ring.write(self.frame)
+
+    def close(self):
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+
+def view_preview(name: str):
+    """
+    Shows the frames of a running tracker's preview until 'q' is pressed.
+    """
+    ring = None
+    while ring is None:
+        try:
+            ring = SharedRing.attach(name)
+        except FileNotFoundError:
+            print(f"waiting for preview {name}")
+            time.sleep(1.0)
+
+    last_index = -1
+    try:
+        while True:
+            if ring.write_count - 1 != last_index:
+                last_index, frame = ring.read_latest()
+                if frame is not None:
+                    cv2.imshow("RealSense", frame)
+            if cv2.waitKey(10) & 0xFF == ord('q'):
+                break
+    finally:
+        ring.close()
@@ -0,0 +1,236 @@
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+from .camera import ArrayFrame, FrameSource
+from .deprojection import Intrinsics
+from ..utils import new_trace
+
+
+INDEX_FILE = "index.json"
+
+
+def chunk_filename(dirname: str, kind: str, chunk: int) -> str:
+    return os.path.join(dirname, f"{kind}_{chunk:05d}.npy")
+
+
+class FrameRecorder:
+    """
+    Writes depth and color frames with their capture times into chunks of
+    preallocated .npy files, which can later be memory-mapped for replay.
+    """
+
+    def __init__(
+        self,
+        dirname: str,
+        chunk_frames: int = 300,
+        intrinsics: Optional[Intrinsics] = None,
+        depth_scale: float = 1e-3,
+        index_interval: int = 30,
+    ):
+        self.dirname = dirname
+        self.chunk_frames = chunk_frames
+        # frames between index updates, bounding what a crash loses
+        self.index_interval = index_interval
+        os.makedirs(dirname, exist_ok=True)
+
+        self.index = {
+            "chunk_frames": chunk_frames,
+            "chunks": [],
+            "intrinsics": intrinsics._asdict() if intrinsics is not None else None,
+            "depth_scale": depth_scale,
+        }
+        self.arrays = None
+        self.position = 0
+
+    def _open_chunk(self, depth_image: np.ndarray, color_image: np.ndarray):
+        chunk = len(self.index["chunks"])
+        self.arrays = {
+            "timestamp": np.lib.format.open_memmap(
+                chunk_filename(self.dirname, "timestamp", chunk), mode="w+",
+                dtype=np.float64, shape=(self.chunk_frames,)),
+            "depth": np.lib.format.open_memmap(
+                chunk_filename(self.dirname, "depth", chunk), mode="w+",
+                dtype=depth_image.dtype, shape=(self.chunk_frames,) + depth_image.shape),
+            "color": np.lib.format.open_memmap(
+                chunk_filename(self.dirname, "color", chunk), mode="w+",
+                dtype=color_image.dtype, shape=(self.chunk_frames,) + color_image.shape),
+        }
+        self.index["chunks"].append(0)
+        self.position = 0
+        self._write_index()
+
+    def _write_index(self):
+        # replayers must never see a partly written index
+        filename = os.path.join(self.dirname, INDEX_FILE)
+        with open(filename + ".tmp", "w") as f:
+            json.dump(self.index, f)
+        os.replace(filename + ".tmp", filename)
+
+    def write(self, timestamp: float, depth_image: np.ndarray, color_image: np.ndarray):
+        if self.arrays is None or self.position == self.chunk_frames:
+            self._close_chunk()
+            self._open_chunk(depth_image, color_image)
+
+        self.arrays["timestamp"][self.position] = timestamp
+        self.arrays["depth"][self.position] = depth_image
+        self.arrays["color"][self.position] = color_image
+        self.position += 1
+        self.index["chunks"][-1] = self.position
+        # pages written through the mappings outlive this process, so the
+        # frames listed survive a crash or ctrl-c
+        if self.position % self.index_interval == 0:
+            self._write_index()
+
+    def _close_chunk(self):
+        if self.arrays is None:
+            return
+        for array in self.arrays.values():
+            array.flush()
+        self.arrays = None
+        # the index only lists frames that are fully on disk
+        self._write_index()
+
+    def close(self):
+        self._close_chunk()
+
+
+class ReplayClock:
+    """
+    Puts the frames of several replayed cameras on one clock, so frames
+    recorded together are served and stamped together. The recorded times
+    are shifted so that the earliest recorded frame is due when the first
+    frame is requested. In realtime, frames are paced by the clock;
+    otherwise every camera waits until it holds the oldest frame not yet
+    served, so frames come out in recorded order however fast each camera
+    is read. A camera that doesn't ask for its next frame within `patience`
+    seconds is not waited for until it does.
+    """
+
+    def __init__(self, realtime: bool = True, patience: float = 1.0):
+        self.realtime = realtime
+        self.patience = patience
+        self.condition = threading.Condition()
+        self.start_timestamp = None
+        self.offset = None
+        # length of the recordings, a looping camera's times advance by it
+        self.span = 0.0
+        # time of the next frame of each camera still serving frames
+        self.next_times = {}
+
+    def add(self, camera, first: float, last: float, period: float):
+        with self.condition:
+            self.start_timestamp = first if self.start_timestamp is None else min(self.start_timestamp, first)
+            self.span = max(self.span, last + period - self.start_timestamp)
+            self.next_times[camera] = first
+
+    def wait(self, camera, timestamp: float) -> float:
+        """
+        Waits until the frame recorded at `timestamp` is due and returns its
+        time on the clock.
+        """
+        with self.condition:
+            if self.offset is None:
+                self.offset = time.time() - self.start_timestamp
+            self.next_times[camera] = timestamp
+            self.condition.notify_all()
+            if not self.realtime:
+                if not self.condition.wait_for(lambda: timestamp <= min(self.next_times.values()), self.patience):
+                    # stalled cameras are ordered again once they ask for a frame
+                    for other, next_time in list(self.next_times.items()):
+                        if next_time < timestamp:
+                            del self.next_times[other]
+        if self.realtime:
+            delay = timestamp + self.offset - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        return timestamp + self.offset
+
+    def finished(self, camera):
+        with self.condition:
+            self.next_times.pop(camera, None)
+            self.condition.notify_all()
+
+
+class ReplayCamera(FrameSource):
+    """
+    Serves frames written by FrameRecorder. Frames are views into the
+    memory-mapped chunk files, so nothing is copied until a consumer does.
+
+    With `realtime` set, frames are paced by their recorded timestamps;
+    otherwise they are served as fast as they are requested. Cameras
+    replayed together share a ReplayClock, and each frame's trace carries
+    its recorded capture time on that clock.
+    """
+
+    def __init__(
+        self,
+        dirname: str,
+        realtime: bool = True,
+        loop: bool = False,
+        clock: Optional[ReplayClock] = None,
+    ):
+        with open(os.path.join(dirname, INDEX_FILE), "r") as f:
+            index = json.load(f)
+
+        self.chunks = []
+        for chunk, num_frames in enumerate(index["chunks"]):
+            self.chunks.append({
+                kind: np.load(chunk_filename(dirname, kind, chunk), mmap_mode="r")[:num_frames]
+                for kind in ("timestamp", "depth", "color")
+            })
+        self.num_frames = sum(index["chunks"])
+        self.chunk_frames = index["chunk_frames"]
+        if index.get("intrinsics") is not None:
+            self.intrinsics = Intrinsics(**index["intrinsics"])
+        self.depth_scale = index.get("depth_scale", 1e-3)
+
+        self.loop = loop
+        self.chunk = 0
+        self.position = 0
+        self.loops = 0
+        self.trace = None
+        self.clock = clock if clock is not None else ReplayClock(realtime)
+        if self.num_frames > 0:
+            timestamps = np.concatenate([chunk["timestamp"] for chunk in self.chunks])
+            period = float(np.median(np.diff(timestamps))) if len(timestamps) > 1 else 0.0
+            self.clock.add(self, float(timestamps[0]), float(timestamps[-1]), period)
+
+    def __len__(self):
+        return self.num_frames
+
+    def read(self, frame: int):
+        """
+        Returns the timestamp, depth image and color image of a frame.
+        """
+        arrays = self.chunks[frame // self.chunk_frames]
+        position = frame % self.chunk_frames
+        return arrays["timestamp"][position], arrays["depth"][position], arrays["color"][position]
+
+    def get_frames(self):
+        if self.chunk == len(self.chunks):
+            if not self.loop or self.num_frames == 0:
+                self.clock.finished(self)
+                return
+            self.chunk, self.position = 0, 0
+            self.loops += 1
+
+        arrays = self.chunks[self.chunk]
+        timestamp = arrays["timestamp"][self.position]
+        depth_image = arrays["depth"][self.position]
+        color_image = arrays["color"][self.position]
+
+        self.position += 1
+        if self.position == len(arrays["timestamp"]):
+            self.chunk, self.position = self.chunk + 1, 0
+
+        capture_time = self.clock.wait(self, float(timestamp) + self.loops * self.clock.span)
+        self.trace = new_trace(capture_time)
+        return ArrayFrame(depth_image), ArrayFrame(color_image)
+
+    def close(self):
+        self.clock.finished(self)
@@ -0,0 +1,102 @@
+import math
+import multiprocessing
+import time
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from .detector import MediaPipeDetector
+from .recording import ReplayCamera
+from .tracker import PoseTracker
+from ..utils import get_config
+
+
+def detect_shard(dirname: str, start: int, stop: int, warmup: int) -> List[Tuple[float, dict]]:
+    """
+    Runs detection on frames [start, stop) of a recording with a fresh
+    VIDEO-mode landmarker. The `warmup` frames before `start` are processed
+    but dropped, so the landmarker's tracking and the tracker's smoothing
+    history are in the same state as in a sequential pass.
+    """
+    camera = ReplayCamera(dirname, realtime=False)
+    tracker = PoseTracker(
+        camera=camera,
+        detector=MediaPipeDetector(running_mode="video"),
+        display=False,
+    )
+
+    rows = []
+    for frame in range(max(0, start - warmup), stop):
+        timestamp, depth_image, color_image = camera.read(frame)
+        depth_image, color_image = tracker.filter_images(depth_image, color_image)
+
+        detection_result = tracker.detector.run_detection(color_image, timestamp_ms=int(1e3 * timestamp))
+        landmark_dict = tracker.detector.parse_landmarks(detection_result)
+        keypoints = tracker.sample_depth(landmark_dict, depth_image)
+        smoothed_keypoints = tracker.smooth_keypoints(keypoints)
+
+        if frame >= start:
+            rows.append((float(timestamp), smoothed_keypoints))
+    return rows
+
+
+def _detect_shard(args):
+    return detect_shard(*args)
+
+
+def redetect(
+    dirname: str,
+    workers: int,
+    warmup: int = 15,
+    shards: Optional[int] = None,
+) -> List[Tuple[float, dict]]:
+    """
+    Re-runs detection over a recording on a pool of processes, one
+    landmarker per process, and returns the rows in timestamp order.
+    """
+    num_frames = len(ReplayCamera(dirname, realtime=False))
+    shards = shards or workers
+    shard_size = math.ceil(num_frames / shards)
+    tasks = [
+        (dirname, start, min(start + shard_size, num_frames), warmup)
+        for start in range(0, num_frames, shard_size)
+    ]
+
+    # mediapipe graphs do not survive a fork
+    with multiprocessing.get_context("spawn").Pool(workers) as pool:
+        results = pool.map(_detect_shard, tasks)
+
+    rows = [row for shard in results for row in shard]
+    rows.sort(key=lambda row: row[0])
+    return rows
+
+
+def write_history(filename: str, rows: List[Tuple[float, dict]]):
+    """
+    Writes rows in the format of save_history.py.
+    """
+    cfg = get_config()
+    prefix = cfg["redis"]["realsense_prefix"]
+    keys = cfg["pose_keypoints"]
+
+    with open(filename, "w") as f:
+        f.write("\t".join(["timestamp"] + [prefix + key for key in keys]) + "\n")
+        for timestamp, keypoints in rows:
+            row = [datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S.%f")]
+            for key in keys:
+                smoothed = keypoints.get(key)
+                row.append("None" if smoothed is None else "[" + ", ".join(map(str, smoothed)) + "]")
+            f.write("\t".join(row) + "\n")
+
+
+def measure_scaling(dirname: str, worker_counts: List[int], warmup: int = 15):
+    """
+    Times redetect() for each worker count. Returns (workers, frames per
+    second) pairs.
+    """
+    num_frames = len(ReplayCamera(dirname, realtime=False))
+    results = []
+    for workers in worker_counts:
+        start = time.perf_counter()
+        redetect(dirname, workers=workers, warmup=warmup)
+        results.append((workers, num_frames / (time.perf_counter() - start)))
+    return results
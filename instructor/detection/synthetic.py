@@ -0,0 +1,109 @@
+from typing import NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from .buffers import FrameBuffers
+from .camera import ArrayFrame, FrameSource
+from .deprojection import default_intrinsics
+from .detector import MediaPipeDetector
+from ..utils import new_trace
+
+
+NUM_POSE_LANDMARKS = 33
+
+
+class SyntheticCamera(FrameSource):
+    """
+    Generates depth and color frames without a camera. The depth frame is
+    smaller than the color frame by `depth_decimation`, matching what the
+    decimation filter does to RealSense frames.
+    """
+
+    def __init__(
+        self,
+        width: int = 1280,
+        height: int = 720,
+        depth_decimation: int = 2,
+        num_frames: int = 30,
+        seed: int = 0,
+    ):
+        rng = np.random.default_rng(seed)
+        depth_height, depth_width = height // depth_decimation, width // depth_decimation
+
+        # a tilted floor-to-wall gradient around 2 m with sensor noise, plus a
+        # closer blob moving across the frame
+        ys, xs = np.mgrid[0:depth_height, 0:depth_width]
+        background = 2000 + 500 * ys / depth_height
+        self.depth_frames = []
+        self.color_frames = []
+        for i in range(num_frames):
+            cx = depth_width * (0.3 + 0.4 * i / num_frames)
+            blob = ((xs - cx) ** 2 + (ys - depth_height / 2) ** 2) < (depth_height / 4) ** 2
+            depth = background + rng.normal(0, 10, background.shape) - 800 * blob
+            self.depth_frames.append(depth.astype(np.uint16))
+            self.color_frames.append(rng.integers(0, 256, (height, width, 3), dtype=np.uint8))
+
+        self.index = 0
+        self.trace = None
+        self.intrinsics = default_intrinsics(width, height)
+
+    def get_frames(self):
+        self.trace = new_trace()
+        i = self.index % len(self.depth_frames)
+        self.index += 1
+        return ArrayFrame(self.depth_frames[i]), ArrayFrame(self.color_frames[i])
+
+
+class Landmark(NamedTuple):
+    x: float
+    y: float
+    z: float
+    visibility: float = 1.0
+
+
+class DetectionResult(NamedTuple):
+    pose_landmarks: list
+
+
+def make_dance_landmarks(num_frames: int = 60) -> list:
+    """
+    Scripted normalized pose landmarks for a person waving both arms.
+    """
+    frames = []
+    for i in range(num_frames):
+        phase = 2 * np.pi * i / num_frames
+        points = np.full((NUM_POSE_LANDMARKS, 3), [0.5, 0.5, 0.0])
+
+        points[0] = [0.5, 0.2, 0]                               # nose
+        points[11], points[12] = [0.4, 0.35, 0], [0.6, 0.35, 0]  # shoulders
+        points[23], points[24] = [0.43, 0.65, 0], [0.57, 0.65, 0]  # hips
+        points[13] = [0.33, 0.45 - 0.1 * np.sin(phase), 0]       # elbows
+        points[14] = [0.67, 0.45 - 0.1 * np.cos(phase), 0]
+        for j in (15, 17, 19, 21):                               # right hand
+            points[j] = [0.25, 0.4 - 0.2 * np.sin(phase), 0]
+        for j in (16, 18, 20, 22):                               # left hand
+            points[j] = [0.75, 0.4 - 0.2 * np.cos(phase), 0]
+        points[25:] = [0.5, 0.9, 0]                              # legs
+
+        frames.append([Landmark(*p) for p in points])
+    return frames
+
+
+class ScriptedDetector(MediaPipeDetector):
+    """
+    Detector that replays scripted landmarks instead of running the
+    MediaPipe model, so no model file is needed.
+    """
+
+    def __init__(self, landmarks: Optional[Sequence[list]] = None):
+        self.landmarks = landmarks if landmarks is not None else make_dance_landmarks()
+        self.index = 0
+        self.buffers = FrameBuffers()
+        self.last_timestamp_ms = -1
+        self.result_timestamp_ms = None
+
+    def run_detection(self, image, timestamp_ms=None):
+        pose_landmarks = self.landmarks[self.index % len(self.landmarks)]
+        self.last_timestamp_ms = self.result_timestamp_ms = self.index
+        self.index += 1
+        return DetectionResult(pose_landmarks=[pose_landmarks] if pose_landmarks else [])
@@ -1,39 +1,195 @@
 import argparse
 import os
 import time
+from collections import deque
 from datetime import datetime
-from typing import Sequence
+from typing import TYPE_CHECKING, Callable, Optional, Sequence
 
 import cv2
 import numpy as np
 import redis
-import scipy
 
-from .camera import RealSenseCamera
-from .detector import MediaPipeDetector
-from ..utils import get_config, make_redis_client
+from .buffers import FrameBuffers
+from .camera import FrameSource
+from .deprojection import Deprojector
+from .preview import PreviewPublisher
+from ..utils import TRACE_KEY, KeypointRing, StatusLine, format_trace, get_config, get_tracer, make_redis_client
+
+if TYPE_CHECKING:
+    from .detector import MediaPipeDetector
+    from .fusion import CameraWorker
 
 
 EMA_BETA = 0.9
 
-class PoseTracker:
+
+class PendingFrames:
+    """
+    Depth images and traces of the last few frames submitted to the
+    detector, in reused buffers. In live stream mode a result arrives for an
+    earlier frame, and its landmarks are deprojected with that frame's depth.
+    """
+
+    def __init__(self, buffers: FrameBuffers, size: int = 4):
+        self.buffers = buffers
+        self.size = size
+        self.frames = deque(maxlen=size)
+        self.slot = 0
+        self.last_result_ms = None
+
+    def match(self, detector, depth_image, trace):
+        """
+        Depth image and trace of the frame the detector's last result
+        belongs to, or None if that result was matched before or its frame
+        is no longer held.
+        """
+        submitted_ms, result_ms = detector.last_timestamp_ms, detector.result_timestamp_ms
+        if result_ms == submitted_ms:
+            self.frames.clear()
+            self.last_result_ms = result_ms
+            return depth_image, trace
+
+        # the deque drops the frame whose buffer is reused here
+        self.slot = (self.slot + 1) % self.size
+        held = self.buffers.get(f"pending_depth{self.slot}", depth_image.shape, depth_image.dtype)
+        np.copyto(held, depth_image)
+        self.frames.append((submitted_ms, held, trace))
+
+        if result_ms is None or result_ms == self.last_result_ms:
+            return None
+        self.last_result_ms = result_ms
+        while self.frames and self.frames[0][0] < result_ms:
+            self.frames.popleft()
+        if not self.frames or self.frames[0][0] != result_ms:
+            return None
+        _, held, trace = self.frames.popleft()
+        return held, trace
+
+
+class CameraStages:
+    """
+    Per-camera stages of the frame path, shared by PoseTracker and the
+    fusion camera workers. Expects `buffers`, `detector`, `deprojector`,
+    `pending` and `streaming_points` attributes.
+    """
+
+    def filter_images(self, depth_image, color_image):
+        """
+        Mirrors both images, smooths depth with a 3x3 box filter and resizes
+        color to the depth resolution. Returns views of reused buffers that
+        are overwritten by the next frame.
+        """
+        height, width = depth_image.shape
+
+        # flip while converting, so nothing downstream sees a negative stride
+        depth_float = self.buffers.get("depth_float", (height, width), np.float32)
+        np.copyto(depth_float, depth_image[:, ::-1])
+        depth_filtered = self.buffers.get("depth_filtered", (height, width), np.float32)
+        cv2.blur(depth_float, (3, 3), dst=depth_filtered, borderType=cv2.BORDER_CONSTANT)
+
+        color_flipped = self.buffers.get("color", (height, width, 3), np.uint8)
+        if color_image.shape[:2] != (height, width):
+            color_resized = self.buffers.get("color_resized", (height, width, 3), np.uint8)
+            cv2.resize(
+                color_image,
+                dsize=(width, height),
+                dst=color_resized,
+                interpolation=cv2.INTER_AREA)
+            color_image = color_resized
+        cv2.flip(color_image, 1, dst=color_flipped)
+        return depth_filtered, color_flipped
+
+    def detect(self, color_image):
+        detection_result = self.detector.run_detection(color_image)
+        landmark_dict = self.detector.parse_landmarks(detection_result)
+        return detection_result, landmark_dict
+
+    def match_frame(self, depth_image, trace):
+        return self.pending.match(self.detector, depth_image, trace)
+
+    def sample_depth(self, landmark_dict, depth_image):
+        """
+        Converts the streamed landmarks to 3D. Landmarks outside the depth
+        image or without depth map to None.
+        """
+        keys = [key for key in landmark_dict if key in self.streaming_points]
+        if not keys:
+            return {}
+
+        pixels = np.array([landmark_dict[key][:2] for key in keys])
+        points = self.deprojector.deproject(pixels, depth_image)
+
+        keypoints = {}
+        for key, point in zip(keys, points):
+            keypoints[key] = None if np.isnan(point[2]) else point
+        return keypoints
+
+
+class PoseTracker(CameraStages):
 
     def __init__(
         self,
         stream_outputs: bool = False,
         history_length: int = 5,
+        camera: Optional[FrameSource] = None,
+        detector: Optional["MediaPipeDetector"] = None,
+        redis_client: Optional[redis.Redis] = None,
+        display: bool = True,
+        headless: bool = False,
+        preview: Optional[PreviewPublisher] = None,
+        stage_timer: Optional[Callable[[str, float], None]] = None,
+        status_interval: float = 1.0,
+        cameras: Optional[Sequence["CameraWorker"]] = None,
+        keypoint_ring: Optional[KeypointRing] = None,
     ):
         cfg = get_config()
         self.realsense_prefix = cfg["redis"]["realsense_prefix"]
         self.streaming_points = cfg["pose_keypoints"]
 
-        self.camera = RealSenseCamera()
-        self.detector = MediaPipeDetector()
-        self.redis_client = make_redis_client()
+        # with several cameras, keypoints are fused from their workers and
+        # nothing is drawn
+        self.cameras = None
+        if cameras:
+            from .fusion import CameraGroup
+            for worker in cameras:
+                worker.streaming_points = self.streaming_points
+            self.cameras = CameraGroup(cameras, **cfg.get("fusion", {}))
+            camera, detector = cameras[0].camera, cameras[0].detector
+            display, headless, preview = False, True, None
+
+        if camera is None:
+            from .camera import RealSenseCamera
+            camera = RealSenseCamera()
+        if detector is None:
+            from .detector import MediaPipeDetector
+            detector = MediaPipeDetector(**cfg.get("detection", {}))
+        self.camera = camera
+        self.detector = detector
+        self.redis_client = redis_client or make_redis_client()
+        self.buffers = FrameBuffers()
+        self.pending = PendingFrames(self.buffers)
+        self.deprojector = Deprojector(
+            intrinsics=self.camera.intrinsics,
+            depth_scale=self.camera.depth_scale,
+            mirrored=True)
+        self.tracer = get_tracer("detection")
 
         self.stream_outputs = stream_outputs
+        # every frame's keypoints, for consumers on this host
+        self.keypoint_ring = keypoint_ring
+        # headless skips all drawing, except for frames due for the preview
+        self.headless = headless
+        self.display = display and not headless
+        self.preview = preview
+        # called with (stage, seconds) after each stage of process_frame
+        self.stage_timer = stage_timer
         self.history_length = history_length
         self.timesteps = 0
+        # keypoints are printed once per status interval, not every frame
+        self.status = StatusLine(interval=status_interval)
+        self.status_timesteps = 0
+        self.status_time = time.monotonic()
+        self.smoothed_keypoints = {}
 
         # initialize history
         self.history = {}
@@ -63,73 +219,129 @@ class PoseTracker:
         smoothed_values = np.dot(weights.T, np.nan_to_num(self.history[key]))
         return smoothed_values
 
-    def process_frame(self) -> bool:
-        print(f"\nt = {self.timesteps}")
-        depth_frame, color_frame = self.camera.get_frames()
-
-        depth_image = np.asanyarray(depth_frame.get_data())[:,::-1]
-        color_image = np.asanyarray(color_frame.get_data())[:,::-1,:]
-
-        depth_image = scipy.signal.convolve2d(
-            in1=depth_image,
-            in2=np.ones((3, 3)) / 9,
-            mode="same",
-        )
-
-        depth_colormap = cv2.applyColorMap(
-            cv2.convertScaleAbs(depth_image, alpha=0.03),cv2.COLORMAP_JET)
-        
-        depth_colormap_dim = depth_colormap.shape
-        height, width, _ = depth_colormap_dim
-        color_colormap_dim = color_image.shape
-
-        if depth_colormap_dim != color_colormap_dim:
-            color_image = cv2.resize(
-                color_image, 
-                dsize=(depth_colormap_dim[1], depth_colormap_dim[0]),
-                interpolation=cv2.INTER_AREA)
-
-        detection_result = self.detector.run_detection(color_image)
-        color_image = self.detector.draw_landmarks_on_image(color_image, detection_result)
-        depth_colormap = self.detector.draw_landmarks_on_image(depth_colormap, detection_result)
-        images = np.hstack((color_image, depth_colormap))
+    def _timed(self, stage, fn, *args):
+        if self.stage_timer is None:
+            return fn(*args)
+        start = time.perf_counter()
+        result = fn(*args)
+        self.stage_timer(stage, time.perf_counter() - start)
+        return result
 
-        landmark_dict = self.detector.parse_landmarks(detection_result)
+    @property
+    def allocations(self) -> int:
+        """
+        Number of image buffers allocated so far. Constant once the frame
+        size is stable.
+        """
+        if self.cameras is not None:
+            return self.cameras.allocations
+        return self.buffers.allocations + self.detector.buffers.allocations
 
-        def get_depth_at_pixel(x, y):
-            x, y = int(x * width), int(y * height)
-            if x < 0 or x >= width or y < 0 or y >= height:
-                return None
+    def smooth_keypoints(self, keypoints):
+        smoothed = {}
+        for key, landmark in keypoints.items():
+            if landmark is None:
+                smoothed[key] = self.smooth_values(key, [np.nan] * 3)
             else:
-                return 1e-3 * depth_image[y, x]
-            
-        for key in landmark_dict:
-            if key not in self.streaming_points:
-                continue
+                smoothed[key] = self.smooth_values(key, landmark)
+        return smoothed
+
+    def publish(self, smoothed_keypoints, trace=None):
+        for key, smoothed in smoothed_keypoints.items():
+            if smoothed is not None and self.stream_outputs:
+                self.redis_client.set(self.realsense_prefix + key, "[" + ", ".join(map(str, smoothed)) + "]")
 
-            landmark = landmark_dict[key]
-            depth = get_depth_at_pixel(landmark[0], landmark[1])
+        if self.keypoint_ring is not None:
+            self.keypoint_ring.write(
+                trace.capture_time if trace is not None else time.time(),
+                trace.trace_id if trace is not None else 0,
+                smoothed_keypoints)
 
-            if depth is None:
-                smoothed = self.smooth_values(key, [np.nan] * 3)
-            else:
-                # landmark[0] = width * (landmark[0] - 0.5) * (depth / 640)
-                # landmark[1] = height * (landmark[1] - 0.5) * (depth / 640)
-                landmark[0] = width * (landmark[0] - 0.5)  * 2 / 640
-                landmark[1] = height * (-landmark[1] + 0.5) * 2 / 640
-                landmark[2] = depth
-                smoothed = self.smooth_values(key, landmark)
+        # the capture time is also what the live mirror measures latency by
+        if self.stream_outputs and trace is not None:
+            self.redis_client.set(self.realsense_prefix + TRACE_KEY, format_trace(trace))
+            self.tracer.span(trace, "detect", start=trace.capture_time)
+
+    def draw(self, color_image, depth_image, detection_result):
+        # color and depth are drawn side by side straight into one buffer
+        height, width = depth_image.shape
+        images = self.buffers.get("images", (height, 2 * width, 3), np.uint8)
+        color_view, depth_view = images[:, :width], images[:, width:]
+
+        np.copyto(color_view, color_image)
+        depth_scaled = self.buffers.get("depth_scaled", (height, width), np.uint8)
+        cv2.convertScaleAbs(depth_image, dst=depth_scaled, alpha=0.03)
+        cv2.applyColorMap(depth_scaled, cv2.COLORMAP_JET, dst=depth_view)
+
+        self.detector.draw_landmarks_on_image(color_view, detection_result, in_place=True)
+        self.detector.draw_landmarks_on_image(depth_view, detection_result, in_place=True)
+        return images
+
+    def print_status(self, smoothed_keypoints):
+        now = time.monotonic()
+        fps = (self.timesteps - self.status_timesteps) / max(now - self.status_time, 1e-9)
+        self.status_timesteps, self.status_time = self.timesteps, now
 
+        print(f"\nt = {self.timesteps}   {fps:.1f} fps")
+        if self.cameras is not None:
+            print("   ".join(f"{worker.name}: {worker.frames} frames" for worker in self.cameras.workers))
+        for key, smoothed in smoothed_keypoints.items():
             if smoothed is None:
                 print(f"{key: <15}   null")
-                continue
+            else:
+                print(f"{key: <15}   x: {smoothed[0]: 3.2f}  y: {smoothed[1]: 3.2f}  z: {smoothed[2]: 3.2f}")
 
-            if self.stream_outputs:
-                self.redis_client.set(self.realsense_prefix + key, "[" + ", ".join(map(str, smoothed)) + "]")
+    def process_fused_frame(self) -> bool:
+        observations = self._timed("capture", self.cameras.next_observations)
+        if observations is None:
+            return False
+        keypoints = self._timed("fusion", self.cameras.fuse, observations)
+        smoothed_keypoints = self._timed("smoothing", self.smooth_keypoints, keypoints)
+        self._timed("publishing", self.publish, smoothed_keypoints, self.cameras.oldest_trace(observations))
 
-            print(f"{key: <15}   x: {smoothed[0]: 3.2f}  y: {smoothed[1]: 3.2f}  z: {smoothed[2]: 3.2f}")
-                
         self.timesteps += 1
+        if self.status.due():
+            self.print_status(smoothed_keypoints)
+        return True
+
+    def process_frame(self) -> bool:
+        if self.cameras is not None:
+            return self.process_fused_frame()
+
+        frames = self._timed("capture", self.camera.get_frames)
+        if frames is None:
+            return False
+        depth_frame, color_frame = frames
 
-        cv2.imshow("RealSense", images)
+        depth_image = np.asanyarray(depth_frame.get_data())
+        color_image = np.asanyarray(color_frame.get_data())
+
+        depth_image, color_image = self._timed("filtering", self.filter_images, depth_image, color_image)
+        detection_result, landmark_dict = self._timed("detection", self.detect, color_image)
+        # a live stream result that was already published is not smoothed again
+        matched = self.match_frame(depth_image, self.camera.trace)
+        if matched is not None:
+            result_depth, trace = matched
+            keypoints = self._timed("depth_sampling", self.sample_depth, landmark_dict, result_depth)
+            self.smoothed_keypoints = self._timed("smoothing", self.smooth_keypoints, keypoints)
+            self._timed("publishing", self.publish, self.smoothed_keypoints, trace)
+        preview_due = self.preview is not None and self.preview.due()
+        if not self.headless or preview_due:
+            images = self._timed("drawing", self.draw, color_image, depth_image, detection_result)
+            if preview_due:
+                self._timed("preview", self.preview.publish, images)
+
+        self.timesteps += 1
+        if self.status.due():
+            self.print_status(self.smoothed_keypoints)
+
+        if self.display:
+            cv2.imshow("RealSense", images)
         return True
+
+    def close(self):
+        if self.cameras is not None:
+            self.cameras.close()
+        if self.keypoint_ring is not None:
+            self.keypoint_ring.close()
+            self.keypoint_ring = None
@@ -0,0 +1,11 @@
+from typing import TYPE_CHECKING
+
+from ..utils import lazy_attributes
+
+__getattr__ = lazy_attributes(__name__, {
+    "MoveInfo": ".library",
+    "MoveLibrary": ".library",
+})
+
+if TYPE_CHECKING:
+    from .library import MoveInfo, MoveLibrary
@@ -0,0 +1,99 @@
+import csv
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+
+from .interpolation import interpolate_file
+from .spline import SplineMove
+from ..utils import TRACE_KEY, format_point, get_config, get_history_reader, get_keypoint_ring
+from ..utils.history import TIME_FORMAT
+
+
+# attached once per worker process
+keypoint_ring = None
+
+
+class DefinedMove(NamedTuple):
+    move_id: str
+    # written under temporary names, renamed into place when the move is registered
+    raw_file: str
+    spline_file: str
+    move: SplineMove
+    timings: Dict[str, float]
+
+
+def save_move_coordinates(filename: str, coordinates: List[dict]):
+    with open(filename, "w") as file:
+        writer = csv.DictWriter(file, fieldnames=coordinates[0].keys(), delimiter="\t")
+        writer.writeheader()
+        writer.writerows(coordinates)
+
+
+def read_window(start_time: float, stop_time: float) -> List[Dict[str, str]]:
+    """
+    Rows of the pose history between start_time and stop_time. Windows the
+    tracker's keypoint ring on this host still holds are cut straight from
+    shared memory, older ones are read from the history segments.
+    """
+    global keypoint_ring
+    latest = keypoint_ring.latest() if keypoint_ring is not None else None
+    # a restarted tracker writes to a new segment
+    if latest is None or latest.timestamp < time.time() - 1.0:
+        if keypoint_ring is not None:
+            keypoint_ring.close()
+        keypoint_ring = get_keypoint_ring()
+
+    oldest = keypoint_ring.oldest_timestamp() if keypoint_ring is not None else None
+    if oldest is None or oldest > start_time:
+        return get_history_reader().read(datetime.fromtimestamp(start_time), datetime.fromtimestamp(stop_time))
+
+    cfg = get_config()
+    prefix = cfg["redis"]["realsense_prefix"]
+    columns = [prefix + key for key in keypoint_ring.keys]
+    # the same [trace_id, capture_time] column save_history writes
+    traced = cfg.get("tracing", {}).get("enabled", False)
+    rows = []
+    for record in keypoint_ring.records(start_time, stop_time):
+        timestamp = float(record["timestamp"])
+        row = {"timestamp": datetime.fromtimestamp(timestamp).strftime(TIME_FORMAT)}
+        row.update(zip(columns, map(format_point, record["points"])))
+        if traced:
+            row[prefix + TRACE_KEY] = str([int(record["trace_id"]), timestamp])
+        rows.append(row)
+    return rows
+
+
+def define_move(
+    move_id: str,
+    start_time: float,
+    stop_time: float,
+    smoothness: float,
+    recordings_dir: str,
+    suffix: str,
+) -> Optional[DefinedMove]:
+    """
+    Cuts a move out of the pose history, or the keypoint ring, and fits its
+    splines. Runs in a worker process; files are written with `suffix` in
+    their names so that concurrent definitions of the same move never touch
+    the same file.
+    Returns None if the history has no rows in the window.
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    coordinates = read_window(start_time, stop_time)
+    timings["extract"] = time.perf_counter() - start
+    if not coordinates:
+        return None
+
+    start = time.perf_counter()
+    raw_file = os.path.join(recordings_dir, f"{move_id}.{suffix}.txt")
+    save_move_coordinates(raw_file, coordinates)
+    timings["save"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    spline_file, move = interpolate_file(raw_file, smoothness)
+    timings["interpolate"] = time.perf_counter() - start
+
+    return DefinedMove(move_id, raw_file, spline_file, move, timings)
@@ -0,0 +1,255 @@
+import asyncio
+import itertools
+import time
+from typing import Callable, Iterable, List, NamedTuple, Optional
+
+import numpy as np
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+
+from ..utils import Profiler, Trace, Tracer
+from ..utils.profiling import Histogram
+
+
+class Calibration:
+    """
+    Maps setpoints from the shared workspace into one robot's frame: rotated,
+    scaled, then offset.
+    """
+
+    def __init__(self, rotation=None, scale: float = 1.0, offset=None):
+        self.rotation = np.eye(3) if rotation is None else np.asarray(rotation, dtype=np.float64)
+        self.scale = scale
+        self.offset = np.zeros(3) if offset is None else np.asarray(offset, dtype=np.float64)
+
+    def apply(self, coords: np.ndarray) -> np.ndarray:
+        return self.scale * coords @ self.rotation.T + self.offset
+
+
+class Segment(NamedTuple):
+    # setpoints, one per tick
+    coords: np.ndarray
+    # (trace id, capture time) of each setpoint's frame, or None
+    traces: Optional[np.ndarray] = None
+    # called once every robot has sent the last setpoint
+    done: Optional[Callable[[], None]] = None
+
+    @classmethod
+    def marker(cls, done: Callable[[], None]) -> "Segment":
+        return cls(np.empty((0, 3)), None, done)
+
+
+class Robot:
+    """
+    One robot's Redis endpoint. Setpoints are sent on the tick they are due;
+    a robot that falls behind within a segment skips to the newest due
+    setpoint rather than drifting out of step with the others.
+    """
+
+    def __init__(self, name: str, host: str, port: int, goal_key: str, calibration: Calibration):
+        self.name = name
+        self.goal_key = goal_key
+        self.calibration = calibration
+        self.client = aioredis.Redis(host=host, port=port, decode_responses=True)
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.lag = Histogram()
+        self.skipped = 0
+        self.errors = 0
+
+    async def connect(self) -> bool:
+        try:
+            await self.client.ping()
+            return True
+        except (RedisError, OSError) as e:
+            print(f"robot {self.name} unavailable: {e}")
+            return False
+
+    async def stream(
+        self,
+        queue: asyncio.Queue,
+        rate: float,
+        on_done: Callable[[int], None],
+        profiler: Profiler,
+        tracer: Optional[Tracer] = None,
+    ):
+        loop = asyncio.get_running_loop()
+        last_trace_id = None
+
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            index, start, payloads, traces = item
+
+            i = 0
+            while i < len(payloads):
+                due = start + i / rate
+                delay = due - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    latest = min(len(payloads) - 1, int((loop.time() - start) * rate))
+                    if latest > i:
+                        self.skipped += latest - i
+                        i = latest
+                        due = start + i / rate
+
+                try:
+                    await self.client.set(self.goal_key, payloads[i])
+                except (RedisError, OSError) as e:
+                    if self.errors == 0:
+                        print(f"robot {self.name}: {e}")
+                    self.errors += 1
+
+                lag = loop.time() - due
+                self.lag.record(max(lag, 0.0))
+                profiler.record("lag " + self.name, max(lag, 0.0))
+
+                if tracer is not None and traces is not None and traces[i, 0] != last_trace_id:
+                    last_trace_id = traces[i, 0]
+                    # from the tick the setpoint was due
+                    tracer.span(Trace(int(last_trace_id), traces[i, 1]), "setpoint", start=time.time() - lag)
+                i += 1
+
+            on_done(index)
+
+    def print_stats(self):
+        sent = self.lag.count
+        print(f"  {self.name: <12} sent: {sent: >7}  skipped: {self.skipped: >6}  errors: {self.errors: >4}"
+              f"  lag p50: {1e3 * self.lag.percentile(50):6.2f} ms  p99: {1e3 * self.lag.percentile(99):6.2f} ms"
+              f"  max: {1e3 * self.lag.max:6.2f} ms")
+
+
+class Fanout:
+    """
+    Plays one program of setpoints on several robots at once. Each segment is
+    computed once, on a worker thread so the robots keep streaming while a
+    move loads; robots only apply their calibration and format it, and
+    stream concurrently against a shared deadline, so setpoint n goes to
+    every robot at `start + n / rate`. A segment that is not ready when it
+    is due pushes the deadline back for the rest of the program, the way
+    the first one sets it.
+
+        fanout = Fanout(get_robots(cfg), rate=cfg["rate"])
+        await fanout.play(segments)
+    """
+
+    def __init__(
+        self,
+        robots: List[Robot],
+        rate: float,
+        start_delay: float = 0.1,
+        profiler: Optional[Profiler] = None,
+        tracer: Optional[Tracer] = None,
+        queue_size: int = 2,
+    ):
+        self.robots = robots
+        self.rate = rate
+        self.start_delay = start_delay
+        self.profiler = profiler if profiler is not None else Profiler("fanout")
+        self.tracer = tracer
+        self.queue_size = queue_size
+
+    async def play(self, segments: Iterable[Segment]):
+        # leave robots that are down out of this program instead of stalling the others
+        available = await asyncio.gather(*(robot.connect() for robot in self.robots))
+        robots = [robot for robot, up in zip(self.robots, available) if up]
+        if not robots:
+            return
+
+        segments = iter(segments)
+        loop = asyncio.get_running_loop()
+        queues = [asyncio.Queue(self.queue_size) for _ in robots]
+        callbacks = {}
+        remaining = {}
+
+        def on_done(index):
+            remaining[index] -= 1
+            if remaining[index] == 0:
+                del remaining[index]
+                done = callbacks.pop(index, None)
+                if done is not None:
+                    done()
+
+        def produce():
+            # loading and evaluating moves blocks, so it runs off the loop
+            segment = next(segments, None)
+            if segment is None:
+                return None
+            return segment, [[str(c) for c in robot.calibration.apply(segment.coords).tolist()] for robot in robots]
+
+        for robot in robots:
+            robot.reset_stats()
+        tasks = [
+            asyncio.create_task(robot.stream(
+                queue, self.rate, on_done, self.profiler,
+                # one span per frame, not one per robot
+                tracer=self.tracer if n == 0 else None,
+            ))
+            for n, (robot, queue) in enumerate(zip(robots, queues))
+        ]
+
+        setpoints = 0
+        begin = due = None
+        stalled = 0.0
+        try:
+            for index in itertools.count():
+                item = await loop.run_in_executor(None, produce)
+                if item is None:
+                    break
+                segment, payloads = item
+
+                # the deadline is set once the first segment is ready, loading a
+                # move can take a while, and moves back by however late a later one is
+                now = loop.time()
+                if due is None:
+                    begin = due = now + self.start_delay
+                elif due < now:
+                    stalled += now - due
+                    due = now
+
+                remaining[index] = len(robots)
+                callbacks[index] = segment.done
+                for robot_payloads, queue in zip(payloads, queues):
+                    await queue.put((index, due, robot_payloads, segment.traces))
+                due += len(segment.coords) / self.rate
+                setpoints += len(segment.coords)
+                self.profiler.count("setpoints", len(segment.coords))
+            for queue in queues:
+                await queue.put(None)
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        if begin is None:
+            return
+        print(f"played {setpoints} setpoints on {len(robots)} robot(s) in {loop.time() - begin:.2f} s,"
+              f" {stalled:.2f} s waiting for segments")
+        for robot in robots:
+            robot.print_stats()
+
+
+def get_robots(cfg: dict) -> List[Robot]:
+    """
+    Robots listed in the playback section of the config, or the single robot
+    on the main Redis server if none are.
+    """
+    robots = cfg["playback"].get("robots") or [{
+        "name": "robot",
+        "host": cfg["redis"]["host"],
+        "port": cfg["redis"]["port"],
+        "goal_key": cfg["redis"]["keys"]["goal_pos"],
+    }]
+    return [
+        Robot(
+            name=robot["name"],
+            host=robot.get("host", cfg["redis"]["host"]),
+            port=robot.get("port", cfg["redis"]["port"]),
+            goal_key=robot.get("goal_key", cfg["redis"]["keys"]["goal_pos"]),
+            calibration=Calibration(robot.get("rotation"), robot.get("scale", 1.0), robot.get("offset")),
+        )
+        for robot in robots
+    ]
@@ -1,10 +1,11 @@
 import argparse
 import os
+from typing import Dict
 
 import numpy as np
-from scipy import interpolate
 
-from instructor.utils import read_log_array, write_log_array
+from instructor.utils import TRACE_KEY, read_log_array, write_log_array
+from .spline import SplineMove, fit_trajectory
 
 
 def interpolate_trajectory(
@@ -12,10 +13,9 @@ def interpolate_trajectory(
     num_points: int,
     smoothness: float = 0.2,
 ) -> np.ndarray:
-    trajectory, indices = np.unique(trajectory, axis=0, return_index=True)
-    trajectory = trajectory[np.argsort(indices)]
-    x, y, z = trajectory[:, 0], trajectory[:, 1], trajectory[:, 2]
-    tck, u = interpolate.splprep([x, y, z], s=smoothness)
+    from scipy import interpolate
+
+    tck = fit_trajectory(trajectory, smoothness)
     x_i, y_i, z_i = interpolate.splev(np.linspace(0, 1, num_points), tck)
     interpolated = np.vstack([x_i, y_i, z_i]).T
 
@@ -37,54 +37,52 @@ def interpolate_between_moves(
     move1: str,
     move2: str,
     smoothness: float = 0.2,
-):
-    log1 = read_log_array(f"recordings/{move1}_interpolated.txt")
-    log2 = read_log_array(f"recordings/{move2}_interpolated.txt")    
-
-    interpolated_log = {}
-    interpolated_log["timestamp"] = np.linspace(0, 1, 360)
-
-    for key in log1:
-        if key == "timestamp":
-            continue
-
-        start = log1[key][-1]
-        end = log2[key][0]
-
-        # interpolated_log[key] = interpolate_trajectory(
+    library=None,
+    num_points: int = 360,
+) -> Dict[str, np.ndarray]:
+    """
+    Transition from the last pose of move1 to the first pose of move2, as a
+    log of `num_points` samples of the keypoints both moves have, or of no
+    samples if they share none. Moves are loaded from the library, or else
+    from their dense recordings, next to which the transition is written.
+    """
+    if library is not None:
+        first, second = library.load(move1), library.load(move2)
+        end_log = first.evaluate([first.end])
+        start_log = second.evaluate([second.start])
+    else:
+        end_log = read_log_array(f"recordings/{move1}_interpolated.txt")
+        start_log = read_log_array(f"recordings/{move2}_interpolated.txt")
+
+    keys = [
+        key for key in end_log
+        if key != "timestamp" and not key.endswith(TRACE_KEY) and key in start_log
+    ]
+    transition = {"timestamp": np.linspace(0, 1, num_points if keys else 0)}
+    for key in keys:
+        # transition[key] = interpolate_trajectory(
         #     trajectory=np.array([start, end]),
-        #     num_points=360,
+        #     num_points=num_points,
         #     smoothness=smoothness)
-        interpolated_log[key] = np.linspace(start, end, 360)
-        
-    filename = f"recordings/{move1}_to_{move2}.txt"
-    write_log_array(filename, interpolated_log)
+        transition[key] = np.linspace(end_log[key][-1], start_log[key][0], num_points)
+
+    if library is None:
+        write_log_array(f"recordings/{move1}_to_{move2}.txt", transition)
+    return transition
 
 
 def interpolate_file(
     filename: str,
     smoothness: float = 0.2,
-    frequency: int = 120,
 ):
-    log = read_log_array(filename)
-    interpolated_log = {}
-
-    timestamps = log["timestamp"]
-    start, end = timestamps[0], timestamps[-1]
-    num_points = int((end - start) * frequency)
-
-    interpolated_log["timestamp"] = np.linspace(start, end, num_points)
-
-    for key in log:
-        if key == "timestamp":
-            continue
-        interpolated_log[key] = interpolate_trajectory(
-            trajectory=log[key],
-            num_points=num_points,
-            smoothness=smoothness)
-
-    interpolated_filename = filename.removesuffix(".txt") + "_interpolated.txt"
-    write_log_array(interpolated_filename, interpolated_log)
+    """
+    Fits splines to a recorded move and stores them next to it. Returns the
+    name of the spline file and the fitted move.
+    """
+    move = SplineMove.fit(read_log_array(filename), smoothness)
+    spline_filename = filename.removesuffix(".txt") + "_spline.npz"
+    move.save(spline_filename)
+    return spline_filename, move
 
 
 if __name__ == "__main__":
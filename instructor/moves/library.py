@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from instructor.utils import get_config, read_log_array
+from .spline import SplineMove
+
+
+CATALOG_FILE = "catalog.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS moves (
+    move_id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    defined_at REAL NOT NULL,
+    duration REAL NOT NULL,
+    samples INTEGER NOT NULL,
+    keypoints TEXT NOT NULL,
+    bounding_box TEXT NOT NULL,
+    checksum TEXT NOT NULL,
+    parameters TEXT NOT NULL,
+    version INTEGER NOT NULL
+)
+"""
+
+
+class MoveInfo(NamedTuple):
+    move_id: str
+    filename: str
+    defined_at: float
+    duration: float
+    samples: int
+    keypoints: List[str]
+    # keypoint -> ([min x, y, z], [max x, y, z])
+    bounding_box: Dict[str, list]
+    checksum: str
+    parameters: dict
+    version: int
+
+    @classmethod
+    def from_row(cls, row) -> "MoveInfo":
+        return cls(
+            move_id=row[0],
+            filename=row[1],
+            defined_at=row[2],
+            duration=row[3],
+            samples=row[4],
+            keypoints=json.loads(row[5]),
+            bounding_box=json.loads(row[6]),
+            checksum=row[7],
+            parameters=json.loads(row[8]),
+            version=row[9],
+        )
+
+
+def file_checksum(filename: str) -> str:
+    with open(filename, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+class MoveLibrary:
+    """
+    Catalog of defined moves, kept in an SQLite file next to the recordings
+    so save_moves, execute_moves and the speech runtime share it.
+
+    Metadata is cached in memory after the first lookup of each move, and
+    trajectories are only read from disk when first requested.
+    """
+
+    def __init__(self, dirname: Optional[str] = None):
+        self.dirname = dirname or get_config()["dirs"]["recordings"]
+        os.makedirs(self.dirname, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            os.path.join(self.dirname, CATALOG_FILE),
+            timeout=10.0,
+            check_same_thread=False)
+        # readers in other processes must not block on the writer
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(SCHEMA)
+        self.connection.commit()
+
+        self.info = {}
+        self.trajectories = {}
+
+    def add(self, move_id: str, filename: str, move: SplineMove, parameters: dict) -> MoveInfo:
+        """
+        Registers (or redefines) a move that was saved to `filename`.
+        """
+        # bounding boxes at the resolution of the recording
+        log = move.resample(max(move.samples, 2), keys=list(move.splines))
+        keypoints = list(move.splines)
+        bounding_box = {
+            key: [log[key].min(axis=0).tolist(), log[key].max(axis=0).tolist()]
+            for key in keypoints
+        }
+
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT version FROM moves WHERE move_id = ?", (move_id,)).fetchone()
+            info = MoveInfo(
+                move_id=move_id,
+                filename=filename,
+                defined_at=time.time(),
+                duration=float(move.duration),
+                samples=move.samples,
+                keypoints=keypoints,
+                bounding_box=bounding_box,
+                checksum=file_checksum(filename),
+                parameters=parameters,
+                version=row[0] + 1 if row else 1,
+            )
+            self.connection.execute(
+                "INSERT OR REPLACE INTO moves VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (info.move_id, info.filename, info.defined_at, info.duration, info.samples,
+                 json.dumps(info.keypoints), json.dumps(info.bounding_box), info.checksum,
+                 json.dumps(info.parameters), info.version))
+            self.connection.commit()
+
+            self.info[move_id] = info
+            self.trajectories[move_id] = (info.version, move)
+        return info
+
+    def get(self, move_id: str, refresh: bool = False) -> Optional[MoveInfo]:
+        """
+        Metadata of a move, or None if it is unknown. Moves defined by other
+        processes are picked up on the first miss or with `refresh`.
+        """
+        move_id = str(move_id)
+        if not refresh and move_id in self.info:
+            return self.info[move_id]
+
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT * FROM moves WHERE move_id = ?", (move_id,)).fetchone()
+        if row is None:
+            return None
+        self.info[move_id] = MoveInfo.from_row(row)
+        return self.info[move_id]
+
+    def __contains__(self, move_id) -> bool:
+        return self.get(move_id) is not None
+
+    def revision(self) -> tuple:
+        """
+        Changes whenever a move is added or redefined, without reading the
+        whole catalog.
+        """
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*), MAX(defined_at) FROM moves").fetchone()
+
+    def moves(self) -> List[MoveInfo]:
+        with self.lock:
+            rows = self.connection.execute("SELECT * FROM moves ORDER BY defined_at").fetchall()
+        for row in rows:
+            self.info[row[0]] = MoveInfo.from_row(row)
+        return [self.info[row[0]] for row in rows]
+
+    def load(self, move_id: str) -> SplineMove:
+        """
+        A move, read from disk once per version.
+        """
+        info = self.get(move_id, refresh=True)
+        if info is None:
+            raise KeyError(f"unknown move {move_id}")
+
+        cached = self.trajectories.get(info.move_id)
+        if cached is None or cached[0] != info.version:
+            if info.filename.endswith(".txt"):
+                # densely sampled moves from before splines were stored
+                move = SplineMove.fit(read_log_array(info.filename), smoothness=0)
+            else:
+                move = SplineMove.load(info.filename)
+            cached = (info.version, move)
+            self.trajectories[info.move_id] = cached
+        return cached[1]
+
+    def close(self):
+        self.connection.close()
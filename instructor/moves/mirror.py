@@ -0,0 +1,166 @@
+from typing import Dict, Optional
+
+import numpy as np
+
+from .normalization import body_scale, goal_coordinates
+
+
+class ConstantVelocityKalman:
+    """
+    Kalman filter with a constant velocity model for one 3D keypoint, each
+    axis filtered independently. Measurements may arrive at any interval.
+
+    `process_noise` is the variance of the unmodelled acceleration in
+    (m/s^2)^2 and `measurement_noise` the variance of a measurement in m^2.
+    """
+
+    def __init__(self, process_noise: float = 50.0, measurement_noise: float = 1e-4, reset_after: float = 0.5):
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.reset_after = reset_after
+        self.time = None
+
+    def _reset(self, measurement: np.ndarray, timestamp: float):
+        self.position = measurement.astype(np.float64).copy()
+        self.velocity = np.zeros(3)
+        # covariance [[p00, p01], [p01, p11]] per axis
+        self.p00 = np.full(3, self.measurement_noise)
+        self.p01 = np.zeros(3)
+        self.p11 = np.full(3, 1.0)
+        self.time = timestamp
+
+    def update(self, measurement: np.ndarray, timestamp: float):
+        if self.time is None or not 0 < timestamp - self.time < self.reset_after:
+            self._reset(measurement, timestamp)
+            return
+
+        dt = timestamp - self.time
+        q = self.process_noise
+
+        # predict
+        self.position = self.position + dt * self.velocity
+        p00 = self.p00 + dt * (2 * self.p01 + dt * self.p11) + q * dt**4 / 4
+        p01 = self.p01 + dt * self.p11 + q * dt**3 / 2
+        p11 = self.p11 + q * dt**2
+
+        # correct
+        innovation = measurement - self.position
+        s = p00 + self.measurement_noise
+        k0, k1 = p00 / s, p01 / s
+        self.position = self.position + k0 * innovation
+        self.velocity = self.velocity + k1 * innovation
+        self.p00 = (1 - k0) * p00
+        self.p01 = (1 - k0) * p01
+        self.p11 = p11 - k1 * p01
+        self.time = timestamp
+
+    def predict(self, timestamp: float) -> Optional[np.ndarray]:
+        """
+        Extrapolated position at `timestamp`, or None before the first
+        measurement.
+        """
+        if self.time is None:
+            return None
+        return self.position + (timestamp - self.time) * self.velocity
+
+
+class RateLimiter:
+    """
+    Limits how far the setpoint moves per second, so the controller is never
+    asked for more than it can track.
+    """
+
+    def __init__(self, max_speed: float):
+        self.max_speed = max_speed
+        self.value = None
+        self.time = None
+
+    def limit(self, target: np.ndarray, timestamp: float) -> np.ndarray:
+        if self.value is None:
+            self.value, self.time = target, timestamp
+            return target
+
+        step = target - self.value
+        max_step = self.max_speed * max(timestamp - self.time, 0)
+        length = np.linalg.norm(step)
+        if length > max_step:
+            step *= max_step / length
+
+        self.value, self.time = self.value + step, timestamp
+        return self.value
+
+
+class Mirror:
+    """
+    Maps live tracker keypoints to end effector setpoints, in the same frame
+    as replayed moves.
+
+    Each keypoint is tracked by a ConstantVelocityKalman and extrapolated by
+    the latency of the pipeline, measured from the frames' capture times,
+    plus `controller_latency`, so the robot moves where the instructor will
+    be rather than where they were.
+    """
+
+    KEYPOINTS = ["right_hand", "center_hips", "center_shoulders"]
+
+    def __init__(
+        self,
+        prefix: str,
+        controller_latency: float = 0.03,
+        max_speed: float = 1.0,
+        max_horizon: float = 0.2,
+        process_noise: float = 50.0,
+        measurement_noise: float = 1e-4,
+        scale_smoothing: float = 0.05,
+    ):
+        self.prefix = prefix
+        self.controller_latency = controller_latency
+        self.max_horizon = max_horizon
+        self.scale_smoothing = scale_smoothing
+
+        self.filters = {
+            key: ConstantVelocityKalman(process_noise, measurement_noise)
+            for key in self.KEYPOINTS
+        }
+        self.limiter = RateLimiter(max_speed)
+        self.scale = None
+        self.latency = None
+
+    def update(self, keypoints: Dict[str, Optional[np.ndarray]], capture_time: float, now: float):
+        """
+        Feeds the keypoints of a frame captured at `capture_time`.
+        """
+        for key, kalman in self.filters.items():
+            if keypoints.get(key) is not None:
+                kalman.update(np.asarray(keypoints[key]), capture_time)
+
+        latency = now - capture_time
+        self.latency = latency if self.latency is None else 0.9 * self.latency + 0.1 * latency
+
+        # the torso length changes slowly, a running average is enough
+        if keypoints.get("center_hips") is not None and keypoints.get("center_shoulders") is not None:
+            scale = body_scale({
+                self.prefix + key: np.asarray(keypoints[key])[None] for key in ("center_hips", "center_shoulders")
+            }, self.prefix)
+            if scale > 0:
+                self.scale = scale if self.scale is None else \
+                    (1 - self.scale_smoothing) * self.scale + self.scale_smoothing * scale
+
+    def setpoint(self, now: float) -> Optional[np.ndarray]:
+        """
+        Setpoint to send at `now`, or None until every keypoint was seen.
+        """
+        if self.scale is None:
+            return None
+
+        # extrapolate from the last capture by however long until it is acted on
+        target_time = now + self.controller_latency
+        data = {}
+        for key, kalman in self.filters.items():
+            if kalman.time is None:
+                return None
+            horizon = min(target_time - kalman.time, self.max_horizon)
+            data[self.prefix + key] = kalman.predict(kalman.time + horizon)[None]
+
+        goal = goal_coordinates(data, self.prefix, scale=self.scale)[0]
+        return self.limiter.limit(goal, now)
@@ -0,0 +1,75 @@
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+
+# rotate 90 counterclockwise around x, then 90 counterclockwise around z,
+# taking camera coordinates into the robot's frame. Written out as a matrix
+# rather than built with scipy's Rotation, which is slow to import
+ROBOT_ROTATION = np.array([
+    [0.0, 0.0, 1.0],
+    [1.0, 0.0, 0.0],
+    [0.0, 1.0, 0.0],
+])
+
+
+def to_robot_frame(coords: np.ndarray) -> np.ndarray:
+    return coords @ ROBOT_ROTATION.T
+
+# reach of the arm relative to the torso
+ARM_LENGTH = 1.5
+# workspace of the robot's end effector
+GOAL_MIN = [0.49, -0.5, 0]
+GOAL_MAX = [0.51, 0.5, 0.8]
+
+
+def torso_length(shoulder_coords: np.ndarray, hip_coords: np.ndarray) -> float:
+    """
+    Mean hip to shoulder distance in the robot's y-z plane, of coordinates
+    already rotated into the robot's frame.
+    """
+    return np.mean(np.linalg.norm((shoulder_coords - hip_coords)[..., 1:], axis=-1))
+
+
+def body_scale(data: Dict[str, np.ndarray], prefix: str) -> float:
+    """
+    Torso length of a log of camera coordinates.
+    """
+    hip_coords = to_robot_frame(data[prefix + "center_hips"])
+    shoulder_coords = to_robot_frame(data[prefix + "center_shoulders"])
+    return torso_length(shoulder_coords, hip_coords)
+
+
+def to_body_frame(
+    data: Dict[str, np.ndarray],
+    prefix: str,
+    keypoints: Iterable[str],
+    scale: Optional[float] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Keypoint trajectories rotated into the robot's frame, relative to the
+    hips and in units of torso length. Pass the torso length as `scale`
+    when `data` is only part of a move.
+    """
+    hip_coords = to_robot_frame(data[prefix + "center_hips"])
+    if scale is None:
+        scale = body_scale(data, prefix)
+
+    return {
+        key: (to_robot_frame(data[prefix + key]) - hip_coords) / scale
+        for key in keypoints
+    }
+
+
+def goal_coordinates(
+    data: Dict[str, np.ndarray],
+    prefix: str,
+    scale: Optional[float] = None,
+) -> np.ndarray:
+    """
+    End effector setpoints following the right hand, clipped to the robot's
+    workspace.
+    """
+    goal_coords = to_body_frame(data, prefix, ["right_hand"], scale=scale)["right_hand"]
+    goal_coords /= 2 * ARM_LENGTH
+    return np.clip(goal_coords, GOAL_MIN, GOAL_MAX)
@@ -0,0 +1,235 @@
+import argparse
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .library import MoveLibrary
+from .normalization import to_body_frame
+from ..utils import get_config
+
+
+def move_features(
+    log: Dict[str, np.ndarray],
+    prefix: str,
+    keypoints: Sequence[str],
+    length: int,
+) -> np.ndarray:
+    """
+    (length, 3 * len(keypoints)) array of the body-frame keypoints of a move,
+    resampled to a fixed number of frames so moves of any duration can be
+    compared with the same warping band.
+    """
+    body = to_body_frame(log, prefix, keypoints)
+    trajectory = np.hstack([body[key] for key in keypoints])
+
+    positions = np.linspace(0, len(trajectory) - 1, length)
+    lower = np.floor(positions).astype(np.intp)
+    upper = np.minimum(lower + 1, len(trajectory) - 1)
+    weight = (positions - lower)[:, None]
+    return (1 - weight) * trajectory[lower] + weight * trajectory[upper]
+
+
+def envelope(features: np.ndarray, band: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Running maximum and minimum of each feature over +-band frames, the
+    LB_Keogh envelope of a sequence.
+    """
+    length = len(features)
+    padded = np.pad(features, ((band, band), (0, 0)), mode="edge")
+    windows = np.lib.stride_tricks.sliding_window_view(padded, 2 * band + 1, axis=0)[:length]
+    return windows.max(axis=-1), windows.min(axis=-1)
+
+
+def lb_keogh(query: np.ndarray, upper: np.ndarray, lower: np.ndarray) -> np.ndarray:
+    """
+    Lower bounds of the squared DTW distances between a query of shape
+    (L, D) and candidates whose envelopes have shape (N, L, D).
+    """
+    above = np.maximum(query - upper, 0)
+    below = np.maximum(lower - query, 0)
+    return np.sum(above**2 + below**2, axis=(1, 2))
+
+
+def dtw(query: np.ndarray, candidates: np.ndarray, band: int) -> np.ndarray:
+    """
+    Squared DTW distances between a query of shape (L, D) and a batch of
+    candidates of shape (N, L, D), with the warping path restricted to a
+    Sakoe-Chiba band. The recurrence runs over the band while every step is
+    vectorized over the batch.
+    """
+    num_candidates, length = len(candidates), len(query)
+    # (N, L, L) pairwise squared frame distances
+    cost = (
+        np.sum(query**2, axis=1)[None, :, None]
+        + np.sum(candidates**2, axis=2)[:, None, :]
+        - 2 * np.einsum("id,njd->nij", query, candidates)
+    )
+    np.maximum(cost, 0, out=cost)
+
+    distance = np.full((num_candidates, length + 1, length + 1), np.inf)
+    distance[:, 0, 0] = 0
+    for i in range(1, length + 1):
+        for j in range(max(1, i - band), min(length, i + band) + 1):
+            previous = np.minimum(
+                np.minimum(distance[:, i - 1, j], distance[:, i, j - 1]),
+                distance[:, i - 1, j - 1])
+            distance[:, i, j] = cost[:, i - 1, j - 1] + previous
+    return distance[:, length, length]
+
+
+class SimilarityIndex:
+    """
+    Nearest-neighbour search over the moves in a MoveLibrary by dynamic time
+    warping, in the hip-relative, torso-scaled frame used for playback.
+
+    Candidates are ranked by their LB_Keogh lower bound and verified with
+    full DTW in batches; the search stops once the next lower bound exceeds
+    the k-th best distance found so far. Features and envelopes of each move
+    are cached in memory and in `cache_dir`, keyed by the move's checksum.
+
+    Distances are root mean square per frame, in torso lengths.
+    """
+
+    def __init__(
+        self,
+        library: MoveLibrary,
+        length: int = 64,
+        window: float = 0.1,
+        batch_size: int = 32,
+        duplicate_threshold: float = 0.1,
+        cache_dir: Optional[str] = None,
+    ):
+        cfg = get_config()
+        self.prefix = cfg["redis"]["realsense_prefix"]
+        self.keypoints = [key for key in cfg["pose_keypoints"] if key != "center_hips"]
+
+        self.library = library
+        self.length = length
+        self.band = max(1, int(window * length))
+        self.batch_size = batch_size
+        self.duplicate_threshold = duplicate_threshold
+        self.cache_dir = cache_dir or os.path.join(library.dirname, "envelopes")
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # move id -> (checksum, features, upper, lower)
+        self.entries = {}
+        self.move_ids = []
+        self.stacked = None
+        self.revision = None
+
+    def features(self, log: Dict[str, np.ndarray]) -> np.ndarray:
+        return move_features(log, self.prefix, self.keypoints, self.length)
+
+    def _cache_filename(self, move_id: str) -> str:
+        return os.path.join(self.cache_dir, f"{move_id}.npz")
+
+    def _load_entry(self, info):
+        filename = self._cache_filename(info.move_id)
+        if os.path.exists(filename):
+            cached = np.load(filename)
+            if str(cached["checksum"]) == info.checksum and cached["features"].shape[0] == self.length \
+                    and int(cached["band"]) == self.band:
+                return info.checksum, cached["features"], cached["upper"], cached["lower"]
+
+        features = self.features(self.library.load(info.move_id).resample(self.length))
+        upper, lower = envelope(features, self.band)
+        np.savez(filename, checksum=info.checksum, band=self.band, features=features, upper=upper, lower=lower)
+        return info.checksum, features, upper, lower
+
+    def refresh(self):
+        """
+        Picks up moves added or redefined since the last refresh.
+        """
+        revision = self.library.revision()
+        if revision == self.revision:
+            return
+        self.revision = revision
+
+        changed = False
+        for info in self.library.moves():
+            entry = self.entries.get(info.move_id)
+            if entry is None or entry[0] != info.checksum:
+                self.entries[info.move_id] = self._load_entry(info)
+                changed = True
+
+        if changed or self.stacked is None:
+            self.move_ids = list(self.entries)
+            self.stacked = tuple(
+                np.stack([self.entries[move_id][i] for move_id in self.move_ids])
+                if self.move_ids else np.empty((0, self.length, 3 * len(self.keypoints)))
+                for i in (1, 2, 3)
+            )
+
+    def query(
+        self,
+        log: Dict[str, np.ndarray],
+        k: int = 5,
+        exclude: Sequence[str] = (),
+    ) -> List[Tuple[str, float]]:
+        """
+        The k moves closest to the trajectory `log`, as (move id, distance)
+        pairs sorted by distance.
+        """
+        return self.query_features(self.features(log), k, exclude)
+
+    def query_move(self, move_id: str, k: int = 5) -> List[Tuple[str, float]]:
+        self.refresh()
+        return self.query_features(self.entries[move_id][1], k, exclude=[move_id])
+
+    def duplicates(self, move_id: str) -> List[Tuple[str, float]]:
+        """
+        Other moves within `duplicate_threshold` of a move.
+        """
+        return [
+            (other, distance) for other, distance in self.query_move(move_id)
+            if distance <= self.duplicate_threshold
+        ]
+
+    def query_features(
+        self,
+        query: np.ndarray,
+        k: int = 5,
+        exclude: Sequence[str] = (),
+    ) -> List[Tuple[str, float]]:
+        self.refresh()
+        features, upper, lower = self.stacked
+
+        bounds = lb_keogh(query, upper, lower)
+        for move_id in exclude:
+            if move_id in self.entries:
+                bounds[self.move_ids.index(move_id)] = np.inf
+        order = np.argsort(bounds)
+        order = order[:np.count_nonzero(np.isfinite(bounds))]
+
+        # the k most promising candidates first, so the pruning threshold is
+        # tight from the second batch on
+        best = []
+        start = 0
+        while start < len(order):
+            size = k if start == 0 else self.batch_size
+            batch = order[start:start + size]
+            start += size
+            threshold = best[k - 1][0] if len(best) >= k else np.inf
+            batch = batch[bounds[batch] < threshold]
+            if len(batch) == 0:
+                break
+
+            distances = dtw(query, features[batch], self.band)
+            best = sorted(best + list(zip(distances, batch)))[:k]
+
+        return [
+            (self.move_ids[i], float(np.sqrt(distance / self.length)))
+            for distance, i in best
+        ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lists the recorded moves most similar to a move.")
+    parser.add_argument("move_id", type=str)
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+
+    index = SimilarityIndex(MoveLibrary(), **get_config().get("similarity", {}))
+    for move_id, distance in index.query_move(args.move_id, k=args.k):
+        print(f"{move_id}\t{distance:.3f}")
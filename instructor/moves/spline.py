@@ -0,0 +1,163 @@
+import os
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+from ..utils import TRACE_KEY
+
+
+def interpolate_trace(
+    timestamps: np.ndarray,
+    traces: np.ndarray,
+    interpolated_timestamps: np.ndarray,
+) -> np.ndarray:
+    # each sample keeps the trace id of the frame before it and an
+    # interpolated capture time
+    indices = np.searchsorted(timestamps, interpolated_timestamps, side="right") - 1
+    indices = np.clip(indices, 0, len(timestamps) - 1)
+    capture_times = np.interp(interpolated_timestamps, timestamps, traces[:, 1])
+    return np.vstack([traces[indices, 0], capture_times]).T
+
+
+def fit_trajectory(trajectory: np.ndarray, smoothness: float = 0.2) -> Tuple[np.ndarray, np.ndarray, int]:
+    """
+    Smoothing spline through the distinct points of an (N, 3) trajectory, as
+    (knots, (3, M) coefficients, degree). The spline parameter runs from 0 to
+    1 along the trajectory.
+    """
+    # scipy is imported on first use, see warmup()
+    from scipy import interpolate
+
+    trajectory, indices = np.unique(trajectory, axis=0, return_index=True)
+    trajectory = trajectory[np.argsort(indices)]
+    x, y, z = trajectory[:, 0], trajectory[:, 1], trajectory[:, 2]
+    (knots, coefficients, degree), _ = interpolate.splprep([x, y, z], s=smoothness)
+    return knots, np.array(coefficients), degree
+
+
+def warmup():
+    """
+    Imports scipy's spline routines and runs them once, so that the first
+    move defined or played doesn't pay for it.
+    """
+    t = np.linspace(0, 1, 16)
+    log = {"timestamp": t, "warmup": np.stack([t, t**2, np.sin(t)], axis=1)}
+    SplineMove.fit(log).resample(32)
+
+
+class SplineMove:
+    """
+    A move stored as one fitted spline per keypoint. The spline parameter is
+    mapped linearly onto [start, end], so the move can be evaluated at any
+    time, and at any rate, without keeping dense samples around.
+
+    Trace columns are kept as the original per-frame samples.
+    """
+
+    def __init__(
+        self,
+        start: float,
+        end: float,
+        splines: Dict[str, Tuple[np.ndarray, np.ndarray, int]],
+        traces: Optional[Dict[str, Tuple[np.ndarray, np.ndarray]]] = None,
+        samples: int = 0,
+    ):
+        self.start = start
+        self.end = end
+        self.splines = splines
+        self.traces = traces or {}
+        self.samples = samples
+
+    @classmethod
+    def fit(cls, log: Dict[str, np.ndarray], smoothness: float = 0.2) -> "SplineMove":
+        timestamps = log["timestamp"]
+        splines, traces = {}, {}
+        for key in log:
+            if key == "timestamp":
+                continue
+            if key.endswith(TRACE_KEY):
+                traces[key] = (np.asarray(timestamps), log[key])
+                continue
+            splines[key] = fit_trajectory(log[key], smoothness)
+        return cls(timestamps[0], timestamps[-1], splines, traces, samples=len(timestamps))
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+    @property
+    def keys(self):
+        return list(self.splines) + list(self.traces)
+
+    def evaluate(self, timestamps: np.ndarray, keys=None) -> Dict[str, np.ndarray]:
+        """
+        Log of the move at the given times, in the format of read_log_array.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        u = np.clip((timestamps - self.start) / max(self.duration, 1e-9), 0, 1)
+
+        from scipy import interpolate
+
+        log = {"timestamp": timestamps}
+        for key in keys or self.keys:
+            if key in self.traces:
+                log[key] = interpolate_trace(*self.traces[key], interpolated_timestamps=timestamps)
+            else:
+                log[key] = np.vstack(interpolate.splev(u, self.splines[key])).T
+        return log
+
+    def resample(self, num_points: int, keys=None) -> Dict[str, np.ndarray]:
+        return self.evaluate(np.linspace(self.start, self.end, num_points), keys)
+
+    def sample(self, rate: float, keys=None) -> Dict[str, np.ndarray]:
+        """
+        The whole move at `rate` Hz, as interpolate_file used to write it.
+        """
+        return self.resample(int(self.duration * rate), keys)
+
+    def chunks(self, rate: float, chunk_duration: float = 0.5, keys=None) -> Iterator[Dict[str, np.ndarray]]:
+        """
+        The samples of sample(rate), evaluated `chunk_duration` seconds at a
+        time as they are consumed.
+        """
+        timestamps = np.linspace(self.start, self.end, int(self.duration * rate))
+        chunk_size = max(1, int(chunk_duration * rate))
+        for i in range(0, len(timestamps), chunk_size):
+            yield self.evaluate(timestamps[i:i + chunk_size], keys)
+
+    def save(self, filename: str):
+        arrays = {"start": self.start, "end": self.end, "samples": self.samples}
+        for i, (key, (knots, coefficients, degree)) in enumerate(self.splines.items()):
+            arrays[f"spline_{i}_key"] = key
+            arrays[f"spline_{i}_knots"] = knots
+            arrays[f"spline_{i}_coefficients"] = coefficients
+            arrays[f"spline_{i}_degree"] = degree
+        for i, (key, (timestamps, traces)) in enumerate(self.traces.items()):
+            arrays[f"trace_{i}_key"] = key
+            arrays[f"trace_{i}_timestamps"] = timestamps
+            arrays[f"trace_{i}_values"] = traces
+        # readers never see a partly written file
+        with open(filename + ".tmp", "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(filename + ".tmp", filename)
+
+    @classmethod
+    def load(cls, filename: str) -> "SplineMove":
+        with np.load(filename) as arrays:
+            splines, traces = {}, {}
+            i = 0
+            while f"spline_{i}_key" in arrays:
+                splines[str(arrays[f"spline_{i}_key"])] = (
+                    arrays[f"spline_{i}_knots"],
+                    arrays[f"spline_{i}_coefficients"],
+                    int(arrays[f"spline_{i}_degree"]),
+                )
+                i += 1
+            i = 0
+            while f"trace_{i}_key" in arrays:
+                traces[str(arrays[f"trace_{i}_key"])] = (
+                    arrays[f"trace_{i}_timestamps"],
+                    arrays[f"trace_{i}_values"],
+                )
+                i += 1
+            return cls(float(arrays["start"]), float(arrays["end"]), splines, traces, int(arrays["samples"]))
@@ -0,0 +1,216 @@
+import re
+from collections import deque
+from typing import List, Optional, Sequence, Tuple
+
+
+WordTiming = Tuple[str, float, float]
+
+# complete tags and whitespace-delimited words; anything left over at the end
+# of a chunk is an unfinished token and is carried into the next chunk
+TOKEN_PATTERN = re.compile(r"<[^>]*>|[^<\s]+|\s+")
+
+NUMBER_WORDS = [
+    "zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine",
+    "ten", "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen",
+    "seventeen", "eighteen", "nineteen",
+]
+TENS_WORDS = ["", "", "twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety"]
+
+
+def number_to_words(n: int) -> str:
+    """
+    Spells out a non-negative integer the way the recognizer's lexical form
+    does, without separators (e.g. 21 -> "twentyone").
+    """
+    if n < 20:
+        return NUMBER_WORDS[n]
+    if n < 100:
+        return TENS_WORDS[n // 10] + (NUMBER_WORDS[n % 10] if n % 10 else "")
+    if n < 1000:
+        rest = n % 100
+        return NUMBER_WORDS[n // 100] + "hundred" + (number_to_words(rest) if rest else "")
+    if n < 1_000_000:
+        rest = n % 1000
+        return number_to_words(n // 1000) + "thousand" + (number_to_words(rest) if rest else "")
+    return str(n)
+
+
+def normalize_word(word: str) -> str:
+    """
+    Reduces a word to the key used for matching: lowercase, no punctuation
+    or apostrophes, and digits spelled out.
+    """
+    word = re.sub(r"[^\w]", "", word.lower())
+    if word.isdigit():
+        return number_to_words(int(word))
+    return word
+
+
+class WordAligner:
+    """
+    Maps words from the LLM output onto recognizer word timings.
+
+    Words are aligned by edit distance: matching a recognizer word is free,
+    while a word the LLM inserted or a recognizer word it dropped costs one
+    each. The LLM may also merge two recognizer words, e.g. "21" for
+    "twenty one". Only a band of `window` recognizer words past the last
+    match plus the words being aligned is searched. Each word is committed
+    once `lookahead` later words have arrived, so an inserted word that
+    happens to appear further on in the transcript doesn't pull the
+    alignment past the words the LLM actually repeats.
+
+        aligner.push(word)        # for every LLM word, in order
+        aligner.resolve()         # timings of the words that are settled
+        aligner.resolve(final=True)
+    """
+
+    def __init__(self, word_timings: Sequence[WordTiming], window: int = 8, lookahead: int = 3):
+        self.word_timings = list(word_timings)
+        self.keys = [normalize_word(word) for word, _, _ in self.word_timings]
+        self.window = window
+        self.lookahead = lookahead
+        self.index = 0
+        self.pending: List[str] = []
+
+    def push(self, word: str):
+        self.pending.append(normalize_word(word))
+
+    def resolve(self, final: bool = False) -> List[Optional[Tuple[float, float]]]:
+        """
+        Timings (or None) of the pushed words that are settled, in order.
+        With `final`, every pushed word is settled.
+        """
+        timings = []
+        while self.pending and (final or len(self.pending) > self.lookahead):
+            span = self._align_first(self.pending)
+            self.pending.pop(0)
+            if span is None:
+                timings.append(None)
+            else:
+                timings.append(self._consume(*span))
+        return timings
+
+    def _align_first(self, keys: List[str]) -> Optional[Tuple[int, int]]:
+        """
+        Recognizer words (first, last) the first of `keys` maps to in the
+        cheapest alignment of all of them, or None if it is an insertion.
+        """
+        if not keys[0]:
+            return None
+        stop = min(self.index + self.window + len(keys), len(self.keys))
+        band = self.keys[self.index:stop]
+        n, m = len(keys), len(band)
+
+        # cost[i][j]: keys[:i] aligned with band[:j]; trailing recognizer
+        # words are free, the LLM hasn't got to them yet
+        inf = float("inf")
+        cost = [[inf] * (m + 1) for _ in range(n + 1)]
+        # the move taken into each cell, for the first key's span
+        first = [[None] * (m + 1) for _ in range(n + 1)]
+        cost[0] = list(range(m + 1))
+        for i in range(n + 1):
+            for j in range(m + 1):
+                here = cost[i][j]
+                if here == inf:
+                    continue
+                moves = []
+                if j < m:
+                    moves.append((i, j + 1, 1, None))
+                if i < n:
+                    moves.append((i + 1, j, 1, None))
+                    if keys[i] and j < m and band[j] == keys[i]:
+                        moves.append((i + 1, j + 1, 0, (j, j)))
+                    if keys[i] and j + 1 < m and band[j] + band[j + 1] == keys[i]:
+                        moves.append((i + 1, j + 2, 0, (j, j + 1)))
+                for i2, j2, step, span in moves:
+                    # ties keep the earlier path, i.e. the nearest match
+                    if here + step < cost[i2][j2]:
+                        cost[i2][j2] = here + step
+                        first[i2][j2] = span if i == 0 and i2 == 1 else first[i][j]
+        best = min(range(m + 1), key=lambda j: cost[n][j])
+        span = first[n][best]
+        if span is None:
+            return None
+        return self.index + span[0], self.index + span[1]
+
+    def _consume(self, first: int, last: int) -> Tuple[float, float]:
+        self.index = last + 1
+        return self.word_timings[first][1], self.word_timings[last][2]
+
+
+class TimingAnnotator:
+    """
+    Wraps the words of a (possibly streamed) parsed sentence in
+    <word start="..." end="..."> tags so the engine can recover move windows.
+
+    Chunks are tokenized as they arrive; only a trailing unfinished token is
+    buffered, plus the last few words the aligner hasn't settled yet, so the
+    cost of annotating is linear in the output length.
+    """
+
+    def __init__(self, word_timings: Sequence[WordTiming], window: int = 8):
+        self.aligner = WordAligner(word_timings, window=window)
+        self.pending = ""
+        # tokens not written out yet; words are [token, timing] until settled
+        self.tokens = deque()
+
+    def feed(self, chunk: str) -> str:
+        text = self.pending + chunk
+        consumed = 0
+        for match in TOKEN_PATTERN.finditer(text):
+            # a gap means an unclosed '<', i.e. a tag still being streamed
+            if match.start() != consumed:
+                break
+            token = match.group()
+            # a word touching the end of the buffer may continue in the next chunk
+            if match.end() == len(text) and not token.isspace():
+                break
+            self._add(token)
+            consumed = match.end()
+        self.pending = text[consumed:]
+        return self._flush(self.aligner.resolve())
+
+    def finish(self) -> str:
+        text, self.pending = self.pending, ""
+        consumed = 0
+        for match in TOKEN_PATTERN.finditer(text):
+            if match.start() != consumed:
+                break
+            self._add(match.group())
+            consumed = match.end()
+        # an unclosed tag at the end is passed through as-is
+        result = self._flush(self.aligner.resolve(final=True))
+        return result + text[consumed:]
+
+    def _add(self, token: str):
+        if token.startswith("<") or token.isspace() or not normalize_word(token):
+            self.tokens.append(token)
+            return
+        self.aligner.push(token)
+        self.tokens.append([token, None])
+
+    def _flush(self, timings) -> str:
+        # settled timings belong to the earliest unsettled words, in order
+        timings = iter(timings)
+        result = []
+        while self.tokens:
+            token = self.tokens[0]
+            if isinstance(token, list):
+                try:
+                    token = self._annotate(token[0], next(timings))
+                except StopIteration:
+                    break
+            result.append(token)
+            self.tokens.popleft()
+        return "".join(result)
+
+    def _annotate(self, token: str, timing) -> str:
+        if timing is None:
+            return token
+        start_time, end_time = timing
+        return f'<word start="{start_time:.3f}" end="{end_time:.3f}">{token}</word>'
+
+
+def annotate_parsed_sentence(parsed_sentence: str, word_timings: List[WordTiming]) -> str:
+    annotator = TimingAnnotator(word_timings)
+    return annotator.feed(parsed_sentence) + annotator.finish()
@@ -1,6 +1,5 @@
-from typing import Optional
-
-import openai
+import threading
+from typing import Any, NamedTuple, Optional
 
 robot_prompt = [
     {
@@ -176,27 +175,82 @@ robot_prompt = [
     }
 ]
 
+AZURE_ENDPOINT = "https://reactgenie-openai.openai.azure.com/"
+
+
+class Preview(NamedTuple):
+    # length of the conversation the utterance was parsed after
+    history_length: int
+    user_message: dict
+    message: Any
+
+
 class Conversation:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, azure_endpoint: str = AZURE_ENDPOINT):
         self.messages = []
-        self.openai = openai.AzureOpenAI(
-          azure_endpoint="https://reactgenie-openai.openai.azure.com/", 
-          api_key=api_key,
-          api_version="2024-02-01",
-        )
+        self.api_key = api_key
+        self.azure_endpoint = azure_endpoint
+        self._openai = None
+        self._openai_lock = threading.Lock()
 
-    async def get_gpt_parsed(self, text: str) -> Optional[str]:
-        if len(self.messages) == 0:
+    @property
+    def openai(self):
+        # the openai package takes most of a second to import, see warmup()
+        with self._openai_lock:
+            if self._openai is None:
+                import openai
+
+                self._openai = openai.AzureOpenAI(
+                  azure_endpoint=self.azure_endpoint,
+                  api_key=self.api_key,
+                  api_version="2024-02-01",
+                )
+            return self._openai
+
+    def warmup(self):
+        """
+        Imports openai and creates the client ahead of the first utterance.
+        """
+        self.openai
+
+    def _user_message(self, text: str, messages: list) -> dict:
+        if len(messages) == 0:
             text = "<conversation>\n" + text
-        self.messages.append({
+        return {
           "content": text,
           "role": "user",
-        })
+        }
+
+    def _complete(self, messages: list):
         response = self.openai.chat.completions.create(
             model="reactgenie",
-            messages=robot_prompt + self.messages,
+            messages=robot_prompt + messages,
             max_tokens=500,
             temperature=0.0
         )
-        self.messages.append(response.choices[0].message)
-        return response.choices[0].message.content
+        return response.choices[0].message
+
+    async def get_gpt_parsed(self, text: str) -> Optional[str]:
+        self.messages.append(self._user_message(text, self.messages))
+        message = self._complete(self.messages)
+        self.messages.append(message)
+        return message.content
+
+    async def preview(self, text: str) -> Preview:
+        """
+        Parses `text` as the next utterance without adding it to the
+        conversation; `commit` adds it.
+        """
+        history = list(self.messages)
+        user_message = self._user_message(text, history)
+        return Preview(len(history), user_message, self._complete(history + [user_message]))
+
+    def commit(self, preview: Preview) -> Optional[str]:
+        """
+        Adds a previewed utterance and its response to the conversation.
+        Returns None if the conversation moved on since the preview.
+        """
+        if preview.history_length != len(self.messages):
+            return None
+        self.messages += [preview.user_message, preview.message]
+        return preview.message.content
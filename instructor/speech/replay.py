@@ -0,0 +1,286 @@
+import asyncio
+import json
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .alignment import annotate_parsed_sentence
+from .engine import Engine, Runtime, RuntimeSession
+from .speculation import Speculator
+from .tts import SpeechOutput
+from ..utils import get_config
+
+
+def load_corpus(filename: str) -> List[dict]:
+    """
+    Reads a replay corpus. Each line is a JSON object with the recognized
+    "text", its "words" as [word, start, end] triples, and the scripted
+    LLM "response".
+    """
+    corpus = []
+    with open(filename, "r") as f:
+        for line in f:
+            if line.strip():
+                corpus.append(json.loads(line))
+    return corpus
+
+
+class LocalRedis:
+    """
+    In-process stand-in for the subset of redis.asyncio.Redis used by the
+    speech runtime and the move executor.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.lists = defaultdict(list)
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def set(self, key, value):
+        self.values[key] = str(value)
+
+    async def delete(self, key):
+        self.values.pop(key, None)
+        self.lists.pop(key, None)
+
+    async def rpush(self, key, *values):
+        self.lists[key].extend(str(v) for v in values)
+        return len(self.lists[key])
+
+    async def lpush(self, key, *values):
+        for v in values:
+            self.lists[key].insert(0, str(v))
+        return len(self.lists[key])
+
+    async def lpop(self, key):
+        if self.lists[key]:
+            return self.lists[key].pop(0)
+        return None
+
+    async def lrange(self, key, start, stop):
+        values = self.lists[key]
+        stop = len(values) if stop == -1 else stop + 1
+        return values[start:stop]
+
+    async def llen(self, key):
+        return len(self.lists[key])
+
+
+async def simulate_robot(client: LocalRedis, move_duration: float = 0.0):
+    """
+    Plays the role of execute_moves: waits for the execute flag, "executes"
+    every queued move and acknowledges it on the executed list.
+    """
+    keys = get_config()["redis"]["keys"]
+    while True:
+        if await client.get(keys["execute_flag"]) == "1":
+            for move_id in await client.lrange(keys["move_list"], 0, -1):
+                await asyncio.sleep(move_duration)
+                await client.rpush(keys["move_executed"], move_id)
+            await client.set(keys["execute_flag"], "0")
+        await asyncio.sleep(0.001)
+
+
+class StubCompletionServer:
+    """
+    Local HTTP server answering Azure OpenAI chat completion requests with
+    scripted responses, keyed by the text of the last user message.
+    """
+
+    def __init__(self, responses: Dict[str, str], latency: float = 0.0, port: int = 0):
+        self.responses = responses
+        self.latency = latency
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._make_handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.server.server_address
+        return f"http://{host}:{port}/"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length))
+                text = request["messages"][-1]["content"]
+                if isinstance(text, list):
+                    text = "".join(part.get("text", "") for part in text)
+                text = text.removeprefix("<conversation>\n")
+
+                time.sleep(stub.latency)
+                body = json.dumps({
+                    "id": "stub",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request.get("model", "stub"),
+                    "choices": [{
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": stub.responses.get(text, text)},
+                    }],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                }).encode()
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+class LatencyRecorder:
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def record(self, stage: str, seconds: float):
+        self.samples[stage].append(seconds)
+
+    def percentiles(self, q=(50, 90, 99)) -> Dict[str, Dict[str, float]]:
+        summary = {}
+        for stage, samples in self.samples.items():
+            values = np.percentile(np.array(samples) * 1e3, q)
+            summary[stage] = {f"p{p}": v for p, v in zip(q, values)}
+            summary[stage]["n"] = len(samples)
+        return summary
+
+    def print_summary(self):
+        for stage, stats in self.percentiles().items():
+            columns = "  ".join(f"{k}: {v:8.3f} ms" for k, v in stats.items() if k != "n")
+            print(f"{stage: <12}   n: {stats['n']: <5}  {columns}")
+
+
+class HeadlessSession(RuntimeSession):
+    def __init__(self, client: LocalRedis):
+        self.pending_moves = []
+        self.redis = client
+        self.started = time.perf_counter()
+
+
+class HeadlessRuntime(Runtime):
+    """
+    Runtime without microphone, speaker or UI. Mirrors the Redis protocol of
+    SpeechRecognizerApp and records how long each stage takes.
+    """
+
+    def __init__(
+        self,
+        client: LocalRedis,
+        recorder: LatencyRecorder,
+        start_time: float = 0.0,
+        speech_output: Optional[SpeechOutput] = None,
+    ):
+        keys = get_config()["redis"]["keys"]
+        self.define_move_key = keys["define_move"]
+        self.move_list_key = keys["move_list"]
+        self.execute_flag_key = keys["execute_flag"]
+        self.move_executed_key = keys["move_executed"]
+
+        self.client = client
+        self.recorder = recorder
+        self.start_time = start_time
+        self.spoken = []
+        # with a SpeechOutput, responses are synthesized and "played" too
+        self.speech_output = speech_output
+
+    async def start_session(self) -> HeadlessSession:
+        session = HeadlessSession(self.client)
+        await session.redis.delete(self.move_list_key)
+        await session.redis.set(self.execute_flag_key, "0")
+        return session
+
+    async def define_move(self, session: HeadlessSession, move_id: str, start_time: float, stop_time: float):
+        move_data = f"{move_id}:{start_time + self.start_time:.3f}:{stop_time + self.start_time + 5:.3f}"
+        await session.redis.rpush(self.define_move_key, move_data)
+
+    async def do_move(self, session: HeadlessSession, move_id: str):
+        session.pending_moves.append(move_id)
+
+    async def speech(self, session: HeadlessSession, speech: str):
+        self.spoken.append(speech)
+        if self.speech_output is not None:
+            t0 = time.perf_counter()
+            await self.speech_output.speak(speech)
+            self.recorder.record("speech", time.perf_counter() - t0)
+
+    async def end_session(self, session: HeadlessSession):
+        t0 = time.perf_counter()
+        self.recorder.record("dispatch", t0 - session.started)
+
+        if len(session.pending_moves) > 0:
+            for move_id in session.pending_moves:
+                await session.redis.rpush(self.move_list_key, move_id)
+            await session.redis.set(self.execute_flag_key, "1")
+            t1 = time.perf_counter()
+            self.recorder.record("queueing", t1 - t0)
+
+            while await session.redis.llen(self.move_executed_key) < len(session.pending_moves):
+                await asyncio.sleep(0.001)
+            self.recorder.record("completion", time.perf_counter() - t1)
+
+        await session.redis.delete(self.move_executed_key)
+
+
+async def replay(
+    corpus: List[dict],
+    conversation,
+    runtime: HeadlessRuntime,
+    recorder: LatencyRecorder,
+    engine: Optional[Engine] = None,
+    speculator: Optional[Speculator] = None,
+    tail: float = 0.5,
+):
+    """
+    Feeds each corpus utterance through the same parse -> align -> execute
+    path SpeechRecognizerApp.process uses. With a speculator, the words are
+    first fed as partial results, and the final result follows `tail`
+    seconds later, like the recognizer's end of utterance timeout.
+    """
+    engine = engine or Engine(runtime=runtime)
+    for utterance in corpus:
+        word_timings = [tuple(w) for w in utterance["words"]]
+
+        if speculator is not None:
+            for n in range(1, len(word_timings) + 1):
+                speculator.observe(" ".join(w[0] for w in word_timings[:n]))
+            await asyncio.sleep(tail)
+
+        t0 = time.perf_counter()
+        parsed_sentence = None
+        if speculator is not None:
+            speculation = speculator.take(utterance["text"])
+            if speculation is not None:
+                parsed_sentence = conversation.commit(speculation.preview)
+        if parsed_sentence is None:
+            parsed_sentence = await conversation.get_gpt_parsed(utterance["text"])
+        t1 = time.perf_counter()
+        processed_sentence = annotate_parsed_sentence(parsed_sentence, word_timings)
+        t2 = time.perf_counter()
+        await engine.execute(processed_sentence)
+        t3 = time.perf_counter()
+
+        recorder.record("parse", t1 - t0)
+        recorder.record("align", t2 - t1)
+        recorder.record("total", t3 - t0)
@@ -0,0 +1,141 @@
+import asyncio
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from .alignment import normalize_word
+from .prompt import Conversation, Preview
+
+
+MOVE_COMMAND_PATTERN = re.compile(r"move\((\d+)\)")
+SPEECH_PATTERN = re.compile(r'speech="([^"]*)"')
+
+
+class Speculation(NamedTuple):
+    # normalized, for matching against the final result
+    words: Tuple[str, ...]
+    text: str
+    preview: Preview
+    # moves the response asks the robot to do, in order
+    move_ids: List[str]
+    # what the response says
+    speeches: List[str]
+
+
+def normalize_hypothesis(text: str) -> Tuple[str, ...]:
+    return tuple(word for word in map(normalize_word, text.split()) if word)
+
+
+class Speculator:
+    """
+    Parses partial recognition hypotheses before the recognizer finalizes
+    them. A hypothesis is stable once the next partial result repeats it, or
+    once no new partial result has arrived for `settle` seconds; stable
+    hypotheses are parsed in the background against the conversation so
+    far. When the final result has the same words, `take` returns the
+    parse, which is usually ready by then.
+
+        speculator.observe(evt.result.text)   # on every partial result
+        speculation = speculator.take(final)  # None if it can't be used
+    """
+
+    def __init__(
+        self,
+        conversation: Conversation,
+        settle: float = 0.2,
+        min_words: int = 2,
+        on_ready: Optional[Callable[[Speculation], None]] = None,
+    ):
+        self.conversation = conversation
+        self.settle = settle
+        self.min_words = min_words
+        # called from a worker thread with each finished speculation
+        self.on_ready = on_ready
+
+        # a stale parse may still be running when the next one starts
+        self.executor = ThreadPoolExecutor(2, thread_name_prefix="speculation")
+        self.lock = threading.Lock()
+        self.hypothesis = ()
+        self.timer = None
+        self.futures: Dict[Tuple[str, ...], Future] = {}
+
+        self.started = 0
+        self.committed = 0
+        self.discarded = 0
+
+    def observe(self, hypothesis: str):
+        words = normalize_hypothesis(hypothesis)
+        with self.lock:
+            previous, self.hypothesis = self.hypothesis, words
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if len(words) < self.min_words:
+                return
+            if words == previous:
+                self._speculate(words, hypothesis)
+            else:
+                self.timer = threading.Timer(self.settle, self._settled, args=(words, hypothesis))
+                self.timer.daemon = True
+                self.timer.start()
+
+    def _settled(self, words: Tuple[str, ...], text: str):
+        with self.lock:
+            if self.hypothesis == words:
+                self._speculate(words, text)
+
+    def _speculate(self, words: Tuple[str, ...], text: str):
+        # called with the lock held
+        if words in self.futures:
+            return
+        # only the newest hypothesis can still become the final result
+        self.discarded += len(self.futures)
+        self.futures = {words: self.executor.submit(self._parse, words, text)}
+        self.started += 1
+
+    def _parse(self, words: Tuple[str, ...], text: str) -> Speculation:
+        preview = asyncio.run(self.conversation.preview(text))
+        content = preview.message.content or ""
+        speculation = Speculation(
+            words,
+            text,
+            preview,
+            MOVE_COMMAND_PATTERN.findall(content),
+            SPEECH_PATTERN.findall(content),
+        )
+        if self.on_ready is not None:
+            self.on_ready(speculation)
+        return speculation
+
+    def take(self, sentence: str) -> Optional[Speculation]:
+        """
+        The speculation for the final result `sentence`, waiting for it if it
+        is still being parsed, or None if there is none. Every other
+        speculation is discarded.
+        """
+        words = normalize_hypothesis(sentence)
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            self.hypothesis = ()
+            futures, self.futures = self.futures, {}
+            future = futures.pop(words, None)
+            self.discarded += len(futures)
+
+        if future is None:
+            return None
+        try:
+            speculation = future.result()
+        except Exception as e:
+            print(f"speculative parse failed: {e!r}")
+            with self.lock:
+                self.discarded += 1
+            return None
+        with self.lock:
+            self.committed += 1
+        return speculation
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
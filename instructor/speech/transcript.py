@@ -0,0 +1,138 @@
+import threading
+from collections import OrderedDict, deque
+from typing import Deque, List, Tuple
+
+
+COLUMNS = ("Recognized", "Processed", "Start Time", "Stop Time")
+
+Row = Tuple[str, str, str, str]
+
+
+class TranscriptModel:
+    """
+    Rows of the speech history, kept apart from the Treeview so recognizer
+    callbacks never touch Tk. The unstable row (the partial result being
+    recognized) is tracked by id, and every change is O(1). Only the newest
+    `max_rows` rows are visible; older ones are paged out to `archive`,
+    which keeps the newest `max_archive_rows` of them.
+    """
+
+    def __init__(self, max_rows: int = 200, max_archive_rows: int = 10000):
+        self.max_rows = max_rows
+        self.rows = OrderedDict()
+        self.stable = set()
+        self.unstable_id = None
+        self.next_id = 0
+        self.archive: Deque[Row] = deque(maxlen=max_archive_rows)
+
+        self.lock = threading.Lock()
+        # changed since the last drain, coalesced per row
+        self.changed = OrderedDict()
+        self.removed = []
+
+    def _add(self, values: Row) -> int:
+        row_id = self.next_id
+        self.next_id += 1
+        self.rows[row_id] = values
+        self.changed[row_id] = None
+
+        while len(self.rows) > self.max_rows:
+            old_id, old_values = self.rows.popitem(last=False)
+            self.stable.discard(old_id)
+            self.changed.pop(old_id, None)
+            self.removed.append(old_id)
+            self.archive.append(old_values)
+            if old_id == self.unstable_id:
+                self.unstable_id = None
+        return row_id
+
+    def _set(self, row_id: int, values: Row):
+        if row_id in self.rows:
+            self.rows[row_id] = values
+            self.changed[row_id] = None
+
+    def set_unstable(self, text: str):
+        with self.lock:
+            if self.unstable_id is None:
+                self.unstable_id = self._add((text, "", "", ""))
+            else:
+                self._set(self.unstable_id, (text, "", "", ""))
+
+    def add_stable(self, sentence: str, start: str, stop: str, processed: str = "processing...") -> int:
+        """
+        Turns the unstable row into a stable one, or adds a stable row if
+        there is none. Returns its id for `set_processed`.
+        """
+        with self.lock:
+            values = (sentence, processed, start, stop)
+            row_id = self.unstable_id
+            self.unstable_id = None
+            if row_id is None:
+                row_id = self._add(values)
+            else:
+                self._set(row_id, values)
+            self.stable.add(row_id)
+            return row_id
+
+    def set_processed(self, row_id: int, processed: str):
+        with self.lock:
+            if row_id in self.rows:
+                sentence, _, start, stop = self.rows[row_id]
+                self._set(row_id, (sentence, processed, start, stop))
+
+    def clear(self):
+        with self.lock:
+            self.archive.extend(self.rows.values())
+            self.removed.extend(self.rows)
+            self.rows.clear()
+            self.stable.clear()
+            self.changed.clear()
+            self.unstable_id = None
+
+    def drain(self) -> Tuple[List[Tuple[int, Row, str]], List[int]]:
+        """
+        Rows changed since the last call, with their values and tag, and the
+        ids of rows removed since.
+        """
+        with self.lock:
+            changed = [
+                (row_id, self.rows[row_id], "stable" if row_id in self.stable else "unstable")
+                for row_id in self.changed
+            ]
+            removed = self.removed
+            self.changed = OrderedDict()
+            self.removed = []
+        return changed, removed
+
+
+class TranscriptView:
+    """
+    Applies a TranscriptModel's changes to a ttk.Treeview every `interval`
+    seconds on the Tk thread, so a burst of partial results costs one
+    update per row per refresh.
+    """
+
+    def __init__(self, root, tree, model: TranscriptModel, interval: float = 0.1):
+        self.root = root
+        self.tree = tree
+        self.model = model
+        self.interval_ms = max(int(interval * 1000), 1)
+        self.tree.tag_configure("stable", foreground="black")
+        self.tree.tag_configure("unstable", foreground="grey")
+
+    def start(self):
+        self.refresh()
+
+    def refresh(self):
+        changed, removed = self.model.drain()
+        for row_id in removed:
+            if self.tree.exists(str(row_id)):
+                self.tree.delete(str(row_id))
+        for row_id, values, tag in changed:
+            iid = str(row_id)
+            if self.tree.exists(iid):
+                self.tree.item(iid, values=values, tags=(tag,))
+            else:
+                # rows are only ever added at the end
+                self.tree.insert("", "end", iid=iid, values=values, tags=(tag,))
+        self.root.after(self.interval_ms, self.refresh)
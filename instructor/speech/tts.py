@@ -0,0 +1,301 @@
+import abc
+import asyncio
+import hashlib
+import io
+import math
+import os
+import threading
+import time
+import wave
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional
+
+import numpy as np
+
+
+SAMPLE_RATE = 16000
+
+
+class Synthesizer(abc.ABC):
+    """
+    Turns text into WAV audio. Called from worker threads, so it may block.
+    """
+
+    @abc.abstractmethod
+    def synthesize(self, text: str, voice: str) -> bytes:
+        pass
+
+
+class AzureSynthesizer(Synthesizer):
+    """
+    Azure speech synthesis into memory, without playing anything.
+    """
+
+    def __init__(self, key: str, region: str):
+        import azure.cognitiveservices.speech as speechsdk
+
+        self.speechsdk = speechsdk
+        self.key = key
+        self.region = region
+        # one synthesizer per voice and thread, they are not safe to share
+        self.local = threading.local()
+
+    def _synthesizer(self, voice: str):
+        synthesizers = self.local.__dict__.setdefault("synthesizers", {})
+        if voice not in synthesizers:
+            speech_config = self.speechsdk.SpeechConfig(subscription=self.key, region=self.region)
+            speech_config.speech_synthesis_voice_name = voice
+            speech_config.set_speech_synthesis_output_format(
+                self.speechsdk.SpeechSynthesisOutputFormat.Riff16Khz16BitMonoPcm)
+            synthesizers[voice] = self.speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=None)
+        return synthesizers[voice]
+
+    def synthesize(self, text: str, voice: str) -> bytes:
+        result = self._synthesizer(voice).speak_text_async(text).get()
+        if result.reason != self.speechsdk.ResultReason.SynthesizingAudioCompleted:
+            raise RuntimeError(f"synthesis failed: {result.cancellation_details.error_details}")
+        return result.audio_data
+
+
+class LocalSynthesizer(Synthesizer):
+    """
+    Stand-in for tests and benchmarks: a tone as long as the text would take
+    to say, after `latency` seconds.
+    """
+
+    def __init__(self, latency: float = 0.0, seconds_per_char: float = 0.06):
+        self.latency = latency
+        self.seconds_per_char = seconds_per_char
+        self.calls = 0
+
+    def synthesize(self, text: str, voice: str) -> bytes:
+        self.calls += 1
+        time.sleep(self.latency)
+        t = np.arange(int(SAMPLE_RATE * self.seconds_per_char * len(text))) / SAMPLE_RATE
+        return to_wav((0.2 * 32767 * np.sin(2 * math.pi * 220 * t)).astype(np.int16))
+
+
+def to_wav(samples: np.ndarray, rate: int = SAMPLE_RATE) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+
+def wav_duration(audio: bytes) -> float:
+    with wave.open(io.BytesIO(audio), "rb") as f:
+        return f.getnframes() / f.getframerate()
+
+
+class AudioCache:
+    """
+    Synthesized audio keyed by text and voice. The most recently used
+    `max_bytes` are kept in memory; with `dirname`, everything is also
+    written to disk and survives restarts.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 2**20, dirname: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.dirname = dirname
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        if dirname is not None:
+            os.makedirs(dirname, exist_ok=True)
+
+    @staticmethod
+    def key(text: str, voice: str) -> str:
+        return hashlib.sha1(f"{voice}\0{text}".encode()).hexdigest()
+
+    def _filename(self, key: str) -> str:
+        return os.path.join(self.dirname, key + ".wav")
+
+    def get(self, text: str, voice: str) -> Optional[bytes]:
+        key = self.key(text, voice)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+
+        if self.dirname is None:
+            return None
+        try:
+            with open(self._filename(key), "rb") as f:
+                audio = f.read()
+        except FileNotFoundError:
+            return None
+        self._remember(key, audio)
+        return audio
+
+    def put(self, text: str, voice: str, audio: bytes):
+        key = self.key(text, voice)
+        if self.dirname is not None:
+            filename = self._filename(key)
+            with open(filename + ".tmp", "wb") as f:
+                f.write(audio)
+            os.replace(filename + ".tmp", filename)
+        self._remember(key, audio)
+
+    def _remember(self, key: str, audio: bytes):
+        with self.lock:
+            if key in self.entries:
+                self.size -= len(self.entries.pop(key))
+            self.entries[key] = audio
+            self.size += len(audio)
+            while self.size > self.max_bytes and len(self.entries) > 1:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+
+class Player(abc.ABC):
+    """
+    Plays WAV audio, blocking until it is done.
+    """
+
+    @abc.abstractmethod
+    def play(self, audio: bytes):
+        pass
+
+
+class SpeakerPlayer(Player):
+
+    def __init__(self):
+        import pyaudio
+
+        self.pyaudio = pyaudio.PyAudio()
+
+    def play(self, audio: bytes):
+        with wave.open(io.BytesIO(audio), "rb") as f:
+            stream = self.pyaudio.open(
+                format=self.pyaudio.get_format_from_width(f.getsampwidth()),
+                channels=f.getnchannels(),
+                rate=f.getframerate(),
+                output=True,
+            )
+            try:
+                stream.write(f.readframes(f.getnframes()))
+            finally:
+                stream.stop_stream()
+                stream.close()
+
+
+class NullPlayer(Player):
+    """
+    Records what would have been played; with `realtime`, takes as long as
+    the audio would.
+    """
+
+    def __init__(self, realtime: bool = False):
+        self.realtime = realtime
+        self.played = []
+
+    def play(self, audio: bytes):
+        self.played.append(audio)
+        if self.realtime:
+            time.sleep(wav_duration(audio))
+
+
+class SpeechOutput:
+    """
+    Speaks responses from cached audio where possible. Text that is not
+    cached is synthesized on a thread pool as soon as it is requested, also
+    while earlier responses are still playing; playback follows the order of
+    the `speak` calls.
+
+        output = SpeechOutput(AzureSynthesizer(key, region), SpeakerPlayer(), voice)
+        output.prefetch(["Okay."])
+        await output.speak("Okay.")
+    """
+
+    def __init__(
+        self,
+        synthesizer: Synthesizer,
+        player: Player,
+        voice: str,
+        cache: Optional[AudioCache] = None,
+        workers: int = 4,
+        on_play: Optional[Callable[[bool], None]] = None,
+    ):
+        self.synthesizer = synthesizer
+        self.player = player
+        self.voice = voice
+        self.cache = cache if cache is not None else AudioCache()
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="tts")
+        # called with True before and False after each playback, e.g. to pause recognition
+        self.on_play = on_play
+
+        self.pending: Dict[str, Future] = {}
+        self.pending_lock = threading.Lock()
+        self.last_playback = None
+        self.hits = 0
+        self.misses = 0
+
+    def _synthesize(self, text: str) -> bytes:
+        audio = self.cache.get(text, self.voice)
+        if audio is None:
+            audio = self.synthesizer.synthesize(text, self.voice)
+            self.cache.put(text, self.voice, audio)
+        return audio
+
+    def _audio_future(self, text: str) -> Future:
+        # concurrent requests for the same text share one synthesis
+        with self.pending_lock:
+            future = self.pending.get(text)
+            if future is None:
+                future = self.executor.submit(self._synthesize, text)
+                self.pending[text] = future
+                future.add_done_callback(lambda _: self._forget(text))
+            return future
+
+    def _forget(self, text: str):
+        with self.pending_lock:
+            self.pending.pop(text, None)
+
+    def prefetch(self, texts: Iterable[str]):
+        """
+        Synthesizes the texts in the background, unless already cached.
+        """
+        for text in texts:
+            if self.cache.get(text, self.voice) is None:
+                self._audio_future(text)
+
+    async def speak(self, text: str):
+        loop = asyncio.get_running_loop()
+        previous = self.last_playback
+        playback = loop.create_future()
+        self.last_playback = playback
+
+        try:
+            audio = self.cache.get(text, self.voice)
+            if audio is None:
+                self.misses += 1
+                try:
+                    audio = await asyncio.wrap_future(self._audio_future(text))
+                except Exception as e:
+                    print(f"could not synthesize {text!r}: {e!r}")
+                    return
+            else:
+                self.hits += 1
+
+            # process_speech runs each utterance in its own event loop
+            if previous is not None and not previous.done():
+                await asyncio.shield(previous)
+            await loop.run_in_executor(None, self._play, audio)
+        finally:
+            playback.set_result(None)
+
+    def _play(self, audio: bytes):
+        if self.on_play is not None:
+            self.on_play(True)
+        try:
+            self.player.play(audio)
+        finally:
+            if self.on_play is not None:
+                self.on_play(False)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -1,3 +1,19 @@
+from typing import TYPE_CHECKING
+
 from .config import get_config
+from .history import HistoryReader, HistoryWriter, get_history_reader, get_history_writer
+from .keypoint_ring import KeypointFrame, KeypointRing, format_point, get_keypoint_ring
+from .lazy import lazy_attributes
 from .log import read_log_array, write_log_array
-from .redis import make_redis_client
\ No newline at end of file
+from .profiling import Profiler, StatusLine, add_profile_arguments, get_profiler
+from .shared_ring import SharedRing
+from .tracing import TRACE_KEY, Trace, Tracer, format_trace, get_tracer, new_trace, parse_trace
+from .warmup import start_warmup
+
+# redis is only imported by processes that connect to it
+__getattr__ = lazy_attributes(__name__, {
+    "make_redis_client": ".redis",
+})
+
+if TYPE_CHECKING:
+    from .redis import make_redis_client
@@ -0,0 +1,238 @@
+import gzip
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from .config import get_config
+
+
+MANIFEST_FILE = "manifest.json"
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def parse_timestamp(value: str) -> float:
+    return datetime.strptime(value, TIME_FORMAT).timestamp()
+
+
+def read_manifest(dirname: str) -> List[dict]:
+    try:
+        with open(os.path.join(dirname, MANIFEST_FILE), "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+def write_manifest(dirname: str, segments: List[dict]):
+    # readers in other processes must never see a partly written manifest
+    filename = os.path.join(dirname, MANIFEST_FILE)
+    with open(filename + ".tmp", "w") as f:
+        json.dump(segments, f, indent=1)
+    os.replace(filename + ".tmp", filename)
+
+
+def read_segment(filename: str) -> List[Dict[str, str]]:
+    """
+    Rows of a raw (.txt) or compacted (.txt.gz) segment, as dicts of the
+    column strings. A row still being written by the history process is
+    skipped.
+    """
+    opener = gzip.open if filename.endswith(".gz") else open
+    with opener(filename, "rt") as f:
+        lines = f.read().split("\n")
+
+    headers = lines[0].split("\t")
+    rows = []
+    # every complete row ends with a newline
+    for line in lines[1:-1]:
+        cols = line.split("\t")
+        if len(cols) == len(headers):
+            rows.append(dict(zip(headers, cols)))
+    return rows
+
+
+class HistoryWriter:
+    """
+    Appends pose history rows to time-based segments in `dirname`. Each
+    segment covers at most `segment_duration` seconds, and a manifest lists
+    every segment with its time range and tier.
+
+    With compaction started, a background thread rewrites segments older
+    than `compact_after` seconds at `compact_rate` Hz into gzipped text, and
+    deletes segments older than `retention` seconds.
+    """
+
+    def __init__(
+        self,
+        dirname: str,
+        keys: List[str],
+        segment_duration: float = 300,
+        compact_after: float = 3600,
+        compact_rate: float = 10,
+        retention: float = 86400,
+    ):
+        self.dirname = dirname
+        self.keys = keys
+        self.segment_duration = segment_duration
+        self.compact_after = compact_after
+        self.compact_rate = compact_rate
+        self.retention = retention
+        os.makedirs(dirname, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.segments = read_manifest(dirname)
+        # a segment left open by a previous run ends with its last row
+        for segment in self.segments:
+            if segment["end"] is None:
+                rows = read_segment(os.path.join(dirname, segment["file"]))
+                segment["end"] = parse_timestamp(rows[-1]["timestamp"]) if rows else segment["start"]
+
+        self.file = None
+        self.last_timestamp = None
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    def _open_segment(self, timestamp: float):
+        filename = f"{datetime.fromtimestamp(timestamp).strftime('%Y%m%d-%H%M%S')}.txt"
+        self.file = open(os.path.join(self.dirname, filename), "w")
+        self.file.write("\t".join(["timestamp"] + self.keys) + "\n")
+        self.file.flush()
+        self.segments.append({
+            "file": filename,
+            "start": timestamp,
+            "end": None,
+            "tier": "raw",
+        })
+
+    def _close_segment(self, timestamp: float):
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        self.segments[-1]["end"] = timestamp
+
+    def write(self, timestamp: datetime, values: List[str]):
+        """
+        Appends one row, with a value (or "None") for every key.
+        """
+        seconds = timestamp.timestamp()
+        with self.lock:
+            if self.file is not None and seconds >= self.segments[-1]["start"] + self.segment_duration:
+                self._close_segment(self.last_timestamp)
+            if self.file is None:
+                self._open_segment(seconds)
+                write_manifest(self.dirname, self.segments)
+
+            self.file.write("\t".join([timestamp.strftime(TIME_FORMAT)] + values) + "\n")
+            self.file.flush()
+            self.last_timestamp = seconds
+
+    def compact(self, now: Optional[float] = None):
+        """
+        Applies compaction and retention to the closed segments.
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            closed = [segment for segment in self.segments if segment["end"] is not None]
+
+        for segment in closed:
+            filename = os.path.join(self.dirname, segment["file"])
+            if segment["end"] < now - self.retention:
+                with self.lock:
+                    self.segments.remove(segment)
+                    write_manifest(self.dirname, self.segments)
+                os.remove(filename)
+
+            elif segment["tier"] == "raw" and segment["end"] < now - self.compact_after:
+                rows = read_segment(filename)
+                compacted = []
+                next_time = None
+                for row in rows:
+                    seconds = parse_timestamp(row["timestamp"])
+                    # timestamps are stored to the microsecond
+                    if next_time is None or seconds >= next_time - 1e-6:
+                        compacted.append(row)
+                        next_time = seconds + 1.0 / self.compact_rate
+
+                # segments of earlier runs may have other columns
+                headers = list(rows[0]) if rows else ["timestamp"] + self.keys
+                compact_file = segment["file"] + ".gz"
+                with gzip.open(os.path.join(self.dirname, compact_file), "wt") as f:
+                    f.write("\t".join(headers) + "\n")
+                    for row in compacted:
+                        f.write("\t".join(row[key] for key in headers) + "\n")
+
+                # readers holding the old manifest retry when the raw file is gone
+                with self.lock:
+                    segment.update(file=compact_file, tier="compact")
+                    write_manifest(self.dirname, self.segments)
+                os.remove(filename)
+
+    def start_compaction(self, interval: float = 60):
+        def run():
+            while not self.stop_event.wait(interval):
+                self.compact()
+
+        self.compact()
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.stop_event.set()
+        with self.lock:
+            if self.file is not None:
+                self._close_segment(self.last_timestamp)
+                write_manifest(self.dirname, self.segments)
+
+
+class HistoryReader:
+    """
+    Reads rows of a time window from the segments written by HistoryWriter,
+    opening only the segments whose time range overlaps the window.
+    """
+
+    def __init__(self, dirname: str):
+        self.dirname = dirname
+
+    def segments(self, start: float, stop: float) -> List[dict]:
+        return [
+            segment for segment in read_manifest(self.dirname)
+            # the open segment has no end yet
+            if segment["start"] <= stop and (segment["end"] is None or segment["end"] >= start)
+        ]
+
+    def read(self, start: datetime, stop: datetime) -> List[Dict[str, str]]:
+        """
+        Rows with start <= timestamp <= stop, as dicts of column strings.
+        """
+        start, stop = start.timestamp(), stop.timestamp()
+        for attempt in range(3):
+            try:
+                rows = []
+                for segment in self.segments(start, stop):
+                    for row in read_segment(os.path.join(self.dirname, segment["file"])):
+                        if start <= parse_timestamp(row["timestamp"]) <= stop:
+                            rows.append(row)
+                return rows
+            except FileNotFoundError:
+                # compacted or deleted since the manifest was read
+                continue
+        return []
+
+
+def get_history_writer(keys: List[str]) -> HistoryWriter:
+    cfg = get_config()["history"]
+    return HistoryWriter(
+        dirname=cfg["dir"],
+        keys=keys,
+        segment_duration=cfg["segment_duration"],
+        compact_after=cfg["compact_after"],
+        compact_rate=cfg["compact_rate"],
+        retention=cfg["retention"],
+    )
+
+
+def get_history_reader() -> HistoryReader:
+    return HistoryReader(get_config()["history"]["dir"])
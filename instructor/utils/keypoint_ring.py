@@ -0,0 +1,206 @@
+import os
+import time
+from multiprocessing import resource_tracker
+from typing import Dict, Iterator, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .config import get_config
+from .shared_ring import SharedRing
+
+
+class KeypointFrame(NamedTuple):
+    index: int
+    # capture time of the camera frame
+    timestamp: float
+    trace_id: int
+    # (len(keys), 3), NaN rows for keypoints the tracker had no value for
+    points: np.ndarray
+    keys: Sequence[str]
+
+    @property
+    def keypoints(self) -> Dict[str, Optional[np.ndarray]]:
+        return {key: None if np.isnan(point).any() else point for key, point in zip(self.keys, self.points)}
+
+
+class KeypointRing:
+    """
+    The tracker's smoothed keypoints in a SharedRing, one record per frame,
+    for consumers on the tracker host. Frames are in capture order, so a
+    time range is a contiguous run of records found by binary search.
+    Readers never block the tracker; a reader that falls more than the
+    ring's capacity behind loses the oldest frames.
+
+        ring = KeypointRing.attach(name, keys)
+        frame = ring.latest()
+        frame = ring.wait(frame.index, timeout=1.0)
+        timestamps, points = ring.range(start_time, stop_time)
+    """
+
+    def __init__(self, ring: SharedRing, keys: Sequence[str]):
+        self.ring = ring
+        self.keys = list(keys)
+        if ring.dtype["points"].shape != (len(self.keys), 3):
+            raise ValueError(f"ring holds {ring.dtype['points'].shape[0]} keypoints, expected {len(self.keys)}")
+        self.record = np.zeros((), dtype=ring.dtype)
+        self.timestamps = ring.data["timestamp"]
+
+    @staticmethod
+    def record_dtype(num_keys: int) -> np.dtype:
+        return np.dtype([("timestamp", np.float64), ("trace_id", np.int64), ("points", np.float64, (num_keys, 3))])
+
+    @classmethod
+    def create(cls, name: str, keys: Sequence[str], capacity: int) -> "KeypointRing":
+        try:
+            ring = SharedRing.create(name, (), cls.record_dtype(len(keys)), capacity)
+        except FileExistsError:
+            # only a ring left behind by a tracker that has exited is replaced
+            # attached without registering it for cleanup, or this process
+            # would unlink a running tracker's ring when it exits
+            existing = SharedRing.attach(name)
+            pid = existing.pid
+            existing.close()
+            if pid is None or _running(pid):
+                owner = "an unknown process" if pid is None else f"process {pid}"
+                raise FileExistsError(
+                    f"keypoint ring {name} is held by {owner}; stop that tracker, "
+                    f"or remove /dev/shm/{name} if none is running") from None
+            # unlink unregisters the segment, which attach already did
+            resource_tracker.register(existing.shm._name, "shared_memory")
+            existing.shm.unlink()
+            ring = SharedRing.create(name, (), cls.record_dtype(len(keys)), capacity)
+        return cls(ring, keys)
+
+    @classmethod
+    def attach(cls, name: str, keys: Sequence[str]) -> "KeypointRing":
+        return cls(SharedRing.attach(name), keys)
+
+    def write(self, timestamp: float, trace_id: int, keypoints: Dict[str, Optional[np.ndarray]]) -> int:
+        self.record["timestamp"] = timestamp
+        self.record["trace_id"] = trace_id
+        points = self.record["points"]
+        for i, key in enumerate(self.keys):
+            point = keypoints.get(key)
+            points[i] = np.nan if point is None else point
+        return self.ring.write(self.record)
+
+    def _frame(self, index: int, record) -> KeypointFrame:
+        return KeypointFrame(index, float(record["timestamp"]), int(record["trace_id"]), record["points"], self.keys)
+
+    @property
+    def write_count(self) -> int:
+        return self.ring.write_count
+
+    def latest(self) -> Optional[KeypointFrame]:
+        index, record = self.ring.read_latest()
+        return None if record is None else self._frame(index, record)
+
+    def wait(self, after: int = -1, timeout: Optional[float] = None, poll_interval: float = 0.0005) -> Optional[KeypointFrame]:
+        """
+        Newest frame with an index above `after`, waiting up to `timeout`
+        seconds for one to be written. There is no cross-process condition
+        variable over the ring, so the write count is polled.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.ring.write_count - 1 <= after:
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(poll_interval)
+        return self.latest()
+
+    def since(self, after: int) -> Iterator[KeypointFrame]:
+        """
+        Frames with an index above `after` that are still in the ring, in
+        order.
+        """
+        end = self.ring.write_count
+        for index in range(max(after + 1, end - self.ring.capacity), end):
+            record = self.ring.read(index)
+            if record is not None:
+                yield self._frame(index, record)
+
+    def _timestamp(self, index: int) -> float:
+        slot = index % self.ring.capacity
+        timestamp = self.timestamps[slot]
+        # overwritten since, it is older than every frame still in the ring
+        return timestamp if self.ring.sequence[slot] == index else -np.inf
+
+    def _search(self, timestamp: float, right: bool) -> int:
+        """
+        First index whose frame is captured after `timestamp` (or at it,
+        unless `right`), by binary search over the ring in place.
+        """
+        end = self.ring.write_count
+        lo, hi = max(0, end - self.ring.capacity), end
+        while lo < hi:
+            mid = (lo + hi) // 2
+            value = self._timestamp(mid)
+            if value < timestamp or (right and value == timestamp):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def records(self, start: float, stop: float) -> np.ndarray:
+        """
+        Copies of the records, with timestamp, trace_id and points fields, of
+        the frames captured between start and stop, inclusive. Frames the
+        tracker overwrote while they were copied are left out.
+        """
+        indices = np.arange(self._search(start, right=False), self._search(stop, right=True))
+        slots = indices % self.ring.capacity
+        records = self.ring.data[slots]
+        return records[self.ring.sequence[slots] == indices]
+
+    def range(self, start: float, stop: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Timestamps and (n, len(keys), 3) points of the frames captured
+        between start and stop, inclusive.
+        """
+        records = self.records(start, stop)
+        return records["timestamp"], records["points"]
+
+    def oldest_timestamp(self) -> Optional[float]:
+        end = self.ring.write_count
+        for index in range(max(0, end - self.ring.capacity), end):
+            timestamp = self._timestamp(index)
+            if timestamp > -np.inf:
+                return float(timestamp)
+        return None
+
+    def close(self):
+        self.timestamps = None
+        self.ring.close()
+
+
+def _running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # another user's process
+        return True
+    return True
+
+
+def format_point(point: Optional[np.ndarray]) -> str:
+    # the same text the tracker writes to Redis
+    if point is None or np.isnan(point).any():
+        return "None"
+    return "[" + ", ".join(map(str, point.tolist())) + "]"
+
+
+def get_keypoint_ring(create: bool = False) -> Optional[KeypointRing]:
+    """
+    The tracker's keypoint ring from config.yml. Returns None when attaching
+    and no tracker is running on this host.
+    """
+    cfg = get_config()
+    ring_cfg = cfg["keypoint_ring"]
+    if create:
+        return KeypointRing.create(ring_cfg["name"], cfg["pose_keypoints"], int(ring_cfg["seconds"] * ring_cfg["rate"]))
+    try:
+        return KeypointRing.attach(ring_cfg["name"], cfg["pose_keypoints"])
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,22 @@
+import importlib
+import sys
+from typing import Dict
+
+
+def lazy_attributes(package: str, attributes: Dict[str, str]):
+    """
+    Module `__getattr__` that imports each attribute from its submodule the
+    first time it is used, so importing a package doesn't import every
+    heavy dependency of its submodules.
+
+        __getattr__ = lazy_attributes(__name__, {"PoseTracker": ".tracker"})
+    """
+
+    def __getattr__(name):
+        if name not in attributes:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+        value = getattr(importlib.import_module(attributes[name], package), name)
+        setattr(sys.modules[package], name, value)
+        return value
+
+    return __getattr__
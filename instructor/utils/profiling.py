@@ -0,0 +1,216 @@
+import atexit
+import bisect
+import json
+import os
+import signal
+import threading
+import time
+from collections import defaultdict
+from typing import Optional
+
+
+# bucket upper bounds in seconds, 1 us to ~4.5 min, four per doubling
+BUCKET_BOUNDS = [1e-6 * 2 ** (i / 4) for i in range(113)] + [float("inf")]
+
+
+class Histogram:
+    """
+    Fixed-size histogram of durations. Recording is a bisect and a few
+    increments, and memory does not grow with the number of samples.
+    """
+
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKET_BOUNDS)
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q: float) -> float:
+        """
+        Upper bound of the bucket holding the q-th percentile, at most 19%
+        above the exact value.
+        """
+        if self.count == 0:
+            return 0.0
+        target = q / 100 * self.count
+        cumulative = 0
+        for bound, count in zip(BUCKET_BOUNDS, self.counts):
+            cumulative += count
+            if cumulative >= target and count:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "total": self.total,
+            "min": self.min if self.count else 0.0,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "buckets": {
+                str(bound): count for bound, count in zip(BUCKET_BOUNDS, self.counts) if count
+            },
+        }
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class _StageTimer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.histogram.record(time.perf_counter() - self.start)
+        return False
+
+
+NULL_TIMER = _NullTimer()
+
+
+class Profiler:
+    """
+    Per-stage timers and event counters for a process. When disabled, every
+    call returns immediately, so instrumentation can stay in place.
+
+        with profiler.timer("detection"):
+            ...
+        profiler.count("frames")
+    """
+
+    def __init__(self, process: str, enabled: bool = False):
+        self.process = process
+        self.enabled = enabled
+        self.histograms = defaultdict(Histogram)
+        self.counters = defaultdict(int)
+        self.start_time = time.time()
+        self.snapshot_thread = None
+
+    def timer(self, stage: str):
+        if not self.enabled:
+            return NULL_TIMER
+        return _StageTimer(self.histograms[stage])
+
+    def record(self, stage: str, seconds: float):
+        if self.enabled:
+            self.histograms[stage].record(seconds)
+
+    def count(self, name: str, n: int = 1):
+        if self.enabled:
+            self.counters[name] += n
+
+    def summary(self) -> dict:
+        return {
+            "process": self.process,
+            "pid": os.getpid(),
+            "time": time.time(),
+            "elapsed": time.time() - self.start_time,
+            "stages": {stage: h.to_dict() for stage, h in list(self.histograms.items())},
+            "counters": dict(self.counters),
+        }
+
+    def print_summary(self):
+        summary = self.summary()
+        elapsed = summary["elapsed"]
+        print(f"\n[{self.process}] profile after {elapsed:.1f} s")
+        for stage, h in summary["stages"].items():
+            print(f"  {stage: <16} n: {h['count']: >8}  mean: {1e3 * h['total'] / max(h['count'], 1): 8.2f} ms"
+                  f"  p50: {1e3 * h['p50']: 8.2f} ms  p99: {1e3 * h['p99']: 8.2f} ms"
+                  f"  max: {1e3 * h['max']: 8.2f} ms  total: {h['total']: 7.2f} s")
+        for name, value in summary["counters"].items():
+            print(f"  {name: <16} {value: >8}  ({value / max(elapsed, 1e-9):.1f}/s)")
+
+    def write_snapshot(self, filename: str):
+        with open(filename + ".tmp", "w") as f:
+            json.dump(self.summary(), f)
+        os.replace(filename + ".tmp", filename)
+
+    def install(self, snapshot: Optional[str] = None, interval: float = 10.0):
+        """
+        Prints the summary on SIGUSR1 and at exit. With `snapshot`, also
+        writes it as JSON to that file every `interval` seconds and at exit.
+        """
+        if not self.enabled:
+            return
+
+        atexit.register(self.print_summary)
+        if hasattr(signal, "SIGUSR1") and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.print_summary())
+
+        if snapshot is not None:
+            atexit.register(self.write_snapshot, snapshot)
+
+            def run():
+                while True:
+                    time.sleep(interval)
+                    self.write_snapshot(snapshot)
+
+            self.snapshot_thread = threading.Thread(target=run, daemon=True)
+            self.snapshot_thread.start()
+
+
+class StatusLine:
+    """
+    Prints at most one status line every `interval` seconds, in place of
+    printing on every frame.
+
+        if status.due():
+            print(...)
+    """
+
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+        self.last = 0.0
+
+    def due(self) -> bool:
+        now = time.monotonic()
+        if now - self.last < self.interval:
+            return False
+        self.last = now
+        return True
+
+
+def add_profile_arguments(parser):
+    parser.add_argument("--profile", action="store_true",
+                        help="time stages, print a summary on SIGUSR1 and at exit")
+    parser.add_argument("--profile_snapshot", type=str, default=None,
+                        help="JSON file to write profile snapshots to")
+    parser.add_argument("--profile_interval", type=float, default=10.0,
+                        help="seconds between profile snapshots")
+
+
+def get_profiler(process: str, args=None) -> Profiler:
+    """
+    Profiler for a run script, enabled and installed by the arguments of
+    add_profile_arguments.
+    """
+    enabled = args is not None and args.profile
+    profiler = Profiler(process, enabled=enabled)
+    if enabled:
+        profiler.install(snapshot=args.profile_snapshot, interval=args.profile_interval)
+    return profiler
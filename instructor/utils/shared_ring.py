@@ -0,0 +1,128 @@
+import json
+import os
+from multiprocessing import resource_tracker, shared_memory
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+
+METADATA_SIZE = 256
+ALIGNMENT = 64
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _parse_dtype(descr) -> np.dtype:
+    # structured dtypes are stored as their descr, which JSON turns into lists
+    if isinstance(descr, str):
+        return np.dtype(descr)
+    return np.dtype([tuple(field) for field in descr])
+
+
+class SharedRing:
+    """
+    Fixed-size ring of equally shaped records in shared memory, written by a
+    single process and read by any number of others without locks.
+
+    Every slot has a sequence number: the writer sets it to -1 before
+    overwriting the slot and to the record's index afterwards, then bumps
+    the write count. Readers compare the sequence number before and after
+    copying a record to detect that the writer lapped them.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self.shm = shm
+        self.owner = owner
+
+        metadata = bytes(shm.buf[:METADATA_SIZE]).rstrip(b"\0")
+        metadata = json.loads(metadata)
+        self.capacity = metadata["capacity"]
+        self.shape = tuple(metadata["shape"])
+        self.dtype = _parse_dtype(metadata["dtype"])
+        # the process that created the ring, the only one that writes to it
+        self.pid = metadata.get("pid")
+
+        offset = METADATA_SIZE
+        self.count = np.ndarray((1,), dtype=np.int64, buffer=shm.buf, offset=offset)
+        offset += 8
+        self.sequence = np.ndarray((self.capacity,), dtype=np.int64, buffer=shm.buf, offset=offset)
+        offset = _align(offset + 8 * self.capacity)
+        self.data = np.ndarray((self.capacity,) + self.shape, dtype=self.dtype, buffer=shm.buf, offset=offset)
+
+    @staticmethod
+    def _size(capacity: int, shape: Sequence[int], dtype: np.dtype) -> int:
+        header = _align(METADATA_SIZE + 8 + 8 * capacity)
+        return header + capacity * int(np.prod(shape)) * dtype.itemsize
+
+    @classmethod
+    def create(cls, name: str, shape: Sequence[int], dtype, capacity: int) -> "SharedRing":
+        dtype = np.dtype(dtype)
+        shm = shared_memory.SharedMemory(name=name, create=True, size=cls._size(capacity, shape, dtype))
+        metadata = json.dumps({
+            "capacity": capacity,
+            "shape": list(shape),
+            "dtype": dtype.descr if dtype.fields else dtype.str,
+            "pid": os.getpid(),
+        }).encode()
+        assert len(metadata) < METADATA_SIZE, "record dtype too complex for the ring header"
+        shm.buf[:METADATA_SIZE] = metadata.ljust(METADATA_SIZE, b"\0")
+
+        ring = cls(shm, owner=True)
+        ring.count[0] = 0
+        ring.sequence[:] = -1
+        return ring
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedRing":
+        shm = shared_memory.SharedMemory(name=name)
+        # only the creating process may unlink the segment; before Python
+        # 3.13 attaching also registers it for cleanup at exit
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return cls(shm, owner=False)
+
+    def __len__(self):
+        return min(int(self.count[0]), self.capacity)
+
+    @property
+    def write_count(self) -> int:
+        return int(self.count[0])
+
+    def write(self, record) -> int:
+        index = int(self.count[0])
+        slot = index % self.capacity
+        self.sequence[slot] = -1
+        self.data[slot] = record
+        self.sequence[slot] = index
+        self.count[0] = index + 1
+        return index
+
+    def read(self, index: int) -> Optional[np.ndarray]:
+        """
+        Copy of the record with the given index, or None if it was already
+        overwritten or is not written yet.
+        """
+        slot = index % self.capacity
+        if self.sequence[slot] != index:
+            return None
+        record = self.data[slot].copy()
+        if self.sequence[slot] != index:
+            return None
+        return record
+
+    def read_latest(self) -> Tuple[int, Optional[np.ndarray]]:
+        while True:
+            index = int(self.count[0]) - 1
+            if index < 0:
+                return index, None
+            record = self.read(index)
+            if record is not None:
+                return index, record
+
+    def close(self):
+        # drop views into the buffer before closing it
+        self.count = self.sequence = self.data = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
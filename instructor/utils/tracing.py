@@ -0,0 +1,132 @@
+import argparse
+import atexit
+import glob
+import json
+import os
+import random
+import time
+from collections import defaultdict
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from .config import get_config
+
+
+TRACE_KEY = "trace"
+
+# histogram bucket upper bounds, in milliseconds
+BUCKETS_MS = [0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, np.inf]
+
+# order in which stages happen along the pipeline
+STAGES = ["detect", "history", "parse", "define", "execute", "setpoint"]
+
+
+class Trace(NamedTuple):
+    trace_id: int
+    capture_time: float
+
+
+def new_trace(capture_time: Optional[float] = None) -> Trace:
+    # ids fit in a float64 mantissa so they survive the text logs unchanged
+    return Trace(random.getrandbits(52), time.time() if capture_time is None else capture_time)
+
+
+def format_trace(trace: Trace, sent_time: Optional[float] = None) -> str:
+    sent_time = time.time() if sent_time is None else sent_time
+    return f"{trace.trace_id}:{trace.capture_time:.6f}:{sent_time:.6f}"
+
+
+def parse_trace(value: str):
+    """
+    Parses a value written by format_trace. Returns the trace and the time
+    it was sent.
+    """
+    trace_id, capture_time, sent_time = value.split(":")
+    return Trace(int(trace_id), float(capture_time)), float(sent_time)
+
+
+class Tracer:
+    """
+    Buffers stage spans and appends them as JSON lines to a per-process file.
+    """
+
+    def __init__(self, process: str, dirname: str = "traces/", enabled: bool = True, buffer_size: int = 256):
+        self.process = process
+        self.enabled = enabled
+        self.buffer_size = buffer_size
+        self.buffer = []
+        if enabled:
+            os.makedirs(dirname, exist_ok=True)
+            self.filename = os.path.join(dirname, f"{process}-{os.getpid()}.jsonl")
+            atexit.register(self.flush)
+
+    def span(self, trace: Trace, stage: str, start: float, end: Optional[float] = None):
+        if not self.enabled:
+            return
+        self.buffer.append({
+            "trace": trace.trace_id,
+            "capture": trace.capture_time,
+            "stage": stage,
+            "process": self.process,
+            "start": start,
+            "end": time.time() if end is None else end,
+        })
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        with open(self.filename, "a") as f:
+            f.write("".join(json.dumps(s) + "\n" for s in self.buffer))
+        self.buffer = []
+
+
+def get_tracer(process: str) -> Tracer:
+    cfg = get_config().get("tracing", {})
+    return Tracer(
+        process=process,
+        dirname=cfg.get("dir", "traces/"),
+        enabled=cfg.get("enabled", False),
+    )
+
+
+def print_histogram(title: str, values_ms: np.ndarray, width: int = 40):
+    counts, _ = np.histogram(values_ms, bins=[0] + BUCKETS_MS)
+    p50, p90, p99 = np.percentile(values_ms, [50, 90, 99])
+    print(f"\n{title}   n: {len(values_ms)}  p50: {p50:.2f} ms  p90: {p90:.2f} ms  p99: {p99:.2f} ms")
+    for upper, count in zip(BUCKETS_MS, counts):
+        if count == 0:
+            continue
+        label = "inf" if upper == np.inf else f"{upper:g}"
+        bar = "#" * max(1, int(width * count / counts.max()))
+        print(f"  <= {label: >6} ms  {count: >7}  {bar}")
+
+
+def summarize(dirname: str = "traces/"):
+    """
+    Prints, per stage, how long the hop itself took (end - start) and how
+    old the captured frame was when the hop finished (end - capture).
+    """
+    spans = defaultdict(list)
+    for filename in sorted(glob.glob(os.path.join(dirname, "*.jsonl"))):
+        with open(filename, "r") as f:
+            for line in f:
+                s = json.loads(line)
+                spans[s["stage"]].append(s)
+
+    stages = [s for s in STAGES if s in spans] + sorted(s for s in spans if s not in STAGES)
+    for stage in stages:
+        hop = np.array([s["end"] - s["start"] for s in spans[stage]]) * 1e3
+        age = np.array([s["end"] - s["capture"] for s in spans[stage]]) * 1e3
+        print_histogram(f"[{stage}] hop", hop)
+        print_histogram(f"[{stage}] since capture", age)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("dirname", type=str, nargs="?", default="traces/")
+    args = parser.parse_args()
+
+    summarize(dirname=args.dirname)
@@ -0,0 +1,25 @@
+import threading
+import time
+from typing import Callable
+
+
+def start_warmup(*steps: Callable[[], object], name: str = "warmup") -> threading.Thread:
+    """
+    Runs `steps` one after another on a daemon thread, so a process starts
+    serving while its heavy dependencies are imported and called for the
+    first time. A step that fails is reported and skipped; the work it would
+    have done happens on first use instead. join() waits for all of them.
+    """
+
+    def run():
+        start = time.perf_counter()
+        for step in steps:
+            try:
+                step()
+            except Exception as e:
+                print(f"{name}: {getattr(step, '__qualname__', step)} failed: {e!r}")
+        print(f"{name} done in {time.perf_counter() - start:.2f} s")
+
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+    return thread
@@ -1,3 +1,5 @@
+import argparse
+import json
 import redis
 import time
 import csv
@@ -5,25 +7,34 @@ from datetime import datetime, timedelta
 import asyncio
 import ast
 import numpy as np
-from scipy.spatial.transform import Rotation as R
-from instructor.moves.interpolation import interpolate_between_moves 
-from instructor.utils import get_config, make_redis_client, read_log_array
+from instructor.moves import MoveLibrary
+from instructor.moves.fanout import Fanout, Segment, get_robots
+from instructor.moves.normalization import body_scale, goal_coordinates
+from instructor.moves.interpolation import interpolate_between_moves
+from instructor.moves.spline import warmup as warmup_splines
+from instructor.utils import (
+    TRACE_KEY, Profiler, add_profile_arguments, get_config, get_profiler, get_tracer, make_redis_client,
+    start_warmup)
 
 cfg = get_config()
 redis_client = make_redis_client()
+tracer = get_tracer("setpoint")
+# replaced when run with --profile
+profiler = Profiler("setpoint")
+library = MoveLibrary()
 
 DEFINE_MOVE_KEY = cfg["redis"]["keys"]["define_move"]
 MOVE_LIST_KEY = cfg["redis"]["keys"]["move_list"]
 EXECUTE_FLAG_KEY = cfg["redis"]["keys"]["execute_flag"]
 MOVE_EXECUTED_KEY = cfg["redis"]["keys"]["move_executed"]
+PREPARE_MOVES_KEY = cfg["redis"]["keys"]["prepare_moves"]
 
 REALSENSE_PREFIX = cfg["redis"]["realsense_prefix"]
 
-# rotate 90 counterclockwise around x
-r1 = R.from_rotvec(np.pi/2 * np.array([1, 0, 0]))
-# rotate 90 counterclockwise around z
-r2 = R.from_rotvec(np.pi/2 * np.array([0, 0, 1]))
-rot = r2 * r1
+# rate at which a whole move is sampled to find its torso length
+SCALE_RATE = 50
+# torso length of each loaded move version
+scales = {}
 
 def read_data(file_path):
     data = []
@@ -38,54 +49,80 @@ def read_data(file_path):
         print(f"An error occurred while reading the file: {e}")
     return data
 
-def publish_to_redis(data, rate_hz=30):
-    hand_coords = rot.apply(data[REALSENSE_PREFIX + "right_hand"])
-    shoulder_coords = rot.apply(data[REALSENSE_PREFIX + "center_shoulders"])
-    hip_coords = rot.apply(data[REALSENSE_PREFIX + "center_hips"])
+def load_move(move_id):
+    move = library.load(move_id)
+    key = (move_id, library.get(move_id).version)
+    if key not in scales:
+        keys = [REALSENSE_PREFIX + "center_hips", REALSENSE_PREFIX + "center_shoulders"]
+        scales[key] = body_scale(move.sample(SCALE_RATE, keys), REALSENSE_PREFIX)
+    return move, scales[key]
 
-    goal_coords = hand_coords - hip_coords
+def prepare_moves(move_ids):
+    # process_speech expects these moves soon, load them before they are asked for
+    with profiler.timer("prepare"):
+        for move_id in move_ids:
+            if move_id in library:
+                load_move(move_id)
 
-    torso_length = (shoulder_coords - hip_coords)[:,1:]
-    torso_length = np.mean(np.linalg.norm(torso_length, axis=1))
-
-    arm_length = 1.5 * torso_length
-    goal_coords /= 2 * arm_length
-
-    coords = np.clip(
-        a=goal_coords,
-        a_min=[0.49, -0.5, 0],
-        a_max=[0.51, 0.5, 0.8],
-    )
-
-    for c in coords:
-        redis_client.set("teleop::desired_pos", str(list(c)))
-        time.sleep(1.0 / rate_hz)
-
-def execute_move(move_id, interpolated=True):
+def move_segments(move_id):
     print("executing ", move_id)
-    if interpolated:
-        file_path = f"recordings/{move_id}_interpolated.txt"
-    else: 
-        file_path = f"recordings/{move_id}.txt"
+    with profiler.timer("load"):
+        move, scale = load_move(move_id)
+
+    # the move is evaluated at the playback rate a chunk at a time
+    for chunk in move.chunks(rate=cfg["rate"]):
+        with profiler.timer("evaluate"):
+            coords = goal_coordinates(chunk, REALSENSE_PREFIX, scale=scale)
+        # one span per source frame, the first time one of its setpoints goes out
+        traces = chunk.get(REALSENSE_PREFIX + TRACE_KEY) if tracer.enabled else None
+        yield Segment(coords, traces)
 
-    data = read_log_array(file_path)
-    publish_to_redis(data, rate_hz=cfg["rate"])
+def program_segments(move_list):
+    for i, move_id in enumerate(move_list):
+        yield from move_segments(move_id)
+        yield Segment.marker(lambda move_id=move_id: redis_client.rpush(MOVE_EXECUTED_KEY, move_id))
+        if i + 1 < len(move_list):
+            transition = interpolate_between_moves(move_id, move_list[i + 1], library=library)
+            # moves without keypoints in common have no transition
+            if len(transition["timestamp"]):
+                yield Segment(goal_coordinates(transition, REALSENSE_PREFIX))
 
-def replay_moves():
+async def replay_moves(fanout):
+    pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(PREPARE_MOVES_KEY)
     while True:
+        message = pubsub.get_message()
+        if message is not None:
+            prepare_moves(json.loads(message["data"]))
         execute_flag = redis_client.get(EXECUTE_FLAG_KEY)
         if execute_flag == "1": 
             print("Begining move execution")
             move_list = redis_client.lrange(MOVE_LIST_KEY, 0, -1)
-            for i in range(len(move_list)):
-                move_id = move_list[i]
-                execute_move(move_id)
-                redis_client.rpush(MOVE_EXECUTED_KEY, move_id)
-                if i + 1 < len(move_list):
-                    next_move = move_list[i + 1]
-                    interpolate_between_moves(move_id, next_move)
-                    execute_move(str(move_id) + "_to_" + str(next_move), False)
+            # still acknowledge unknown moves so the speech runtime stops waiting
+            for move_id in move_list:
+                if move_id not in library:
+                    print(f"unknown move {move_id}, skipping")
+                    redis_client.rpush(MOVE_EXECUTED_KEY, move_id)
+            move_list = [move_id for move_id in move_list if move_id in library]
+            # every robot plays the same trajectory, computed once
+            with profiler.timer("program"):
+                await fanout.play(program_segments(move_list))
             print("Done with move execution!")
             redis_client.set(EXECUTE_FLAG_KEY, "0")
         
-replay_moves()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profiler = get_profiler("setpoint", args)
+
+    fanout = Fanout(
+        get_robots(cfg),
+        rate=cfg["rate"],
+        start_delay=cfg["playback"]["start_delay"],
+        profiler=profiler,
+        tracer=tracer,
+    )
+    # polls for programs right away, scipy loads in the meantime
+    start_warmup(warmup_splines, name="setpoint warmup")
+    asyncio.run(replay_moves(fanout))
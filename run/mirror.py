@@ -0,0 +1,113 @@
+import argparse
+import time
+
+import numpy as np
+
+from instructor.moves.mirror import Mirror
+from instructor.utils import (
+    TRACE_KEY, Profiler, StatusLine, Trace, add_profile_arguments, get_config, get_keypoint_ring, get_profiler,
+    get_tracer, make_redis_client, parse_trace)
+
+
+def parse_keypoint(value):
+    if value is None or value == "None":
+        return None
+    keypoint = np.array(value.strip("[]").split(","), dtype=np.float64)
+    return None if np.isnan(keypoint).any() else keypoint
+
+
+def run_mirror(rate: float, controller_latency: float, max_speed: float, profiler: Profiler):
+    cfg = get_config()
+    mirror_cfg = cfg["mirror"]
+    prefix = cfg["redis"]["realsense_prefix"]
+    goal_key = cfg["redis"]["keys"]["goal_pos"]
+
+    redis_client = make_redis_client()
+    tracer = get_tracer("mirror")
+    mirror = Mirror(
+        prefix=prefix,
+        controller_latency=controller_latency,
+        max_speed=max_speed,
+        max_horizon=mirror_cfg["max_horizon"],
+        process_noise=mirror_cfg["process_noise"],
+        measurement_noise=mirror_cfg["measurement_noise"],
+    )
+
+    keys = [prefix + key for key in Mirror.KEYPOINTS] + [prefix + TRACE_KEY]
+    last_trace = None
+    # with the tracker on this host, frames are read from shared memory
+    ring = get_keypoint_ring()
+    print("reading keypoints from " + ("shared memory" if ring is not None else "redis"))
+    last_index, last_frame = -1, time.monotonic()
+    status = StatusLine(interval=1.0)
+    next_tick = time.perf_counter()
+
+    while True:
+        keypoints = None
+        if ring is not None:
+            with profiler.timer("read"):
+                frame = ring.latest()
+            if frame is not None and frame.index != last_index:
+                last_index, last_frame = frame.index, time.monotonic()
+                trace = Trace(frame.trace_id, frame.timestamp)
+                keypoints = frame.keypoints
+            elif time.monotonic() - last_frame > 1.0:
+                # a restarted tracker writes to a new segment
+                ring.close()
+                ring = get_keypoint_ring()
+                last_index, last_frame = -1, time.monotonic()
+        else:
+            # one round trip for the keypoints and the trace of the frame they came from
+            with profiler.timer("read"):
+                values = redis_client.mget(keys)
+            if values[-1] is not None and values[-1] != last_trace:
+                last_trace = values[-1]
+                trace, _ = parse_trace(last_trace)
+                keypoints = {key: parse_keypoint(value) for key, value in zip(Mirror.KEYPOINTS, values)}
+        now = time.time()
+
+        if keypoints is not None:
+            with profiler.timer("update"):
+                mirror.update(keypoints, trace.capture_time, now)
+            tracer.span(trace, "setpoint", start=now)
+            profiler.count("frames")
+
+        with profiler.timer("predict"):
+            setpoint = mirror.setpoint(now)
+        if setpoint is not None:
+            redis_client.set(goal_key, str(list(setpoint)))
+            profiler.count("setpoints")
+
+        if mirror.latency is not None and status.due():
+            print(f"latency {1e3 * mirror.latency:.0f} ms, predicting {1e3 * (mirror.latency + controller_latency):.0f} ms ahead")
+
+        next_tick += 1.0 / rate
+        delay = next_tick - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            next_tick = time.perf_counter()
+
+
+if __name__ == "__main__":
+    mirror_cfg = get_config()["mirror"]
+
+    parser = argparse.ArgumentParser(description="Makes the robot follow the instructor's right hand live.")
+    parser.add_argument("--rate", type=float, default=mirror_cfg["rate"],
+                        help="setpoint rate in Hz, matched to the controller")
+    parser.add_argument("--controller_latency", type=float, default=mirror_cfg["controller_latency"],
+                        help="seconds added to the measured pipeline latency when predicting")
+    parser.add_argument("--max_speed", type=float, default=mirror_cfg["max_speed"],
+                        help="largest setpoint change per second")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    try:
+        run_mirror(
+            rate=args.rate,
+            controller_latency=args.controller_latency,
+            max_speed=args.max_speed,
+            profiler=get_profiler("mirror", args),
+        )
+    except KeyboardInterrupt:
+        pass
@@ -1,17 +1,25 @@
+import argparse
 import asyncio
 import json
 import os
-import re
 import time
 import tkinter as tk
 from tkinter import ttk
 
 import azure.cognitiveservices.speech as speechsdk
 import dotenv
+import redis as sync_redis
 import redis.asyncio as redis
 
+from instructor.moves import MoveLibrary
+from instructor.speech.alignment import annotate_parsed_sentence
 from instructor.speech.engine import Runtime, RuntimeSession, Engine
 from instructor.speech.prompt import Conversation
+from instructor.speech.speculation import Speculator
+from instructor.speech.transcript import COLUMNS, TranscriptModel, TranscriptView
+from instructor.speech.tts import AudioCache, AzureSynthesizer, SpeakerPlayer, SpeechOutput
+from instructor.utils import (
+    Profiler, add_profile_arguments, get_config, get_profiler, get_tracer, new_trace, start_warmup)
 
 dotenv.load_dotenv()
 
@@ -27,6 +35,7 @@ DEFINE_MOVE_KEY = "robot::define_move"
 MOVE_LIST_KEY = "robot::move_list"
 EXECUTE_FLAG_KEY = "teleop::replay_ready"
 MOVE_EXECUTED_KEY = "robot::move_executed"
+PREPARE_MOVES_KEY = "robot::prepare_moves"
 
 
 class AppSessionObject(RuntimeSession):
@@ -36,15 +45,15 @@ class AppSessionObject(RuntimeSession):
 
 
 class SpeechRecognizerApp(Runtime):
-    def __init__(self, root):
+    def __init__(self, root, profiler=None, speculate=False):
         self.root = root
+        self.profiler = profiler or Profiler("speech")
         self.root.title("Speech Recognizer")
 
         self.recording = False
         self.recognizer = None
         self.audio_stream = None
 
-        self.history = []
         self.start_time = None
         self.current_duration = 0
 
@@ -54,9 +63,30 @@ class SpeechRecognizerApp(Runtime):
         self.setup_grid()
 
         self.conversation = Conversation(api_key=OPENAI_API_KEY)
+        self.speculator = None
+        if speculate:
+            speech_cfg = get_config()["speech"]
+            self.speculator = Speculator(
+                self.conversation,
+                settle=speech_cfg["speculation_settle"],
+                min_words=speech_cfg["speculation_min_words"],
+                on_ready=self.prepare_speculation,
+            )
+            # speculations are prepared from a worker thread
+            self.prepare_redis = sync_redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=True)
 
         self.engine = Engine(runtime=self)
 
+        self.tracer = get_tracer("speech")
+        self.trace = None
+
+        self.library = MoveLibrary()
+        # moves requested for definition that save_moves may not have stored yet
+        self.defined_moves = set()
+        self.prefetch_speech()
+        # the window is up and listening before the LLM client is ready
+        start_warmup(self.conversation.warmup, name="speech warmup")
+
     # ---- UI ----
 
     def create_widgets(self):
@@ -66,14 +96,22 @@ class SpeechRecognizerApp(Runtime):
         self.duration_label = ttk.Label(self.root, text="Duration: 0.0 s")
         self.duration_label.grid(row=0, column=1, padx=10, pady=10, sticky="e")
 
-        self.tree = ttk.Treeview(self.root, columns=("Recognized", "Processed", "Start Time", "Stop Time"),
-                                 show="headings")
+        self.tree = ttk.Treeview(self.root, columns=COLUMNS, show="headings")
         self.tree.heading("Recognized", text="Recognized Sentence")
         self.tree.heading("Processed", text="Processed Sentence")
         self.tree.heading("Start Time", text="Start Time")
         self.tree.heading("Stop Time", text="Stop Time")
         self.tree.grid(row=1, column=0, columnspan=3, padx=10, pady=10, sticky="nsew")
 
+        # recognizer callbacks update the model, the view catches up on the Tk thread
+        speech_cfg = get_config()["speech"]
+        self.transcript = TranscriptModel(
+            max_rows=speech_cfg["history_rows"],
+            max_archive_rows=speech_cfg["history_archive_rows"])
+        self.transcript_view = TranscriptView(self.root, self.tree, self.transcript,
+                                              interval=speech_cfg["history_refresh"])
+        self.transcript_view.start()
+
         # Add console text box
         self.console = tk.Text(self.root, wrap=tk.WORD, height=5)
         self.console.grid(row=2, column=0, columnspan=3, padx=10, pady=10, sticky="nsew")
@@ -110,17 +148,24 @@ class SpeechRecognizerApp(Runtime):
 
     # ---- Speech Synthesis ----
     def setup_speech_synthesizer(self):
-        speech_key = AZURE_SPEECH_KEY
-        service_region = AZURE_SPEECH_REGION
-
-        speech_config = speechsdk.SpeechConfig(subscription=speech_key, region=service_region)
-        speech_config.speech_synthesis_voice_name = 'en-US-AvaMultilingualNeural'
-
-        audio_output_config = speechsdk.audio.AudioOutputConfig(use_default_speaker=True)
-        self.synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=audio_output_config)
-
-        self.synthesizer.synthesis_started.connect(self.synthesizing_callback)
-        self.synthesizer.synthesis_completed.connect(self.synthesized_callback)
+        speech_cfg = get_config()["speech"]
+        self.speech_output = SpeechOutput(
+            AzureSynthesizer(AZURE_SPEECH_KEY, AZURE_SPEECH_REGION),
+            SpeakerPlayer(),
+            voice=speech_cfg["voice"],
+            cache=AudioCache(max_bytes=speech_cfg["cache_bytes"], dirname=speech_cfg["cache_dir"]),
+            workers=speech_cfg["workers"],
+            on_play=self.playing_callback,
+        )
+
+    def prefetch_speech(self):
+        phrases = []
+        for phrase in get_config()["speech"]["prefetch"]:
+            if "{move_id}" in phrase:
+                phrases.extend(phrase.format(move_id=move.move_id) for move in self.library.moves())
+            else:
+                phrases.append(phrase)
+        self.speech_output.prefetch(phrases)
 
     def toggle_recording(self):
         if self.recording:
@@ -142,12 +187,12 @@ class SpeechRecognizerApp(Runtime):
         self.recognizer.stop_continuous_recognition()
 
     def clear_history(self):
-        self.history.clear()
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        self.transcript.clear()
 
     def recognizing_callback(self, evt):
         text = evt.result.text
+        if self.speculator is not None:
+            self.speculator.observe(text)
         self.update_history(text, stable=False)
 
     def recognized_callback(self, evt):
@@ -161,11 +206,12 @@ class SpeechRecognizerApp(Runtime):
 
         self.update_history(best_result['Lexical'], word_timings, stable=True)
 
-    def synthesizing_callback(self, evt):
-        self.recognizer.stop_continuous_recognition()
-
-    def synthesized_callback(self, evt):
-        self.recognizer.start_continuous_recognition()
+    def playing_callback(self, playing):
+        # don't recognize our own voice
+        if playing:
+            self.recognizer.stop_continuous_recognition()
+        elif self.recording:
+            self.recognizer.start_continuous_recognition()
 
     def session_stopped_callback(self, evt):
         print("Session stopped")
@@ -185,105 +231,52 @@ class SpeechRecognizerApp(Runtime):
     async def process_stable_sentence(self, sentence, word_timings):
         start_time = word_timings[0][1]
         stop_time = word_timings[-1][2]
-        start_time_str = f"{start_time:.1f} s"
-        stop_time_str = f"{stop_time:.1f} s"
-
-        # Find the last unstable entry
-        unstable_items = [item for item in self.tree.get_children() if "unstable" in self.tree.item(item, "tags")]
-        if unstable_items:
-            item = unstable_items[-1]
-            self.tree.delete(item)
-        else:
-            item = ""
-
-        # Insert the stable entry at the top
-        new_item = self.tree.insert("", "end", values=(sentence, "processing...", start_time_str, stop_time_str),
-                                    tags=("stable",))
-        self.tree.tag_configure("stable", foreground="black")
+        row = self.transcript.add_stable(sentence, f"{start_time:.1f} s", f"{stop_time:.1f} s")
 
         processed_sentence = await self.process(sentence, word_timings)
-        self.tree.item(new_item, values=(sentence, processed_sentence, start_time_str, stop_time_str))
+        self.transcript.set_processed(row, processed_sentence)
 
         # Add a new unstable entry at the bottom for the next sentence
-        self.tree.insert("", "end", values=("", "", "", ""), tags=("unstable",))
-        self.tree.tag_configure("unstable", foreground="grey")
+        self.transcript.set_unstable("")
 
     def update_unstable_entry(self, sentence):
-        unstable_items = [item for item in self.tree.get_children() if "unstable" in self.tree.item(item, "tags")]
-        if unstable_items:
-            last_item = unstable_items[-1]
-            self.tree.item(last_item, values=(sentence, "", "", ""))
-        else:
-            self.tree.insert("", "end", values=(sentence, "", "", ""), tags=("unstable",))
-        self.tree.tag_configure("unstable", foreground="grey")
-
-    def update_last_entry(self, sentence):
-        if self.tree.get_children():
-            last_item = self.tree.get_children()[-1]
-            self.tree.item(last_item, values=(sentence, "", "", ""))
-        else:
-            self.tree.insert("", "end", values=(sentence, "", "", ""), tags=("unstable",))
-        self.tree.tag_configure("unstable", foreground="grey")
+        self.transcript.set_unstable(sentence)
 
     # ---- Parsing ----
+    def prepare_speculation(self, speculation):
+        # the response is likely to be needed in a moment, get its audio and moves ready
+        self.speech_output.prefetch(speculation.speeches)
+        move_ids = [move_id for move_id in speculation.move_ids if move_id in self.library]
+        if move_ids:
+            self.prepare_redis.publish(PREPARE_MOVES_KEY, json.dumps(move_ids))
+
+    def take_speculation(self, sentence):
+        if self.speculator is None:
+            return None
+        speculation = self.speculator.take(sentence)
+        parsed_sentence = self.conversation.commit(speculation.preview) if speculation is not None else None
+        self.profiler.count("speculation hits" if parsed_sentence is not None else "speculation misses")
+        return parsed_sentence
+
     async def process(self, sentence, word_timings):
-        parsed_sentence = await self.conversation.get_gpt_parsed(sentence)
-        processed_sentence = self.add_timings_to_parsed_sentence(sentence, parsed_sentence, word_timings)
-        await self.engine.execute(processed_sentence)
+        # the utterance ends when its last word does
+        self.trace = new_trace(capture_time=self.start_time + word_timings[-1][2])
+        parse_start = time.time()
+        with self.profiler.timer("parse"):
+            parsed_sentence = self.take_speculation(sentence)
+            if parsed_sentence is None:
+                parsed_sentence = await self.conversation.get_gpt_parsed(sentence)
+        self.tracer.span(self.trace, "parse", start=parse_start)
+        with self.profiler.timer("align"):
+            processed_sentence = self.add_timings_to_parsed_sentence(sentence, parsed_sentence, word_timings)
+        with self.profiler.timer("execute"):
+            await self.engine.execute(processed_sentence)
+        self.profiler.count("utterances")
         print(processed_sentence)
         return parsed_sentence
 
     def add_timings_to_parsed_sentence(self, original_sentence, parsed_sentence, word_timings):
-        original_words = original_sentence.split()
-        word_index = 0
-        result = []
-        current_text = ""
-
-        # Function to process accumulated text
-        def process_text(text):
-            nonlocal word_index
-            words = text.split()
-            processed_words = []
-            for word in words:
-                if word_index < len(word_timings):
-                    original_word, start_time, end_time = word_timings[word_index]
-                    if re.sub(r'[^\w\s]', '', word.lower()) == re.sub(r'[^\w\s]', '', original_word.lower()):
-                        processed_words.append(f'<word start="{start_time:.3f}" end="{end_time:.3f}">{word}</word>')
-                        word_index += 1
-                    else:
-                        processed_words.append(word)
-                else:
-                    processed_words.append(word)
-            return ' '.join(processed_words)
-
-        # Iterate through the parsed sentence
-        i = 0
-        while i < len(parsed_sentence):
-            if parsed_sentence[i] == '<':
-                # Process any accumulated text before the tag
-                if current_text:
-                    result.append(process_text(current_text))
-                    current_text = ""
-
-                # Find the end of the tag
-                tag_end = parsed_sentence.find('>', i)
-                if tag_end != -1:
-                    tag = parsed_sentence[i:tag_end + 1]
-                    result.append(tag)
-                    i = tag_end + 1
-                else:
-                    # If no closing '>' is found, append the rest of the string and break
-                    result.append(parsed_sentence[i:])
-                    break
-            else:
-                current_text += parsed_sentence[i]
-                i += 1
-
-        # Process any remaining text
-        if current_text:
-            result.append(process_text(current_text))
-
-        return ''.join(result)
+        return annotate_parsed_sentence(parsed_sentence, word_timings)
 
     # ---- Runtime ----
     async def start_session(self) -> AppSessionObject:
@@ -296,16 +289,24 @@ class SpeechRecognizerApp(Runtime):
     async def define_move(self, session: AppSessionObject, move_id: str, start_time: float, stop_time: float):
         self.log_to_console(f"Defining move {move_id} from {start_time:.1f} s to {stop_time:.1f} s")
         move_data = f"{move_id}:{start_time + self.start_time:.3f}:{stop_time + self.start_time + 5:.3f}"
+        # the window end is padded, so the utterance's capture time is sent too
+        if self.tracer.enabled:
+            move_data += f":{self.trace.trace_id}:{self.trace.capture_time:.6f}"
         await session.redis.rpush(DEFINE_MOVE_KEY, move_data)
+        self.defined_moves.add(move_id)
 
     async def do_move(self, session: AppSessionObject, move_id: str):
+        if move_id not in self.defined_moves and move_id not in self.library:
+            self.log_to_console(f"Unknown move {move_id}")
+            await self.speech(session, f"Sorry. I don't know move {move_id} yet.")
+            return
         self.log_to_console(f"Queueing move {move_id}")
         session.pending_moves.append(move_id)
 
     async def speech(self, session: AppSessionObject, speech: str):
         self.log_to_console(f"Executing speech: {speech}")
-        # Implement text-to-speech functionality here if needed
-        self.synthesizer.speak_text_async(speech).get()
+        with self.profiler.timer("speech"):
+            await self.speech_output.speak(speech)
 
     async def end_session(self, session: AppSessionObject):
         self.log_to_console("Ending session")
@@ -318,6 +319,7 @@ class SpeechRecognizerApp(Runtime):
 
             # Set the execute flag to trigger the robot controller
             await session.redis.set(EXECUTE_FLAG_KEY, "1")
+            execute_start = time.time()
 
             # Wait for the robot to execute all moves
             while True:
@@ -325,6 +327,7 @@ class SpeechRecognizerApp(Runtime):
                 if executed_moves == len(session.pending_moves):
                     break
                 await asyncio.sleep(0.1)
+            self.tracer.span(self.trace, "execute", start=execute_start)
 
 
         self.log_to_console("All moves executed")
@@ -334,6 +337,12 @@ class SpeechRecognizerApp(Runtime):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--speculate", action="store_true",
+                        help="parse partial recognition results before the final one arrives")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
     root = tk.Tk()
-    app = SpeechRecognizerApp(root)
+    app = SpeechRecognizerApp(root, profiler=get_profiler("speech", args), speculate=args.speculate)
     root.mainloop()
@@ -0,0 +1,32 @@
+import argparse
+import os
+
+from instructor.detection.redetect import measure_scaling, redetect, write_history
+from instructor.utils import add_profile_arguments, get_config, get_profiler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("recording", type=str, help="directory written by run_detection.py --record")
+    parser.add_argument("--output", "-o", type=str, default=None)
+    parser.add_argument("--workers", "-w", type=int, default=os.cpu_count())
+    parser.add_argument("--warmup", type=int, default=15)
+    parser.add_argument("--scaling", action="store_true", help="report frames per second for 1..workers")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profiler = get_profiler("redetect", args)
+
+    if args.scaling:
+        worker_counts = sorted({1, args.workers} | {2 ** i for i in range(args.workers.bit_length()) if 2 ** i <= args.workers})
+        results = measure_scaling(args.recording, worker_counts, warmup=args.warmup)
+        base_fps = results[0][1]
+        for workers, fps in results:
+            print(f"workers: {workers: >3}   {fps: 8.1f} frames/s   {fps / base_fps: 5.2f}x")
+
+    output = args.output or os.path.join(get_config()["dirs"]["recordings"], "history_redetected.txt")
+    with profiler.timer("redetect"):
+        rows = redetect(args.recording, workers=args.workers, warmup=args.warmup)
+    with profiler.timer("write"):
+        write_history(output, rows)
+    profiler.count("frames", len(rows))
+    print(f"wrote {len(rows)} frames to {output}")
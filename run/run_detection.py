@@ -1,18 +1,107 @@
 import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
 
 import cv2
 
-from instructor.detection import PoseTracker
+from instructor.detection import CameraWorker, Extrinsics, PoseTracker, PreviewPublisher, RealSenseCamera, ReplayCamera, ReplayClock
+from instructor.utils import add_profile_arguments, get_config, get_keypoint_ring, get_profiler
+
+
+def create_detector():
+    from instructor.detection import MediaPipeDetector
+
+    detector = MediaPipeDetector(**get_config()["detection"])
+    detector.warmup()
+    return detector
+
+
+def create_cameras(args):
+    """
+    One frame source per configured camera, or per replayed recording.
+    """
+    if args.replay is not None:
+        # frames of the recordings are matched by their recorded capture times
+        clock = ReplayClock(realtime=not args.fast)
+        return [ReplayCamera(dirname, clock=clock) for dirname in args.replay]
+    cameras = get_config().get("cameras") or [{}]
+    if len(cameras) == 1:
+        return [RealSenseCamera(record_dir=args.record, serial=cameras[0].get("serial"))]
+    return [
+        RealSenseCamera(
+            record_dir=None if args.record is None else os.path.join(args.record, f"camera{i}"),
+            serial=camera.get("serial"))
+        for i, camera in enumerate(cameras)
+    ]
+
+
+def create_workers(cameras, detectors):
+    configs = get_config().get("cameras") or []
+    workers = []
+    for i, (camera, detector) in enumerate(zip(cameras, detectors)):
+        extrinsics = Extrinsics.from_config(configs[i]) if i < len(configs) else Extrinsics.identity()
+        workers.append(CameraWorker(camera, detector, extrinsics, name=f"camera{i}"))
+    return workers
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--stream_outputs", "-s", action="store_true")
+    parser.add_argument("--record", "-r", type=str, default=None, help="directory to record frames to")
+    parser.add_argument("--replay", "-p", type=str, nargs="+", default=None,
+                        help="directory to replay frames from, one per camera")
+    parser.add_argument("--fast", "-f", action="store_true", help="replay as fast as possible")
+    parser.add_argument("--headless", action="store_true", help="skip visualization, stop with ctrl-c")
+    parser.add_argument("--preview", action="store_true", help="publish frames for run/view_preview.py")
+    add_profile_arguments(parser)
     args = parser.parse_args()
 
-    tracker = PoseTracker(stream_outputs=args.stream_outputs,)
-    while True:
-        if not tracker.process_frame():
-            break
-        elif cv2.waitKey(1) & 0xFF == ord('q'): 
-            break
+    profiler = get_profiler("detection", args)
+
+    num_cameras = len(args.replay) if args.replay is not None else max(len(get_config().get("cameras") or []), 1)
+    if num_cameras > 1 and args.preview:
+        parser.error("--preview needs a single camera")
+
+    # mediapipe loads and the landmarkers run once while the cameras start
+    with ThreadPoolExecutor(num_cameras) as pool:
+        detectors = [pool.submit(create_detector) for _ in range(num_cameras)]
+        cameras = create_cameras(args)
+        detectors = [detector.result() for detector in detectors]
+
+    preview = None
+    if args.preview:
+        preview = PreviewPublisher(**get_config()["preview"])
+
+    keypoint_ring = None
+    if args.stream_outputs and get_config()["keypoint_ring"]["enabled"]:
+        keypoint_ring = get_keypoint_ring(create=True)
+
+    # several cameras run on their own workers and are fused
+    workers = create_workers(cameras, detectors) if num_cameras > 1 else None
+    tracker = PoseTracker(
+        stream_outputs=args.stream_outputs,
+        camera=cameras[0],
+        detector=detectors[0],
+        cameras=workers,
+        keypoint_ring=keypoint_ring,
+        headless=args.headless,
+        preview=preview,
+        stage_timer=profiler.record if profiler.enabled else None,
+    )
+    try:
+        while True:
+            with profiler.timer("frame"):
+                running = tracker.process_frame()
+            if not running:
+                break
+            elif not args.headless and cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        tracker.close()
+        # stops the pipelines and finishes any recording's index
+        for camera in cameras:
+            camera.close()
+        if preview is not None:
+            preview.close()
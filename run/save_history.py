@@ -1,76 +1,135 @@
+import argparse
 import redis
 import time
 import csv
 import os
 from datetime import datetime, timedelta
 import asyncio
-from instructor.utils import get_config, make_redis_client
+from instructor.utils import (
+    TRACE_KEY, Profiler, Trace, add_profile_arguments, format_point, get_config, get_history_writer,
+    get_keypoint_ring, get_profiler, get_tracer, make_redis_client, parse_trace)
 
 
 cfg = get_config()
 redis_client = make_redis_client()
+tracer = get_tracer("history")
+# replaced when run with --profile
+profiler = Profiler("history")
 
 detection_keys = []
 for point in cfg["pose_keypoints"]:
     detection_keys.append(cfg["redis"]["realsense_prefix"] + point)
 
+# carry the frame trace into the history as an extra [trace_id, capture_time] column
+trace_key = cfg["redis"]["realsense_prefix"] + TRACE_KEY
+if tracer.enabled:
+    detection_keys.append(trace_key)
+
 prev = {key: [] for key in detection_keys}
 history = {key: [] for key in detection_keys}
 
-recordings_dir = cfg["dirs"]["recordings"]
-os.makedirs(recordings_dir, exist_ok=True)
-history_file = os.path.join(recordings_dir, "history.txt")
-
-def initialize_output_file():
-    with open(history_file, 'w') as file:
-        header = ['timestamp'] + detection_keys
-        file.write('\t'.join(header) + '\n')
+# rotated into time-based segments, see instructor/utils/history.py
+history_writer = get_history_writer(detection_keys)
 
 def append_to_output_file(history):
     """
-    Append rows of data from the history to the output file.
+    Append rows of data from the history to the current history segment.
     Each row includes a timestamp followed by the values for each key.
     """
-    with open(history_file, 'a') as file:
-        for timestamp in sorted(set(entry['timestamp'] for key in history for entry in history[key])):
-            row = [timestamp.strftime('%Y-%m-%d %H:%M:%S.%f')] + [next((entry['value'] for entry in history[key] if entry['timestamp'] == timestamp), 'None') for key in detection_keys]
-            file.write('\t'.join(row) + '\n')
+    for timestamp in sorted(set(entry['timestamp'] for key in history for entry in history[key])):
+        row = [next((entry['value'] for entry in history[key] if entry['timestamp'] == timestamp), 'None') for key in detection_keys]
+        history_writer.write(timestamp, row)
+        profiler.count("rows")
 
 def read_and_append_keys():
     """
     Continuously read from the specified Redis keys and append their values to the output file.
     Publish each key at a rate of 30 Hz.
     """
-    initialize_output_file()
+    history_writer.start_compaction()
     key_index = 0
     while True:
         current_time = datetime.now()
+        read_start = time.perf_counter()
         for key_index in range(len(detection_keys)):
             key = detection_keys[key_index]
 
             try:
                 value = redis_client.get(key)
+                if value is not None and key == trace_key:
+                    trace, sent_time = parse_trace(value)
+                    value = str([trace.trace_id, trace.capture_time])
+                    if not prev[key] or prev[key][0]["value"] != value:
+                        tracer.span(trace, "history", start=sent_time)
                 if value is not None:
                     if key not in history:
                         history[key] = []
                     history[key] = [{'timestamp': current_time, 'value': value}]
             except redis.ConnectionError as e:
                 print(f"Redis connection error: {e}")
+                history_writer.close()
                 return
             
+        profiler.record("read", time.perf_counter() - read_start)
+
         key_changed = [not prev[key] or prev[key][0]["value"] != history[key][0]["value"] for key in detection_keys]
         if any(key_changed):
-            append_to_output_file(history)
+            with profiler.timer("write"):
+                append_to_output_file(history)
 
         for key in prev: 
             prev[key] = history[key].copy()
         time.sleep(1.0 / 20)  # Maintain a rate of 30 Hz per key
 
+def read_ring_and_append(ring):
+    """
+    Appends every frame the tracker writes to shared memory, timestamped
+    with its capture time, instead of polling Redis.
+    """
+    history_writer.start_compaction()
+    last_index, last_time = -1, 0.0
+    while True:
+        if ring.wait(last_index, timeout=1.0) is None:
+            # a restarted tracker writes to a new segment
+            new_ring = get_keypoint_ring()
+            if new_ring is not None:
+                ring.close()
+                ring, last_index = new_ring, -1
+            continue
+
+        read_start, read_start_time = time.perf_counter(), time.time()
+        frames = list(ring.since(last_index))
+        profiler.record("read", time.perf_counter() - read_start)
+        with profiler.timer("write"):
+            for frame in frames:
+                last_index = frame.index
+                # frames already recorded from a segment attached again
+                if frame.timestamp <= last_time:
+                    continue
+                last_time = frame.timestamp
+                values = [format_point(point) for point in frame.points]
+                if tracer.enabled:
+                    values.append(str([frame.trace_id, frame.timestamp]))
+                    tracer.span(Trace(frame.trace_id, frame.timestamp), "history", start=read_start_time)
+                history_writer.write(datetime.fromtimestamp(frame.timestamp), values)
+                profiler.count("rows")
+
 def test():
     print("History saving function is running.")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profiler = get_profiler("history", args)
+
     test()
+    # with the tracker on this host, every frame is read from shared memory
+    ring = get_keypoint_ring()
+    print("reading keypoints from " + ("shared memory" if ring is not None else "redis"))
     loop = asyncio.get_event_loop()
-    loop.run_in_executor(None, read_and_append_keys)
+    if ring is not None:
+        loop.run_in_executor(None, read_ring_and_append, ring)
+    else:
+        loop.run_in_executor(None, read_and_append_keys)
     loop.run_forever()
\ No newline at end of file
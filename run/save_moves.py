@@ -1,52 +1,139 @@
-import redis
-import time
+import argparse
+import json
+import multiprocessing
 import os
-import csv
-from datetime import datetime, timedelta
-import asyncio
-from instructor.moves.interpolation import interpolate_file
-from instructor.utils import get_config, make_redis_client
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from instructor.moves import MoveLibrary
+from instructor.moves.define import define_move
+from instructor.moves.similarity import SimilarityIndex
+from instructor.moves.spline import warmup as warmup_splines
+from instructor.utils import (
+    Profiler, Trace, add_profile_arguments, get_config, get_profiler, get_tracer, make_redis_client, new_trace)
 
 cfg = get_config()
 redis_client = make_redis_client()
+tracer = get_tracer("define")
+# replaced when run with --profile
+profiler = Profiler("define")
+library = MoveLibrary()
+similarity = SimilarityIndex(library, **cfg["similarity"])
 
 recordings_dir = cfg["dirs"]["recordings"]
-history_file = os.path.join(recordings_dir, "history.txt")
 
 DEFINE_MOVE_KEY = cfg["redis"]["keys"]["define_move"]
+MOVE_READY_KEY = cfg["redis"]["keys"]["move_ready"]
+
+# registration happens on the executor's callback thread
+register_lock = threading.Lock()
+# sequence number of the newest registered definition of each move
+registered = {}
+
+def parse_request(request, received):
+    """
+    Splits "move_id:start:stop[:trace_id:capture_time]". The stop time may
+    be padded past the utterance, so it is never used as a capture time;
+    requests without one are traced from when they were received.
+    """
+    parts = request.split(':')
+    move_id = parts[0]
+    start_time, stop_time = float(parts[1]), float(parts[2])
+    # requests from process_speech carry the trace of the utterance
+    if len(parts) > 4:
+        trace = Trace(int(parts[3]), float(parts[4]))
+    elif len(parts) > 3:
+        trace = Trace(int(parts[3]), received)
+    else:
+        trace = new_trace(capture_time=received)
+    return move_id, start_time, stop_time, trace
+
+def register_move(future, sequence, start_time, stop_time, trace, received):
+    """
+    Moves the files of a finished definition into place, records the move in
+    the library and announces it.
+    """
+    try:
+        defined = future.result()
+    except Exception as e:
+        print(f"defining move failed: {e!r}")
+        return
+    if defined is None:
+        print(f"no history between {start_time:.3f} and {stop_time:.3f}")
+        return
+
+    for stage, seconds in defined.timings.items():
+        profiler.record(stage, seconds)
+
+    move_id = defined.move_id
+    with register_lock, profiler.timer("register"):
+        # a later definition of the same move finished first
+        if registered.get(move_id, -1) > sequence:
+            os.remove(defined.raw_file)
+            os.remove(defined.spline_file)
+            return
+        registered[move_id] = sequence
+
+        raw_file = os.path.join(recordings_dir, move_id + ".txt")
+        spline_file = os.path.join(recordings_dir, move_id + "_spline.npz")
+        os.replace(defined.raw_file, raw_file)
+        os.replace(defined.spline_file, spline_file)
+        print("saved to " + raw_file)
+
+        info = library.add(move_id, spline_file, defined.move, parameters={
+            "start_time": start_time,
+            "stop_time": stop_time,
+            "smoothness": cfg["smoothness"],
+        })
+        redis_client.publish(MOVE_READY_KEY, json.dumps({
+            "move_id": move_id,
+            "version": info.version,
+            "checksum": info.checksum,
+            "duration": info.duration,
+        }))
+        print(f"move {move_id} v{info.version}: {info.duration:.2f} s, {info.samples} samples")
+
+        with profiler.timer("similarity"):
+            duplicates = similarity.duplicates(move_id)
+    for other, distance in duplicates:
+        print(f"move {move_id} looks like move {other} (distance {distance:.3f})")
+
+    tracer.span(trace, "define", start=received)
+    profiler.count("moves")
+
+def process_moves(workers):
+    # scipy and the history reader are loaded once per worker, not per move
+    executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+    # starts every worker and has it import scipy before the first request
+    for _ in range(workers):
+        executor.submit(warmup_splines)
+    sequence = 0
+    try:
+        while True:
+            # blocks until process_speech (or define_move.py) asks for a move
+            _, request = redis_client.blpop(DEFINE_MOVE_KEY)
+            received = time.time()
+            move_id, start_time, stop_time, trace = parse_request(request, received)
+
+            sequence += 1
+            future = executor.submit(
+                define_move, move_id, start_time, stop_time, cfg["smoothness"], recordings_dir, f"tmp{sequence}")
+            future.add_done_callback(
+                lambda future, args=(sequence, start_time, stop_time, trace, received): register_move(future, *args))
+            profiler.count("requests")
+    finally:
+        executor.shutdown(wait=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", "-w", type=int, default=os.cpu_count(),
+                        help="moves defined concurrently")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profiler = get_profiler("define", args)
 
-def extract_coordinates_for_move(start_time, stop_time):
-    coordinates = []
-    with open(history_file, 'r') as file:
-        reader = csv.DictReader(file, delimiter='\t')
-        for row in reader:
-            timestamp = datetime.strptime(row['timestamp'], '%Y-%m-%d %H:%M:%S.%f')
-            if start_time <= timestamp <= stop_time:
-                coordinates.append(row)
-    return coordinates
-
-def save_move_coordinates(move_id, coordinates):
-    output_file = f"recordings/{move_id}.txt"
-    with open(output_file, 'w') as file:
-        writer = csv.DictWriter(file, fieldnames=coordinates[0].keys(), delimiter='\t')
-        writer.writeheader()
-        writer.writerows(coordinates)
-
-def process_moves():
-    move = {}
-    while True:
-        move = redis_client.lpop(DEFINE_MOVE_KEY)
-        if move:
-            parts = move.split(':')
-            move_id = parts[0]
-            start_time = datetime.fromtimestamp(float(parts[1]))
-            stop_time = datetime.fromtimestamp(float(parts[2]))
-            coordinates = extract_coordinates_for_move(start_time, stop_time)
-            if coordinates:
-                save_move_coordinates(move_id, coordinates) # save move txt
-            
-                output_file = os.path.join(recordings_dir, move_id + ".txt")
-                print("saved to " + output_file)
-                interpolate_file(output_file, cfg["smoothness"], frequency=cfg["rate"])
-
-process_moves()
+    try:
+        process_moves(workers=args.workers)
+    except KeyboardInterrupt:
+        pass
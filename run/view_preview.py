@@ -0,0 +1,12 @@
+import argparse
+
+from instructor.detection.preview import view_preview
+from instructor.utils import get_config
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--name", "-n", type=str, default=get_config()["preview"]["name"])
+    args = parser.parse_args()
+
+    view_preview(name=args.name)
@@ -0,0 +1,101 @@
+import argparse
+import time
+
+import numpy as np
+
+from instructor.detection import CameraGroup, CameraWorker, ScriptedDetector, SyntheticCamera
+from instructor.detection.synthetic import Landmark, make_dance_landmarks
+from instructor.utils import get_config
+
+
+HAND_LANDMARKS = (15, 16, 17, 18, 19, 20, 21, 22)
+
+
+class PacedCamera:
+    """
+    Serves a camera's frames no faster than `rate`, like a real sensor,
+    starting `phase` periods late. Unsynchronized cameras are out of phase.
+    """
+
+    def __init__(self, camera, rate, phase=0.0):
+        self.camera = camera
+        self.period = 1 / rate if rate else 0
+        self.phase = phase
+        self.next_time = None
+        self.intrinsics = camera.intrinsics
+        self.depth_scale = camera.depth_scale
+
+    @property
+    def trace(self):
+        return self.camera.trace
+
+    def get_frames(self):
+        now = time.monotonic()
+        if self.next_time is None:
+            self.next_time = now + self.phase * self.period
+        if self.next_time > now:
+            time.sleep(self.next_time - now)
+        self.next_time = max(now, self.next_time) + self.period
+        return self.camera.get_frames()
+
+
+def occluded_landmarks(camera, num_cameras, num_frames, occluded_fraction):
+    """
+    Scripted landmarks where the hands leave this camera's view for a
+    different part of the dance than for every other camera.
+    """
+    frames = make_dance_landmarks(num_frames)
+    span = int(occluded_fraction * num_frames)
+    start = camera * num_frames // num_cameras
+    for i in range(start, start + span):
+        landmarks = frames[i % num_frames]
+        for j in HAND_LANDMARKS:
+            landmarks[j] = Landmark(-0.5, landmarks[j].y, landmarks[j].z, visibility=0.05)
+    return frames
+
+
+def run(num_cameras, num_frames, rate, width, height, occluded_fraction):
+    keys = get_config()["pose_keypoints"]
+    workers = [
+        CameraWorker(
+            PacedCamera(SyntheticCamera(width=width, height=height, seed=i), rate, phase=i / num_cameras),
+            ScriptedDetector(occluded_landmarks(i, num_cameras, 60, occluded_fraction)),
+            streaming_points=keys)
+        for i in range(num_cameras)
+    ]
+    group = CameraGroup(workers, **get_config().get("fusion", {}))
+
+    seen = {key: 0 for key in keys}
+    sizes = []
+    start = time.perf_counter()
+    for _ in range(num_frames):
+        observations = group.next_observations(timeout=5)
+        if observations is None:
+            break
+        sizes.append(len(observations))
+        for key, point in group.fuse(observations).items():
+            seen[key] += point is not None
+    elapsed = time.perf_counter() - start
+    group.close()
+
+    fused = len(sizes)
+    print(f"{num_cameras} camera(s): {fused / elapsed: 6.1f} fused frames/s, "
+          f"{np.mean(sizes): 4.2f} cameras per frame, "
+          + ", ".join(f"{worker.frames / elapsed:.1f}" for worker in workers) + " frames/s per camera")
+    for key in keys:
+        print(f"    {key: <18} {100 * seen[key] / max(fused, 1): 5.1f}% covered")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Fuses synthetic cameras whose views of the hands are occluded at different times.")
+    parser.add_argument("--cameras", "-c", type=int, default=3)
+    parser.add_argument("--frames", "-n", type=int, default=150)
+    parser.add_argument("--rate", type=float, default=30, help="Hz per camera, 0 for as fast as possible")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--occluded", type=float, default=0.3, help="fraction of the time each camera loses the hands")
+    args = parser.parse_args()
+
+    for num_cameras in sorted({1, args.cameras}):
+        run(num_cameras, args.frames, args.rate, args.width, args.height, args.occluded)
@@ -0,0 +1,103 @@
+import argparse
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from instructor.utils import KeypointRing, get_config, make_redis_client
+
+
+NAME = "instructor_keypoints_benchmark"
+
+
+def write_frames(keys, rate, duration):
+    """
+    Writes live frames like the tracker does, into the ring created by the
+    benchmark. Runs in its own interpreter, as the tracker would.
+    """
+    ring = KeypointRing.attach(NAME, keys)
+    rng = np.random.default_rng(0)
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        ring.write(time.time(), 0, {key: rng.normal(size=3) for key in keys})
+        time.sleep(1 / rate)
+    ring.close()
+
+
+def percentiles(samples):
+    p50, p99 = np.percentile(1e6 * np.array(samples), [50, 99])
+    return f"p50 {p50: 8.1f} us   p99 {p99: 8.1f} us"
+
+
+def main(seconds, rate, window, reads):
+    keys = get_config()["pose_keypoints"]
+    capacity = int(seconds * rate)
+    ring = KeypointRing.create(NAME, keys, capacity)
+
+    # a full ring of past frames, like after `seconds` of tracking
+    now = time.time()
+    for i in range(capacity):
+        ring.write(now - (capacity - i) / rate, i, {key: np.zeros(3) for key in keys})
+
+    writer = subprocess.Popen([
+        sys.executable, __file__, "--writer", str(5 + reads / 1000), "--rate", str(rate)])
+    try:
+        ring.wait(capacity - 1, timeout=10)
+
+        latest = []
+        for _ in range(reads):
+            start = time.perf_counter()
+            ring.latest()
+            latest.append(time.perf_counter() - start)
+        print(f"latest            {percentiles(latest)}")
+
+        # time from the write to the reader waking up
+        wakeups = []
+        frame = ring.latest()
+        for _ in range(int(2 * rate)):
+            frame = ring.wait(frame.index, timeout=1.0)
+            wakeups.append(time.time() - frame.timestamp)
+        print(f"wait              {percentiles(wakeups)}")
+
+        cuts = []
+        for _ in range(100):
+            stop = time.time() - 1
+            start = time.perf_counter()
+            timestamps, points = ring.range(stop - window, stop)
+            cuts.append(time.perf_counter() - start)
+        print(f"range {window:.0f} s       {percentiles(cuts)}   {len(timestamps)} frames")
+
+        try:
+            redis_client = make_redis_client()
+            prefix = get_config()["redis"]["realsense_prefix"]
+            redis_client.mset({prefix + key: "[0.1, 0.2, 0.3]" for key in keys})
+            mget = []
+            for _ in range(reads // 10):
+                start = time.perf_counter()
+                values = redis_client.mget([prefix + key for key in keys])
+                [np.array(value.strip("[]").split(","), dtype=np.float64) for value in values]
+                mget.append(time.perf_counter() - start)
+            print(f"redis mget+parse  {percentiles(mget)}")
+        except Exception as e:
+            print(f"redis unavailable: {e!r}")
+    finally:
+        writer.terminate()
+        writer.wait()
+        ring.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Times keypoint reads from the shared-memory ring against Redis.")
+    parser.add_argument("--seconds", type=float, default=600, help="history held by the ring")
+    parser.add_argument("--rate", type=float, default=30, help="Hz")
+    parser.add_argument("--window", type=float, default=5, help="seconds cut out of the ring, like a move")
+    parser.add_argument("--reads", "-n", type=int, default=10000)
+    parser.add_argument("--writer", type=float, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.writer is not None:
+        write_frames(get_config()["pose_keypoints"], args.rate, args.writer)
+    else:
+        main(args.seconds, args.rate, args.window, args.reads)
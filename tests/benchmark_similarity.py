@@ -0,0 +1,88 @@
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from instructor.moves import MoveLibrary
+from instructor.moves.similarity import SimilarityIndex
+from instructor.moves.spline import SplineMove
+from instructor.utils import get_config
+
+
+def make_move(rng, prefix, keypoints, duration, rate):
+    """
+    Hips and shoulders standing still, up to noise, and the other keypoints
+    tracing random Lissajous curves, in camera coordinates.
+    """
+    timestamps = np.linspace(0, duration, int(duration * rate))
+    log = {"timestamp": 1e9 + timestamps}
+    for key in keypoints:
+        if key == "center_hips":
+            center, amplitude = np.array([0.0, -0.2, 2.0]), 0
+        elif key == "center_shoulders":
+            center, amplitude = np.array([0.0, 0.3, 2.0]), 0
+        else:
+            center, amplitude = rng.uniform(-0.5, 0.5, 3) + [0, 0, 2], rng.uniform(0.1, 0.4, 3)
+        frequency, phase = rng.uniform(0.1, 0.6, 3), rng.uniform(0, 2 * np.pi, 3)
+        log[prefix + key] = center + amplitude * np.sin(2 * np.pi * frequency * timestamps[:, None] + phase)
+        # tracking noise, which also keeps the spline fit of still keypoints well posed
+        log[prefix + key] += rng.normal(0, 0.002, log[prefix + key].shape)
+    return log
+
+
+def main(num_moves: int, queries: int, k: int):
+    cfg = get_config()
+    prefix = cfg["redis"]["realsense_prefix"]
+    keypoints = cfg["pose_keypoints"]
+    rng = np.random.default_rng(0)
+
+    with tempfile.TemporaryDirectory() as dirname:
+        library = MoveLibrary(dirname)
+        logs = {}
+        for i in range(num_moves):
+            move_id = str(i)
+            logs[move_id] = make_move(rng, prefix, keypoints, duration=rng.uniform(2, 6), rate=20)
+            filename = os.path.join(dirname, f"{move_id}_spline.npz")
+            move = SplineMove.fit(logs[move_id], smoothness=cfg["smoothness"])
+            move.save(filename)
+            library.add(move_id, filename, move, parameters={})
+
+        index = SimilarityIndex(library, **cfg["similarity"])
+        start = time.perf_counter()
+        index.refresh()
+        print(f"\nbuilt envelopes for {num_moves} moves in {time.perf_counter() - start:.2f} s")
+
+        # a cold index reads the cached envelopes back from disk
+        start = time.perf_counter()
+        SimilarityIndex(library, **cfg["similarity"]).refresh()
+        print(f"reloaded cached envelopes in {time.perf_counter() - start:.2f} s")
+
+        durations, hits = [], 0
+        for move_id in rng.choice(list(logs), size=queries, replace=False):
+            # the same move performed slower and with some tracking noise
+            log = dict(logs[move_id])
+            log["timestamp"] = log["timestamp"] * 1.3
+            for key in keypoints:
+                log[prefix + key] = log[prefix + key] + rng.normal(0, 0.01, log[prefix + key].shape)
+
+            start = time.perf_counter()
+            results = index.query(log, k=k)
+            durations.append(time.perf_counter() - start)
+            hits += results[0][0] == move_id
+
+        durations = 1e3 * np.array(durations)
+        print(f"{queries} queries against {num_moves} moves: "
+              f"p50 {np.percentile(durations, 50):.1f} ms, p99 {np.percentile(durations, 99):.1f} ms, "
+              f"{hits}/{queries} found the original move")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--moves", "-n", type=int, default=2000)
+    parser.add_argument("--queries", "-q", type=int, default=50)
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+
+    main(num_moves=args.moves, queries=args.queries, k=args.k)
@@ -0,0 +1,94 @@
+import argparse
+import asyncio
+
+from instructor.speech.engine import Engine
+from instructor.speech.prompt import Conversation
+from instructor.speech.replay import (
+    HeadlessRuntime,
+    LatencyRecorder,
+    LocalRedis,
+    StubCompletionServer,
+    simulate_robot,
+    load_corpus,
+    replay,
+)
+from instructor.speech.speculation import Speculator
+from instructor.speech.tts import LocalSynthesizer, NullPlayer, SpeechOutput
+from instructor.utils import get_config
+
+
+async def run(corpus, endpoint, repeats, move_duration, speech_output=None, tail=None):
+    client = LocalRedis()
+    recorder = LatencyRecorder()
+    runtime = HeadlessRuntime(client, recorder, speech_output=speech_output)
+    robot = asyncio.create_task(simulate_robot(client, move_duration))
+
+    speech_cfg = get_config()["speech"]
+    speculators = []
+    for _ in range(repeats):
+        conversation = Conversation(api_key="stub", azure_endpoint=endpoint)
+        speculator = None
+        if tail is not None:
+            speculator = Speculator(
+                conversation,
+                settle=speech_cfg["speculation_settle"],
+                min_words=speech_cfg["speculation_min_words"],
+            )
+            speculators.append(speculator)
+        await replay(corpus, conversation, runtime, recorder, engine=Engine(runtime=runtime),
+                     speculator=speculator, tail=tail)
+
+    if speculators:
+        print(f"speculation: {sum(s.started for s in speculators)} started, "
+              f"{sum(s.committed for s in speculators)} committed, "
+              f"{sum(s.discarded for s in speculators)} discarded")
+
+    robot.cancel()
+    return recorder
+
+
+def main(filename: str, repeats: int, latency: float, move_duration: float, tts_latency: float = None,
+         tail: float = None):
+    corpus = load_corpus(filename)
+    server = StubCompletionServer(
+        responses={u["text"]: u["response"] for u in corpus},
+        latency=latency,
+    ).start()
+
+    # the local synthesizer stands in for Azure, audio is synthesized but not played
+    speech_output = None
+    if tts_latency is not None:
+        speech_output = SpeechOutput(LocalSynthesizer(latency=tts_latency), NullPlayer(), voice="local")
+
+    try:
+        recorder = asyncio.run(run(corpus, server.endpoint, repeats, move_duration, speech_output, tail))
+    finally:
+        server.stop()
+
+    print(f"\nreplayed {len(corpus)} utterances x {repeats}")
+    recorder.print_summary()
+    if speech_output is not None:
+        print(f"speech cache: {speech_output.hits} hits, {speech_output.misses} misses, "
+              f"{speech_output.synthesizer.calls} syntheses")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("filename", type=str, nargs="?", default="tests/speech_corpus.jsonl")
+    parser.add_argument("--repeats", "-n", type=int, default=20)
+    parser.add_argument("--latency", "-l", type=float, default=0.0)
+    parser.add_argument("--move_duration", "-d", type=float, default=0.0)
+    parser.add_argument("--tts_latency", type=float, default=None,
+                        help="also synthesize responses with a local synthesizer taking this long")
+    parser.add_argument("--speculate", type=float, default=None, metavar="TAIL",
+                        help="parse partial results speculatively, the final result arriving TAIL s after the last word")
+    args = parser.parse_args()
+
+    main(
+        filename=args.filename,
+        repeats=args.repeats,
+        latency=args.latency,
+        move_duration=args.move_duration,
+        tts_latency=args.tts_latency,
+        tail=args.speculate,
+    )
@@ -0,0 +1,105 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# module under run/, and the warmup its process does before its first useful work
+ENTRY_POINTS = {
+    "execute_moves": "from instructor.moves.spline import warmup; warmup()",
+    "save_moves": "from instructor.moves.spline import warmup; warmup()",
+    "save_history": None,
+    "mirror": None,
+    "run_detection": "run_detection.create_detector()",
+    "process_speech": "process_speech.Conversation('stub').warmup()",
+    "view_preview": None,
+}
+
+SNIPPET = """
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {run_dir!r})
+import {module}
+imported = time.perf_counter()
+{warmup}
+print(json.dumps({{"import": imported - start, "warmup": time.perf_counter() - imported}}))
+"""
+
+
+def measure(module, warmup, cwd, env):
+    code = SNIPPET.format(run_dir=os.path.join(ROOT, "run"), module=module, warmup=warmup or "pass")
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines()
+        return None, lines[-1] if lines else f"exit code {result.returncode}"
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["process"] = wall
+    return timings, None
+
+
+def slowest_imports(module, cwd, env, n=5):
+    code = f"import sys; sys.path.insert(0, {os.path.join(ROOT, 'run')!r}); import {module}"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=cwd, env=env,
+                            capture_output=True, text=True)
+    top_level = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # direct imports of the script, not their dependencies
+        if cumulative.strip().isdigit() and not name.startswith("   "):
+            top_level.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(top_level, reverse=True)[:n]
+
+
+def main(entry_points, repeats, imports):
+    # run in a scratch directory, the entry points create their recordings on import
+    cwd = tempfile.mkdtemp()
+    shutil.copy(os.path.join(ROOT, "config.yml"), cwd)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+
+    try:
+        print(f"{'entry point': <16} {'import': >10} {'warmup': >10} {'ready': >10} {'process': >10}")
+        for name in entry_points:
+            samples, error = [], None
+            for _ in range(repeats):
+                timings, error = measure(name, ENTRY_POINTS[name], cwd, env)
+                if timings is None:
+                    break
+                samples.append(timings)
+            if not samples:
+                print(f"{name: <16} unavailable: {error}")
+                continue
+
+            median = {key: np.median([s[key] for s in samples]) for key in samples[0]}
+            print(f"{name: <16} {1e3 * median['import']: 8.0f} ms {1e3 * median['warmup']: 8.0f} ms"
+                  f" {1e3 * (median['import'] + median['warmup']): 8.0f} ms {1e3 * median['process']: 8.0f} ms")
+            if imports:
+                for seconds, module in slowest_imports(name, cwd, env):
+                    print(f"    {module: <40} {1e3 * seconds: 8.1f} ms")
+    finally:
+        shutil.rmtree(cwd)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Times each entry point from a cold interpreter to the end of its warmup.")
+    parser.add_argument("entry_points", nargs="*", help=f"any of {', '.join(ENTRY_POINTS)}, all by default")
+    parser.add_argument("--repeats", "-n", type=int, default=5)
+    parser.add_argument("--imports", action="store_true", help="also list the slowest imports of each entry point")
+    args = parser.parse_args()
+    unknown = set(args.entry_points) - set(ENTRY_POINTS)
+    if unknown:
+        parser.error(f"unknown entry points: {', '.join(sorted(unknown))}")
+
+    main(args.entry_points or list(ENTRY_POINTS), args.repeats, args.imports)
@@ -0,0 +1,110 @@
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tracemalloc
+from collections import defaultdict
+
+import numpy as np
+
+from instructor.detection import PoseTracker, ScriptedDetector, SyntheticCamera
+
+
+RESOLUTIONS = [(640, 480), (1280, 720)]
+STAGES = ["capture", "filtering", "detection", "depth_sampling", "smoothing", "publishing", "drawing"]
+
+
+class NullRedis:
+    def set(self, key, value):
+        pass
+
+
+def benchmark(width, height, num_frames, warmup=10):
+    samples = defaultdict(list)
+    tracker = PoseTracker(
+        stream_outputs=True,
+        camera=SyntheticCamera(width=width, height=height),
+        detector=ScriptedDetector(),
+        redis_client=NullRedis(),
+        display=False,
+        stage_timer=lambda stage, seconds: samples[stage].append(seconds),
+    )
+
+    # keep the tracker's status lines out of the report
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(warmup):
+            tracker.process_frame()
+        samples.clear()
+        for _ in range(num_frames):
+            tracker.process_frame()
+        timings = {stage: round(1e3 * float(np.median(samples[stage])), 4) for stage in STAGES}
+
+        # traced separately, tracemalloc slows every allocation down
+        tracemalloc.start()
+        peaks = []
+        for _ in range(num_frames):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            tracker.process_frame()
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+        tracemalloc.stop()
+
+    return timings, max(peaks)
+
+
+def main(baseline_file, num_frames, tolerance, update):
+    results = {}
+    regressions = []
+    for width, height in RESOLUTIONS:
+        resolution = f"{width}x{height}"
+        results[resolution], peak = benchmark(width, height, num_frames)
+        # buffers are sized on the first frames and must be reused after
+        # that, so no frame should allocate even the smallest image, the
+        # 8-bit depth map
+        image_bytes = (width // 2) * (height // 2)
+        if peak >= image_bytes:
+            print(f"{resolution}: a frame allocated {peak} bytes after warmup")
+            regressions.append(f"{resolution} allocations")
+
+    baseline = {}
+    if os.path.exists(baseline_file):
+        with open(baseline_file, "r") as f:
+            baseline = json.load(f)
+
+    for resolution, stages in results.items():
+        print(f"\n{resolution}")
+        for stage, median_ms in stages.items():
+            reference = baseline.get(resolution, {}).get(stage)
+            line = f"  {stage: <15} {median_ms: 9.3f} ms"
+            if reference is not None:
+                line += f"   baseline {reference: 9.3f} ms   {median_ms / reference: 5.2f}x"
+                # ignore sub-0.1 ms stages, where timer noise dominates
+                if median_ms > reference * (1 + tolerance) and median_ms - reference > 0.1:
+                    regressions.append(f"{resolution} {stage}")
+                    line += "   REGRESSION"
+            print(line)
+
+    if update:
+        with open(baseline_file, "w") as f:
+            json.dump(results, f, indent=2)
+        print("\nwrote baseline to " + baseline_file)
+    elif regressions:
+        print("\nregressed: " + ", ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--baseline", "-b", type=str, default="tests/benchmark_tracker_baseline.json")
+    parser.add_argument("--frames", "-n", type=int, default=100)
+    parser.add_argument("--tolerance", "-t", type=float, default=0.5)
+    parser.add_argument("--update", "-u", action="store_true")
+    args = parser.parse_args()
+
+    main(
+        baseline_file=args.baseline,
+        num_frames=args.frames,
+        tolerance=args.tolerance,
+        update=args.update,
+    )
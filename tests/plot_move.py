@@ -4,12 +4,16 @@ import matplotlib.pyplot as plt
 import numpy as np
 from mpl_toolkits.mplot3d import Axes3D
 
+from instructor.moves.spline import SplineMove
 from instructor.utils import get_config, read_log_array
 
 
 def main(filename: str, key: str):
     cfg = get_config()
-    log = read_log_array(filename)
+    if filename.endswith(".npz"):
+        log = SplineMove.load(filename).sample(rate=cfg["rate"])
+    else:
+        log = read_log_array(filename)
     points = log[cfg["redis"]["realsense_prefix"] + key].T
 
     timestamps = np.array(log["timestamp"])
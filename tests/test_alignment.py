@@ -0,0 +1,44 @@
+import re
+
+from instructor.speech.alignment import TimingAnnotator, annotate_parsed_sentence
+
+
+def timings(sentence, start=0.0, step=0.5):
+    return [(word, start + i * step, start + i * step + 0.4) for i, word in enumerate(sentence.split())]
+
+
+def aligned(annotated):
+    return {word: float(start) for start, word in re.findall(r'<word start="([\d.]+)" end="[\d.]+">([^<]+)</word>', annotated)}
+
+
+def test_inserted_word_found_later():
+    # "then" is inserted by the LLM and also appears later in the transcript;
+    # it must not pull the alignment past the words before it
+    word_timings = timings("raise your arms up then this is move one")
+    annotated = annotate_parsed_sentence("then raise your arms up then this is move one", word_timings)
+    words = aligned(annotated)
+    assert [words[w] for w in ("raise", "your", "arms", "up")] == [0.0, 0.5, 1.0, 1.5], annotated
+    assert words["then"] == 2.0 and words["one"] == 4.0, annotated
+    assert annotated.startswith("then <word"), annotated
+
+
+def test_merged_number():
+    word_timings = timings("this is move twenty one")
+    words = aligned(annotate_parsed_sentence("this is move 21", word_timings))
+    assert words["21"] == 1.5
+
+
+def test_streamed_chunks_match_whole():
+    word_timings = timings("okay raise your arms up then lower them this is move one")
+    text = 'Sure! <move id="1">raise your arms, up then lower them</move> okay'
+    annotator = TimingAnnotator(word_timings)
+    streamed = "".join(annotator.feed(text[i:i + 3]) for i in range(0, len(text), 3)) + annotator.finish()
+    assert streamed == annotate_parsed_sentence(text, word_timings)
+    assert re.sub(r"</?word[^>]*>", "", streamed) == text
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(name + " ok")
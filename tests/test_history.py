@@ -0,0 +1,99 @@
+import gzip
+import os
+from datetime import datetime, timedelta
+
+from instructor.utils.history import HistoryReader, HistoryWriter, TIME_FORMAT, read_manifest
+
+
+KEYS = ["realsense::left_hand", "realsense::right_hand"]
+START = datetime(2024, 1, 1, 12, 0, 0)
+RATE = 20
+
+
+def write_history(dirname, seconds, close=True, **kwargs):
+    writer = HistoryWriter(str(dirname), KEYS, segment_duration=10, **kwargs)
+    times = [START + timedelta(seconds=i / RATE) for i in range(int(seconds * RATE))]
+    for i, timestamp in enumerate(times):
+        writer.write(timestamp, [f"[{i}, 0, 0]", "None"])
+    if close:
+        writer.close()
+    return writer, times
+
+
+def read_all(dirname):
+    return HistoryReader(str(dirname)).read(START - timedelta(days=1), START + timedelta(days=1))
+
+
+def test_segments_rotate_and_readers_see_every_row(tmp_path):
+    writer, times = write_history(tmp_path, 35, close=False)
+
+    segments = read_manifest(str(tmp_path))
+    assert len(segments) == 4
+    assert [segment["start"] for segment in segments] == [(START + timedelta(seconds=10 * i)).timestamp() for i in range(4)]
+    assert [segment["end"] is None for segment in segments] == [False, False, False, True]
+    assert all(segment["tier"] == "raw" for segment in segments)
+
+    # the open segment is read too
+    rows = read_all(tmp_path)
+    assert [row["timestamp"] for row in rows] == [t.strftime(TIME_FORMAT) for t in times]
+    assert rows[-1]["realsense::left_hand"] == f"[{len(times) - 1}, 0, 0]"
+
+    # a window across a segment boundary
+    window = HistoryReader(str(tmp_path)).read(START + timedelta(seconds=9.5), START + timedelta(seconds=10.5))
+    assert len(window) == RATE + 1
+
+    writer.close()
+    assert read_manifest(str(tmp_path))[-1]["end"] == times[-1].timestamp()
+    assert len(read_all(tmp_path)) == len(times)
+
+
+def test_reopened_writer_closes_the_open_segment(tmp_path):
+    _, times = write_history(tmp_path, 15, close=False)
+    writer = HistoryWriter(str(tmp_path), KEYS, segment_duration=10)
+    assert writer.segments[-1]["end"] == times[-1].timestamp()
+
+
+def test_compaction_downsamples_old_segments(tmp_path):
+    writer, times = write_history(tmp_path, 35, compact_after=100, compact_rate=5, retention=10000)
+    # the first two segments ended more than compact_after seconds ago
+    writer.compact(now=(START + timedelta(seconds=20)).timestamp() + 100)
+
+    segments = read_manifest(str(tmp_path))
+    assert [segment["tier"] for segment in segments] == ["compact", "compact", "raw", "raw"]
+    assert sorted(os.listdir(tmp_path)) == sorted([segment["file"] for segment in segments] + ["manifest.json"])
+    with gzip.open(os.path.join(tmp_path, segments[0]["file"]), "rt") as f:
+        assert f.readline().rstrip("\n").split("\t") == ["timestamp"] + KEYS
+
+    rows = read_all(tmp_path)
+    expected = [t for t in times[:20 * RATE] if (t - START).total_seconds() * 5 % 1 == 0] + times[20 * RATE:]
+    assert [row["timestamp"] for row in rows] == [t.strftime(TIME_FORMAT) for t in expected]
+    assert rows[1]["realsense::left_hand"] == "[4, 0, 0]"
+
+    # compacted segments are left alone afterwards
+    writer.compact(now=(START + timedelta(seconds=20)).timestamp() + 100)
+    assert read_all(tmp_path) == rows
+
+
+def test_retention_deletes_old_segments(tmp_path):
+    writer, times = write_history(tmp_path, 35, compact_after=100, compact_rate=5, retention=1000)
+    writer.compact(now=(START + timedelta(seconds=10)).timestamp() + 1000)
+
+    segments = read_manifest(str(tmp_path))
+    assert len(segments) == 3
+    assert segments[0]["start"] == (START + timedelta(seconds=10)).timestamp()
+    assert len(os.listdir(tmp_path)) == 4
+
+    rows = read_all(tmp_path)
+    assert rows[0]["timestamp"] == (START + timedelta(seconds=10)).strftime(TIME_FORMAT)
+    assert HistoryReader(str(tmp_path)).read(START, START + timedelta(seconds=9)) == []
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            with tempfile.TemporaryDirectory() as dirname:
+                test(Path(dirname))
+            print(name + " ok")
@@ -1,6 +1,88 @@
 import argparse
+import os
 
-from instructor.moves.interpolation import interpolate_file
+import numpy as np
+
+from instructor.moves.interpolation import interpolate_between_moves, interpolate_file
+from instructor.moves.library import MoveLibrary
+from instructor.moves.spline import SplineMove
+from instructor.utils import read_log_array, write_log_array
+
+
+HAND = "realsense::right_hand"
+HIPS = "realsense::center_hips"
+
+
+def make_log(keys, phase_end=np.pi, num_frames=40, closed=False):
+    phase = np.linspace(0, phase_end, num_frames)
+    log = {"timestamp": 1000.0 + np.arange(num_frames) / 20}
+    for i, key in enumerate(keys):
+        z = np.sin(2 * phase) if closed else phase
+        log[key] = np.stack([np.cos(phase) + i, np.sin(phase), z], axis=1)
+    return log
+
+
+def make_library(dirname, logs):
+    library = MoveLibrary(dirname)
+    for move_id, log in logs.items():
+        move = SplineMove.fit(log, smoothness=0)
+        filename = os.path.join(dirname, f"{move_id}.npz")
+        move.save(filename)
+        library.add(move_id, filename, move, {})
+    return library
+
+
+def test_transition_joins_the_moves(tmp_path):
+    library = make_library(str(tmp_path), {"1": make_log([HAND, HIPS]), "2": make_log([HAND, HIPS], phase_end=2)})
+    transition = interpolate_between_moves("1", "2", library=library, num_points=10)
+
+    assert list(transition) == ["timestamp", HAND, HIPS]
+    assert transition["timestamp"].shape == (10,)
+    for key in (HAND, HIPS):
+        assert transition[key].shape == (10, 3)
+        np.testing.assert_allclose(transition[key][0], library.load("1").evaluate([library.load("1").end])[key][0])
+        np.testing.assert_allclose(transition[key][-1], library.load("2").evaluate([library.load("2").start])[key][0])
+    library.close()
+
+
+def test_identical_moves(tmp_path):
+    # a move that ends where it starts needs no motion to repeat
+    library = make_library(str(tmp_path), {"loop": make_log([HAND], phase_end=2 * np.pi, closed=True), "arc": make_log([HAND])})
+    transition = interpolate_between_moves("loop", "loop", library=library, num_points=10)
+    np.testing.assert_allclose(transition[HAND], np.repeat(transition[HAND][:1], 10, axis=0), atol=1e-9)
+
+    # repeating a move goes back from its last pose to its first
+    transition = interpolate_between_moves("arc", "arc", library=library, num_points=10)
+    np.testing.assert_allclose(transition[HAND][0], [-1, 0, np.pi], atol=1e-9)
+    np.testing.assert_allclose(transition[HAND][-1], [1, 0, 0], atol=1e-9)
+    library.close()
+
+
+def test_moves_without_shared_keypoints(tmp_path):
+    library = make_library(str(tmp_path), {"hand": make_log([HAND]), "hips": make_log([HIPS]), "both": make_log([HAND, HIPS])})
+    transition = interpolate_between_moves("hand", "hips", library=library)
+    assert list(transition) == ["timestamp"] and len(transition["timestamp"]) == 0
+
+    # only the keypoints both moves have
+    assert list(interpolate_between_moves("both", "hand", library=library)) == ["timestamp", HAND]
+    library.close()
+
+
+def test_recorded_moves_give_the_same_transition(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("recordings")
+    logs = {"1": make_log([HAND]), "2": make_log([HAND], phase_end=2)}
+    for move_id, log in logs.items():
+        write_log_array(f"recordings/{move_id}_interpolated.txt", log)
+    library = make_library(str(tmp_path / "library"), logs)
+
+    from_files = interpolate_between_moves("1", "2")
+    from_library = interpolate_between_moves("1", "2", library=library)
+    assert list(from_files) == list(from_library)
+    np.testing.assert_allclose(from_files[HAND], from_library[HAND], atol=1e-5)
+    written = read_log_array("recordings/1_to_2.txt")
+    np.testing.assert_allclose(written[HAND], from_files[HAND], atol=1e-5)
+    library.close()
 
 
 if __name__ == "__main__":
@@ -9,4 +91,4 @@ if __name__ == "__main__":
     parser.add_argument("--smoothness", "-s", type=float, default=0.2)
     args = parser.parse_args()
 
-    interpolate_file(filename=args.filename, smoothness=args.smoothness)
\ No newline at end of file
+    interpolate_file(filename=args.filename, smoothness=args.smoothness)
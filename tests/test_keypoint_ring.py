@@ -0,0 +1,93 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from instructor.utils import KeypointRing
+
+
+KEYS = ["left_hand", "right_hand"]
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TRACKER = """
+import sys
+from instructor.utils import KeypointRing
+ring = KeypointRing.create(sys.argv[1], ["left_hand", "right_hand"], 10)
+ring.write(1.0, 7, {"left_hand": [1.0, 2.0, 3.0]})
+print("ready", flush=True)
+sys.stdin.read()
+ring.close()
+"""
+
+SECOND_TRACKER = """
+import sys
+from instructor.utils import KeypointRing
+try:
+    KeypointRing.create(sys.argv[1], ["left_hand", "right_hand"], 10)
+except FileExistsError as e:
+    print(e)
+    sys.exit(3)
+"""
+
+KILLED_TRACKER = """
+import os, sys
+from multiprocessing import resource_tracker
+from instructor.utils import KeypointRing
+ring = KeypointRing.create(sys.argv[1], ["left_hand", "right_hand"], 10)
+# exits without cleanup, like a tracker that was killed
+resource_tracker.unregister(ring.ring.shm._name, "shared_memory")
+os._exit(1)
+"""
+
+
+def run_python(code, name, **kwargs):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    return subprocess.Popen([sys.executable, "-c", code, name], cwd=ROOT, env=env, text=True, **kwargs)
+
+
+def ring_name(test):
+    return f"instructor_test_{test}_{os.getpid()}"
+
+
+def test_running_tracker_keeps_its_ring():
+    name = ring_name("running")
+    tracker = run_python(TRACKER, name, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    try:
+        assert tracker.stdout.readline().strip() == "ready"
+
+        second = run_python(SECOND_TRACKER, name, stdout=subprocess.PIPE)
+        output, _ = second.communicate(timeout=30)
+        assert second.returncode == 3, output
+        assert f"process {tracker.pid}" in output
+
+        # the second process has exited, and with it its resource tracker
+        ring = KeypointRing.attach(name, KEYS)
+        frame = ring.latest()
+        ring.close()
+        assert frame.trace_id == 7
+        np.testing.assert_array_equal(frame.points[0], [1.0, 2.0, 3.0])
+    finally:
+        tracker.communicate("", timeout=30)
+    with pytest.raises(FileNotFoundError):
+        KeypointRing.attach(name, KEYS)
+
+
+def test_ring_of_exited_tracker_is_replaced():
+    name = ring_name("exited")
+    assert run_python(KILLED_TRACKER, name).wait(timeout=30) == 1
+
+    ring = KeypointRing.create(name, KEYS, 10)
+    assert ring.ring.pid == os.getpid()
+    assert ring.latest() is None
+    ring.close()
+    with pytest.raises(FileNotFoundError):
+        KeypointRing.attach(name, KEYS)
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(name + " ok")
@@ -0,0 +1,102 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from instructor.moves.library import MoveLibrary, file_checksum
+from instructor.moves.spline import SplineMove
+from instructor.utils import write_log_array
+
+
+HAND = "realsense::left_hand"
+
+
+def make_move(scale=1.0, num_frames=40):
+    timestamps = 1000.0 + np.arange(num_frames) / 20
+    phase = np.linspace(0, np.pi, num_frames)
+    return SplineMove.fit({
+        "timestamp": timestamps,
+        HAND: scale * np.stack([np.cos(phase), np.sin(phase), phase], axis=1),
+    }, smoothness=0)
+
+
+def save(library, move_id, move):
+    filename = os.path.join(library.dirname, f"{move_id}_{time.time_ns()}.npz")
+    move.save(filename)
+    return library.add(move_id, filename, move, {"smoothness": 0})
+
+
+def test_catalog_round_trip(tmp_path):
+    library = MoveLibrary(str(tmp_path))
+    move = make_move()
+    info = save(library, "1", move)
+    assert info.version == 1
+    assert info.keypoints == [HAND]
+    assert info.samples == 40 and info.duration == pytest.approx(move.duration)
+    assert info.checksum == file_checksum(info.filename)
+    low, high = np.array(info.bounding_box[HAND])
+    sampled = move.resample(40)[HAND]
+    np.testing.assert_allclose(low, sampled.min(axis=0))
+    np.testing.assert_allclose(high, sampled.max(axis=0))
+
+    # another process opening the catalog reads the same metadata and move
+    other = MoveLibrary(str(tmp_path))
+    assert other.get("1") == info
+    assert "1" in other and 1 in other and "2" not in other
+    assert other.get("2") is None
+    loaded = other.load("1")
+    np.testing.assert_array_equal(loaded.sample(30)[HAND], move.sample(30)[HAND])
+    # loaded once per version
+    assert other.load("1") is loaded
+    with pytest.raises(KeyError):
+        other.load("2")
+
+    library.close()
+    other.close()
+
+
+def test_redefined_move_is_reloaded(tmp_path):
+    library = MoveLibrary(str(tmp_path))
+    other = MoveLibrary(str(tmp_path))
+    save(library, "1", make_move())
+    first = other.load("1")
+    revision = other.revision()
+
+    info = save(library, "1", make_move(scale=2.0))
+    assert info.version == 2
+    assert other.revision() != revision
+    reloaded = other.load("1")
+    assert reloaded is not first
+    np.testing.assert_allclose(reloaded.sample(30)[HAND], 2 * first.sample(30)[HAND])
+
+    save(library, "2", make_move())
+    assert [info.move_id for info in other.moves()] == ["1", "2"]
+    assert other.get("1").version == 2
+
+    library.close()
+    other.close()
+
+
+def test_dense_move_files_are_fitted(tmp_path):
+    library = MoveLibrary(str(tmp_path))
+    move = make_move()
+    filename = str(tmp_path / "old_move.txt")
+    log = move.sample(20)
+    write_log_array(filename, log)
+    library.add("old", filename, move, {})
+
+    loaded = MoveLibrary(str(tmp_path)).load("old")
+    np.testing.assert_allclose(loaded.evaluate(log["timestamp"])[HAND], log[HAND], atol=1e-6)
+    library.close()
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            with tempfile.TemporaryDirectory() as dirname:
+                test(Path(dirname))
+            print(name + " ok")
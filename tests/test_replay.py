@@ -0,0 +1,84 @@
+import threading
+import time
+
+import numpy as np
+
+from instructor.detection import CameraGroup, CameraWorker, FrameRecorder, ReplayCamera, ReplayClock, ScriptedDetector
+
+
+RATE = 30
+
+
+def record(dirname, start, num_frames, chunk_frames=4):
+    recorder = FrameRecorder(str(dirname), chunk_frames=chunk_frames)
+    for i in range(num_frames):
+        recorder.write(start + i / RATE, np.full((6, 8), i, np.uint16), np.zeros((12, 16, 3), np.uint8))
+    recorder.close()
+    return [start + i / RATE for i in range(num_frames)]
+
+
+def serve(camera, served, delay):
+    while camera.get_frames() is not None:
+        served.append(camera.trace.capture_time)
+        time.sleep(delay)
+
+
+def test_replay_stamps_recorded_times(tmp_path):
+    recorded = record(tmp_path / "a", 1000.0, 10)
+    camera = ReplayCamera(str(tmp_path / "a"), realtime=False)
+    served = []
+    serve(camera, served, 0)
+    offset = served[0] - recorded[0]
+    np.testing.assert_allclose(np.array(served) - offset, recorded)
+
+
+def test_fast_replay_serves_cameras_in_recorded_order(tmp_path):
+    # the second camera started 10 ms later and is read ten times slower
+    recorded = {"a": record(tmp_path / "a", 1000.0, 12), "b": record(tmp_path / "b", 1000.01, 12)}
+    clock = ReplayClock(realtime=False)
+    cameras = {name: ReplayCamera(str(tmp_path / name), clock=clock) for name in recorded}
+    served = {name: [] for name in recorded}
+    threads = [
+        threading.Thread(target=serve, args=(cameras[name], served[name], delay))
+        for name, delay in (("a", 0.001), ("b", 0.01))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # one clock for both cameras, shifted by the same amount
+    offset = served["a"][0] - recorded["a"][0]
+    for name in recorded:
+        np.testing.assert_allclose(np.array(served[name]) - offset, recorded[name])
+    assert abs(served["a"][0] - time.time()) < 10
+
+
+def test_fast_replay_fuses_frames_recorded_together(tmp_path):
+    recorded = {"a": record(tmp_path / "a", 1000.0, 30), "b": record(tmp_path / "b", 1000.005, 30)}
+    clock = ReplayClock(realtime=False)
+    workers = [
+        CameraWorker(ReplayCamera(str(tmp_path / name), clock=clock), ScriptedDetector(), name=name)
+        for name in recorded
+    ]
+    group = CameraGroup(workers, tolerance=0.01)
+    matched = []
+    while (observations := group.next_observations(timeout=5)) is not None:
+        matched.append(observations)
+    group.close()
+
+    pairs = [observations for observations in matched if len(observations) == 2]
+    assert len(pairs) >= 25
+    for a, b in pairs:
+        assert abs(a.timestamp - b.timestamp) < 0.01
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            with tempfile.TemporaryDirectory() as dirname:
+                test(Path(dirname))
+            print(name + " ok")
@@ -0,0 +1,89 @@
+import threading
+from types import SimpleNamespace
+
+from instructor.speech.prompt import Preview
+from instructor.speech.speculation import Speculator
+
+
+class FakeConversation:
+    def __init__(self, fail=()):
+        self.fail = fail
+        self.parsed = []
+
+    async def preview(self, text):
+        self.parsed.append(text)
+        if text in self.fail:
+            raise RuntimeError("no response")
+        content = f'move({len(self.parsed)})\nsay(speech="{text}")'
+        return Preview(0, {"role": "user", "content": text}, SimpleNamespace(content=content))
+
+
+def test_discarded_then_accepted():
+    conversation = FakeConversation()
+    speculator = Speculator(conversation, settle=10)
+    # a repeated hypothesis is stable right away
+    speculator.observe("raise your")
+    speculator.observe("raise your")
+    assert (speculator.started, speculator.discarded) == (1, 0)
+
+    # the newer hypothesis replaces it
+    speculator.observe("Raise your arm")
+    speculator.observe("raise your arm")
+    assert (speculator.started, speculator.discarded) == (2, 1)
+
+    speculation = speculator.take("Raise your arm.")
+    assert speculation.words == ("raise", "your", "arm")
+    assert speculation.move_ids == ["2"]
+    assert speculation.speeches == ["raise your arm"]
+    assert (speculator.started, speculator.committed, speculator.discarded) == (2, 1, 1)
+    assert conversation.parsed == ["raise your", "raise your arm"]
+    speculator.close()
+
+
+def test_unused_and_failed_speculations_are_discarded():
+    speculator = Speculator(FakeConversation(fail=("wave both hands",)), settle=10)
+    speculator.observe("turn around")
+    speculator.observe("turn around")
+    assert speculator.take("turn around slowly") is None
+    assert (speculator.committed, speculator.discarded) == (0, 1)
+
+    speculator.observe("wave both hands")
+    speculator.observe("wave both hands")
+    assert speculator.take("wave both hands") is None
+    assert (speculator.committed, speculator.discarded) == (0, 2)
+
+    # too short to speculate on
+    speculator.observe("wave")
+    speculator.observe("wave")
+    assert speculator.take("wave") is None
+    assert speculator.started == 2
+    speculator.close()
+
+
+def test_counts_add_up_across_threads():
+    speculator = Speculator(FakeConversation(), settle=0.001)
+
+    def recognize(i):
+        for j in range(50):
+            hypothesis = f"move number {i} {j}"
+            speculator.observe(hypothesis)
+            speculator.observe(hypothesis)
+            speculator.take(hypothesis)
+
+    threads = [threading.Thread(target=recognize, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    speculator.take("")
+
+    assert speculator.started > 0
+    assert speculator.started == speculator.committed + speculator.discarded
+    speculator.close()
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(name + " ok")
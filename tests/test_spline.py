@@ -0,0 +1,74 @@
+import os
+
+import numpy as np
+
+from instructor.moves.spline import SplineMove
+
+
+HAND = "realsense::left_hand"
+TRACE = "realsense::trace"
+
+
+def make_log(num_frames=60, rate=30):
+    timestamps = 1000.0 + np.arange(num_frames) / rate
+    phase = np.linspace(0, np.pi, num_frames)
+    return {
+        "timestamp": timestamps,
+        HAND: np.stack([np.cos(phase), np.sin(phase), 0.1 * phase], axis=1),
+        "realsense::nose": np.stack([0 * phase, 0.5 + 0 * phase, 0.2 * phase], axis=1),
+        TRACE: np.stack([np.arange(num_frames) // 2, timestamps - 0.05], axis=1),
+    }
+
+
+def test_fit_follows_the_samples():
+    log = make_log()
+    move = SplineMove.fit(log, smoothness=0)
+    assert move.samples == 60 and move.duration == log["timestamp"][-1] - log["timestamp"][0]
+
+    evaluated = move.evaluate(log["timestamp"])
+    # the spline parameter runs uniformly in time, the samples lie close to the curve
+    np.testing.assert_allclose(evaluated[HAND], log[HAND], atol=0.05)
+    np.testing.assert_allclose(evaluated[TRACE], log[TRACE])
+
+
+def test_save_and_load_round_trip(tmp_path):
+    move = SplineMove.fit(make_log())
+    filename = str(tmp_path / "move.npz")
+    move.save(filename)
+    assert os.listdir(tmp_path) == ["move.npz"]
+
+    loaded = SplineMove.load(filename)
+    assert (loaded.start, loaded.end, loaded.samples) == (move.start, move.end, move.samples)
+    assert loaded.keys == move.keys
+    for key, (knots, coefficients, degree) in move.splines.items():
+        np.testing.assert_array_equal(loaded.splines[key][0], knots)
+        np.testing.assert_array_equal(loaded.splines[key][1], coefficients)
+        assert loaded.splines[key][2] == degree
+    for key in move.traces:
+        np.testing.assert_array_equal(loaded.traces[key][0], move.traces[key][0])
+        np.testing.assert_array_equal(loaded.traces[key][1], move.traces[key][1])
+
+    expected, actual = move.sample(50), loaded.sample(50)
+    assert list(actual) == list(expected)
+    for key in expected:
+        np.testing.assert_array_equal(actual[key], expected[key])
+
+
+def test_chunks_match_sample():
+    move = SplineMove.fit(make_log())
+    chunks = list(move.chunks(rate=50, chunk_duration=0.3))
+    assert len(chunks) > 1
+    sampled = move.sample(50)
+    for key in sampled:
+        np.testing.assert_allclose(np.concatenate([chunk[key] for chunk in chunks]), sampled[key])
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            with tempfile.TemporaryDirectory() as dirname:
+                test(*[Path(dirname)][:test.__code__.co_argcount])
+            print(name + " ok")
@@ -0,0 +1,62 @@
+from instructor.speech.transcript import TranscriptModel
+
+
+def sentence(i):
+    return (f"sentence {i}", "done", f"{i}.0", f"{i}.5")
+
+
+def add(model, i):
+    text, processed, start, stop = sentence(i)
+    return model.add_stable(text, start, stop, processed=processed)
+
+
+def test_rows_past_the_view_are_paged_out():
+    model = TranscriptModel(max_rows=3, max_archive_rows=5)
+    ids = [add(model, i) for i in range(5)]
+    model.set_unstable("partial")
+
+    changed, removed = model.drain()
+    # only the rows still shown are reported, the paged out ones as removed
+    assert [row_id for row_id, _, _ in changed] == ids[3:] + [5]
+    assert [tag for _, _, tag in changed] == ["stable", "stable", "unstable"]
+    assert removed == ids[:3]
+    assert list(model.rows.values()) == [sentence(3), sentence(4), ("partial", "", "", "")]
+    assert list(model.archive) == [sentence(i) for i in range(3)]
+
+    # updates to paged out rows are dropped
+    model.set_processed(ids[0], "late")
+    assert model.drain() == ([], [])
+    assert model.archive[0] == sentence(0)
+
+
+def test_archive_keeps_the_newest_rows():
+    model = TranscriptModel(max_rows=3, max_archive_rows=5)
+    for i in range(20):
+        add(model, i)
+
+    # 17 paged out, only the newest 5 of them are kept
+    assert list(model.archive) == [sentence(i) for i in range(12, 17)]
+    assert list(model.rows.values()) == [sentence(i) for i in range(17, 20)]
+
+    model.clear()
+    assert list(model.archive) == [sentence(i) for i in range(15, 20)]
+    assert not model.rows and model.unstable_id is None
+    _, removed = model.drain()
+    assert len(removed) == 20
+
+
+def test_unstable_row_paged_out_starts_a_new_one():
+    model = TranscriptModel(max_rows=2, max_archive_rows=5)
+    model.set_unstable("partial")
+    for i in range(2):
+        model._add(sentence(i))
+    assert model.unstable_id is None
+    model.set_unstable("next partial")
+    assert list(model.rows.values())[-1] == ("next partial", "", "", "")
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(name + " ok")